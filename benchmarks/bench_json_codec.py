@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# JSON Codec Benchmark
+# Compares the JSON codecs NotionApiHelper can use on query responses shaped like Notion's: 100 pages per response, a mix of property types.
+
+'''
+Dependencies:
+- None. orjson and msgspec are benchmarked when installed (pip install orjson msgspec).
+
+Usage:
+    python benchmarks/bench_json_codec.py [responses] [repeat]
+
+Prints the decode and encode time per response for each codec and the speedup over the standard library json module.
+NotionApiHelper picks the fastest installed codec by itself, see JSON_CODEC in src/NotionApiHelper.py.
+'''
+
+import json, random, string, sys, timeit, uuid
+
+
+def _text(length):
+    return ''.join(random.choices(string.ascii_letters + '     ', k = length))
+
+def _rich_text(length):
+    content = _text(length)
+    return [{
+        "type": "text",
+        "text": {"content": content, "link": None},
+        "annotations": {"bold": False, "italic": False, "strikethrough": False, "underline": False, "code": False, "color": "default"},
+        "plain_text": content,
+        "href": None
+    }]
+
+def _page():
+    return {
+        "object": "page",
+        "id": str(uuid.uuid4()),
+        "created_time": "2024-09-19T14:03:00.000Z",
+        "last_edited_time": "2024-10-02T09:41:00.000Z",
+        "created_by": {"object": "user", "id": str(uuid.uuid4())},
+        "last_edited_by": {"object": "user", "id": str(uuid.uuid4())},
+        "archived": False,
+        "in_trash": False,
+        "url": "https://www.notion.so/" + uuid.uuid4().hex,
+        "properties": {
+            "Name": {"id": "title", "type": "title", "title": _rich_text(30)},
+            "Notes": {"id": "a%3Bc", "type": "rich_text", "rich_text": _rich_text(400)},
+            "Amount": {"id": "b%3Fd", "type": "number", "number": random.random() * 1000},
+            "Done": {"id": "c%5Be", "type": "checkbox", "checkbox": random.random() > 0.5},
+            "Status": {"id": "d%7Cf", "type": "status", "status": {"id": str(uuid.uuid4()), "name": "In progress", "color": "blue"}},
+            "Tags": {"id": "e%40g", "type": "multi_select", "multi_select": [
+                {"id": str(uuid.uuid4()), "name": _text(8), "color": "green"} for _ in range(3)
+            ]},
+            "Due": {"id": "f%23h", "type": "date", "date": {"start": "2024-11-01", "end": None, "time_zone": None}},
+            "Vendor": {"id": "g%24i", "type": "relation", "relation": [{"id": str(uuid.uuid4())} for _ in range(5)], "has_more": False},
+            "Owner": {"id": "h%25j", "type": "people", "people": [{"object": "user", "id": str(uuid.uuid4())}]}
+        }
+    }
+
+def make_response(pages = 100):
+    return {"object": "list", "results": [_page() for _ in range(pages)], "next_cursor": str(uuid.uuid4()), "has_more": True, "type": "page_or_database"}
+
+
+def codecs():
+    available = {"json": (json.loads, lambda obj: json.dumps(obj, separators = (",", ":")).encode("utf-8"))}
+    try:
+        import orjson
+        available["orjson"] = (orjson.loads, orjson.dumps)
+    except ImportError:
+        pass
+    try:
+        import msgspec
+        available["msgspec"] = (msgspec.json.decode, msgspec.json.encode)
+    except ImportError:
+        pass
+    return available
+
+
+def run(responses = 20, repeat = 5):
+    random.seed(0)
+    payloads = [json.dumps(make_response()).encode("utf-8") for _ in range(responses)]
+    objects = [json.loads(payload) for payload in payloads]
+    print(f"{responses} responses of 100 pages, {sum(len(payload) for payload in payloads) / responses / 1024:.0f} KB each on average.")
+
+    results = {}
+    for name, (loads, dumps) in codecs().items():
+        decode = min(timeit.repeat(lambda: [loads(payload) for payload in payloads], number = 1, repeat = repeat)) / responses
+        encode = min(timeit.repeat(lambda: [dumps(obj) for obj in objects], number = 1, repeat = repeat)) / responses
+        results[name] = {"decode_ms": decode * 1000, "encode_ms": encode * 1000}
+
+    baseline = results["json"]
+    for name, result in results.items():
+        print(f"{name:>8}: decode {result['decode_ms']:7.2f} ms ({baseline['decode_ms'] / result['decode_ms']:4.1f}x), "
+              f"encode {result['encode_ms']:7.2f} ms ({baseline['encode_ms'] / result['encode_ms']:4.1f}x)")
+    if len(results) == 1:
+        print("Only the standard library codec is installed, pip install orjson or msgspec to compare.")
+    return results
+
+
+if __name__ == "__main__":
+    run(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# Migration Stage Microbenchmarks
+# Times the CPU bound stages of the Notion to Airtable migration on synthetic data, without any network, and records their peak memory.
+
+'''
+Dependencies:
+- synthetic_notion.py (same directory)
+- pyairtable for the create_airtable_records, make_relation_links and build_airtable_class_body stages, they are skipped without it.
+
+Usage (from the repository root, NotionApiHelper reads src/headers.json):
+    python benchmarks/bench_stages.py [--rows 1000,100000,1000000] [--stages name,name] [--no-memory]
+                                      [--baseline output/benchmarks/baseline.json] [--tolerance 0.2]
+
+Stages:
+    - return_property_value: Decodes every property of every page, relations past 25 items included.
+    - generate_property_body: Builds the update body of every writable property of every page.
+    - create_airtable_records: Converts pages into instances of the generated Airtable class.
+    - make_relation_links: Resolves one relation property of every page into link updates.
+    - build_airtable_class_body: Builds the class source for the schema, once per row count (it does not depend on rows).
+
+Every stage runs twice per row count: once timed, once under tracemalloc for the peak memory allocated by the stage (--no-memory skips it).
+Results are written to output/benchmarks/stages.json. With --baseline, stages slower than the baseline by more than the tolerance are
+reported and the exit code is 1, so the suite can gate changes. A stage that raises is reported with its error and the others still run.
+'''
+
+import contextlib, gc, json, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synthetic_notion import SyntheticNotion
+from NotionApiHelper import NotionApiHelper
+
+try:
+    import NotionToAirtableMigrator as migrator
+except ImportError:
+    migrator = None
+
+RESULTS_PATH = 'output/benchmarks/stages.json'
+DEFAULT_ROWS = [1000, 100000, 1000000]
+TABLE_NAME = 'Benchmark'
+BASE_ID = 'appBenchmark00000'
+WRITABLE_TYPES = ('checkbox', 'email', 'number', 'phone_number', 'url', 'select', 'status', 'date', 'files', 'multi_select', 'relation', 'people', 'rich_text', 'title')
+
+
+class _Schema:
+    def __init__(self, fields):
+        self.fields = fields
+
+class _Field:
+    def __init__(self, name):
+        self.name = name
+
+class _Table:
+    # In-memory stand-in for a pyairtable Table, reports every link field as existing.
+    def __init__(self, base_id, table_name):
+        self.name = table_name
+        self.id = f'tbl{table_name}'
+        self.base = type('Base', (), {'id': base_id})()
+
+    def schema(self):
+        return _Schema([_Field(f'{migrator.LINK_FIELD_PREFIX}{name}') for name in SyntheticNotion.DEFAULT_SCHEMA])
+
+class _Api:
+    def table(self, base_id, table_name):
+        return _Table(base_id, table_name)
+
+class _Job:
+    def wait(self):
+        return []
+
+class _Scheduler:
+    # Collects the link updates instead of sending them.
+    def __init__(self):
+        self.updates = 0
+
+    def batch_update(self, table, updates):
+        self.updates += len(updates)
+        return _Job()
+
+
+def _helper(generator):
+    return generator.attach(NotionApiHelper())
+
+
+def stage_return_property_value(generator, rows):
+    helper = _helper(generator)
+    def run():
+        for page in generator.pages(rows):
+            for prop in page['properties'].values():
+                helper.return_property_value(prop, page['id'])
+    return run
+
+def stage_generate_property_body(generator, rows):
+    helper = _helper(generator)
+    type_map = generator.type_map()
+    inputs = [] # Per template: generate_property_body arguments of its writable properties.
+    for page in generator.pool():
+        page_inputs = []
+        for name, prop in page['properties'].items():
+            prop_type = type_map[name]
+            if prop_type not in WRITABLE_TYPES:
+                continue
+            value = helper.return_property_value(prop, page['id'])
+            if prop_type in ('title', 'rich_text'):
+                page_inputs.append((name, prop_type, [value]))
+            elif prop_type == 'files':
+                page_inputs.append((name, prop_type, [file['name'] for file in prop['files']], value))
+            elif prop_type == 'people':
+                page_inputs.append((name, prop_type, [person['id'] for person in prop['people']]))
+            else:
+                page_inputs.append((name, prop_type, value))
+        inputs.append(page_inputs)
+    def run():
+        for index in range(rows):
+            for args in inputs[index % len(inputs)]:
+                helper.generate_property_body(*args)
+    return run
+
+def _airtable_class(property_map, type_map):
+    class_code = migrator.build_airtable_class_headers(TABLE_NAME)
+    class_code += migrator.build_airtable_class_body(property_map, type_map)
+    class_code += f"\n    class Meta:\n        api_key = 'benchmark'\n        base_id = '{BASE_ID}'\n        table_name = '{TABLE_NAME}'\n"
+    namespace = {}
+    exec(class_code, namespace)
+    return namespace[TABLE_NAME]
+
+def stage_create_airtable_records(generator, rows):
+    migrator.notion_helper = _helper(generator)
+    type_map = generator.type_map()
+    property_map = {name: name for name in type_map}
+    Airtable_Class = _airtable_class(property_map, type_map)
+    def run():
+        records = []
+        migrator.create_airtable_records(records, generator.pages(rows), property_map, type_map, Airtable_Class, 'benchmark', link_sources = {})
+        return records
+    return run
+
+def stage_make_relation_links(generator, rows):
+    migrator.api = _Api()
+    own_db, related_db = 'benchmarkdb', 'relateddb'
+    relation_properties = [name for name, prop_type in generator.type_map().items() if prop_type == 'relation']
+    link_sources = {own_db: {name: {} for name in relation_properties}}
+    own_index = {}
+    for index, page in enumerate(generator.pages(rows)):
+        own_index[migrator.normalize_notion_id(page['id'])] = f'rec{index:014d}'
+        template_id = generator.page_template_id(page['id'])
+        for name in relation_properties:
+            link_sources[own_db][name][page['id']] = generator.related_ids(template_id, name)
+    id_indexes = {
+        own_db: own_index,
+        related_db: {migrator.normalize_notion_id(page_id): f'rel{index:014d}' for index, page_id in enumerate(generator.related_pages)}
+    }
+    relation_map = {
+        own_db: {'airtable_table_name': TABLE_NAME, 'airtable_base_id': BASE_ID, 'table_id': 'tblBenchmark',
+                 'property_map': {name: name for name in generator.schema}, 'relation_mapping': {name: related_db for name in relation_properties}},
+        related_db: {'airtable_table_name': 'Related', 'airtable_base_id': BASE_ID, 'table_id': 'tblRelated', 'property_map': {}, 'relation_mapping': {}}
+    }
+    def run():
+        return migrator.make_relation_links(link_sources, relation_map, id_indexes, _Scheduler())
+    return run
+
+def stage_build_airtable_class_body(generator, rows):
+    type_map = generator.type_map()
+    property_map = {name: name for name in type_map}
+    def run():
+        return migrator.build_airtable_class_body(property_map, type_map)
+    return run
+
+
+STAGES = {
+    'return_property_value': (stage_return_property_value, False),
+    'generate_property_body': (stage_generate_property_body, False),
+    'create_airtable_records': (stage_create_airtable_records, True),
+    'make_relation_links': (stage_make_relation_links, True),
+    'build_airtable_class_body': (stage_build_airtable_class_body, True)
+}
+
+
+def measure(stage, generator, rows, memory = True):
+    """
+    Runs one stage at one row count.
+
+    Returns:
+        dict: {"seconds", "rows_per_second", "peak_mb"} or {"error"} if the stage raised.
+    """
+    result = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): # The stages print per record.
+        try:
+            run = stage(generator, rows)
+            gc.collect()
+            started = time.perf_counter()
+            run()
+            result['seconds'] = time.perf_counter() - started
+            result['rows_per_second'] = rows / result['seconds'] if result['seconds'] else 0
+            if memory:
+                run = stage(generator, rows)
+                gc.collect()
+                tracemalloc.start()
+                run()
+                result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                tracemalloc.stop()
+        except Exception as e:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            result = {'error': f'{type(e).__name__}: {e}'}
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the (stage, rows, baseline seconds, seconds) of every stage slower than the baseline by more than tolerance.
+    """
+    regressions = []
+    for stage, by_rows in results.items():
+        for rows, result in by_rows.items():
+            previous = baseline.get(stage, {}).get(rows, {})
+            if 'seconds' in result and previous.get('seconds') and result['seconds'] > previous['seconds'] * (1 + tolerance):
+                regressions.append((stage, rows, previous['seconds'], result['seconds']))
+    return regressions
+
+
+def main(args):
+    options = {'--rows': ','.join(str(rows) for rows in DEFAULT_ROWS), '--stages': ','.join(STAGES), '--baseline': None, '--tolerance': '0.2'}
+    memory = '--no-memory' not in args
+    for option in options:
+        if option in args:
+            options[option] = args[args.index(option) + 1]
+    row_counts = [int(rows) for rows in options['--rows'].split(',')]
+
+    generator = SyntheticNotion()
+    results = {}
+    for name in options['--stages'].split(','):
+        stage, needs_migrator = STAGES[name]
+        if needs_migrator and migrator is None:
+            print(f"{name:>26}: skipped, pyairtable is not installed.")
+            continue
+        results[name] = {}
+        for rows in row_counts:
+            result = measure(stage, generator, rows, memory)
+            results[name][str(rows)] = result
+            if 'error' in result:
+                print(f"{name:>26} {rows:>9} rows: failed, {result['error']}")
+            else:
+                peak = f", peak {result['peak_mb']:8.1f} MB" if 'peak_mb' in result else ''
+                print(f"{name:>26} {rows:>9} rows: {result['seconds']:9.3f} s, {result['rows_per_second']:11.0f} rows/s{peak}")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok = True)
+    with open(RESULTS_PATH, 'w') as results_file:
+        json.dump(results, results_file, indent = 4)
+    print(f"Results written to {RESULTS_PATH}")
+
+    if options['--baseline']:
+        with open(options['--baseline'], 'r') as baseline_file:
+            regressions = compare(results, json.load(baseline_file), float(options['--tolerance']))
+        for stage, rows, before, after in regressions:
+            print(f"Regression: {stage} at {rows} rows took {after:.3f} s, baseline {before:.3f} s.")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Synthetic Notion Data
+# Generates Notion query responses from a schema, for benchmarks and offline runs of the migration stages. Pages have the same shape
+# as the ones returned by the Notion API, including relations past the 25 item cap of page objects, rollups and formulas.
+
+'''
+Dependencies:
+- None
+
+Usage:
+    generator = SyntheticNotion(SyntheticNotion.DEFAULT_SCHEMA, seed = 0)
+    for page in generator.pages(100000):           # Streams pages, memory use does not grow with the row count.
+        ...
+    for response in generator.responses(1000):     # Query responses of up to 100 pages with has_more / next_cursor.
+        ...
+
+    # Offline NotionApiHelper: relations past 25 items and people names are served by the generator, no request is made.
+    generator.attach(notion_helper)
+
+Schema:
+    {property name: property type}. Formulas and rollups are given as "formula:<result type>" and "rollup:<result type>",
+    e.g. "formula:number", "rollup:array". Every type handled by NotionApiHelper.return_property_value is supported.
+
+Pages are built from a pool of POOL_SIZE distinct templates, each yielded page is a shallow copy with its own ID, so large row counts
+cost generation time close to zero.
+'''
+
+import random, string, uuid, zlib
+
+
+class SyntheticNotion:
+    POOL_SIZE = 1000 # Distinct page templates.
+    PAGE_SIZE = 100 # Pages per query response.
+    RELATION_SIZE = 30 # Related pages per relation property, more than the 25 a page object carries.
+    RELATION_PAGE_LIMIT = 25
+    USER_COUNT = 50
+    SELECT_OPTIONS = ["Not started", "In progress", "Blocked", "Done", "Cancelled"]
+    DEFAULT_SCHEMA = {
+        "Name": "title",
+        "Notes": "rich_text",
+        "Amount": "number",
+        "Done": "checkbox",
+        "Email": "email",
+        "Phone": "phone_number",
+        "Website": "url",
+        "Category": "select",
+        "Status": "status",
+        "Tags": "multi_select",
+        "Due": "date",
+        "Vendor": "relation",
+        "Owner": "people",
+        "Attachments": "files",
+        "Task ID": "unique_id",
+        "Created": "created_time",
+        "Created By": "created_by",
+        "Edited": "last_edited_time",
+        "Edited By": "last_edited_by",
+        "Label": "formula:string",
+        "Total": "formula:number",
+        "Overdue": "formula:boolean",
+        "Next Review": "formula:date",
+        "Vendor Spend": "rollup:number",
+        "Last Order": "rollup:date",
+        "Vendor Names": "rollup:array"
+    }
+
+    def __init__(self, schema = None, seed = 0, pool_size = None, relation_size = None):
+        self.schema = schema if schema else self.DEFAULT_SCHEMA
+        self.random = random.Random(seed)
+        self.pool_size = pool_size if pool_size else self.POOL_SIZE
+        self.relation_size = relation_size if relation_size else self.RELATION_SIZE
+        self.users = [self._uuid() for _ in range(self.USER_COUNT)]
+        self.related_pages = [self._uuid() for _ in range(self.pool_size)]
+        self.property_ids = {name: ''.join(self.random.choices(string.ascii_letters, k = 4)) for name in self.schema}
+        self._pool = None
+
+    def _uuid(self):
+        return str(uuid.UUID(int = self.random.getrandbits(128), version = 4))
+
+    def _text(self, words):
+        return ' '.join(''.join(self.random.choices(string.ascii_lowercase, k = self.random.randint(3, 9))) for _ in range(words))
+
+    def _rich_text(self, words):
+        content = self._text(words)
+        return [{
+            "type": "text",
+            "text": {"content": content, "link": None},
+            "annotations": {"bold": False, "italic": False, "strikethrough": False, "underline": False, "code": False, "color": "default"},
+            "plain_text": content,
+            "href": None
+        }]
+
+    def _date(self, with_time = False):
+        day = f"2024-{self.random.randint(1, 12):02d}-{self.random.randint(1, 28):02d}"
+        return f"{day}T{self.random.randint(0, 23):02d}:{self.random.choice(['00', '15', '30', '45'])}:00.000Z" if with_time else day
+
+    def _user(self):
+        return {"object": "user", "id": self.random.choice(self.users)}
+
+    def related_ids(self, page_id, prop_name):
+        """
+        The full list of page IDs a relation property of a page points to. Stable for a given page ID and property.
+        """
+        start = zlib.crc32(f'{page_id}/{prop_name}'.encode()) % len(self.related_pages)
+        return [self.related_pages[(start + offset) % len(self.related_pages)] for offset in range(self.relation_size)]
+
+    def _value(self, prop_type):
+        # The type specific part of a property value, without the "id" and "type" keys.
+        if prop_type == "title" or prop_type == "rich_text":
+            return self._rich_text(self.random.randint(2, 40))
+        if prop_type == "number":
+            return round(self.random.uniform(0, 10000), 2) if self.random.random() > 0.05 else None
+        if prop_type == "checkbox":
+            return self.random.random() > 0.5
+        if prop_type == "email":
+            return f"{self._text(1)}@example.com"
+        if prop_type == "phone_number":
+            return f"+1 555 {self.random.randint(1000000, 9999999)}"
+        if prop_type == "url":
+            return f"https://example.com/{self._text(1)}"
+        if prop_type in ("select", "status"):
+            return {"id": self._text(1), "name": self.random.choice(self.SELECT_OPTIONS), "color": "default"}
+        if prop_type == "multi_select":
+            return [{"id": self._text(1), "name": name, "color": "default"} for name in self.random.sample(self.SELECT_OPTIONS, self.random.randint(0, 3))]
+        if prop_type == "date":
+            return {"start": self._date(self.random.random() > 0.5), "end": None, "time_zone": None}
+        if prop_type == "people":
+            return [self._user() for _ in range(self.random.randint(1, 3))]
+        if prop_type == "files":
+            return [
+                {"name": f"{self._text(1)}.pdf", "type": "file", "file": {"url": f"https://files.example.com/{self._uuid()}.pdf", "expiry_time": self._date(True)}},
+                {"name": f"{self._text(1)}.png", "type": "external", "external": {"url": f"https://example.com/{self._uuid()}.png"}}
+            ][:self.random.randint(0, 2)]
+        if prop_type == "unique_id":
+            return {"prefix": "TASK", "number": self.random.randint(1, 100000)}
+        if prop_type in ("created_time", "last_edited_time"):
+            return self._date(True)
+        if prop_type in ("created_by", "last_edited_by"):
+            return self._user()
+        raise ValueError(f"Unsupported property type {prop_type}")
+
+    def _formula(self, result_type):
+        if result_type == "string":
+            return {"type": "string", "string": self._text(3)}
+        if result_type == "number":
+            return {"type": "number", "number": self._value("number")}
+        if result_type == "boolean":
+            return {"type": "boolean", "boolean": self.random.random() > 0.5}
+        if result_type == "date":
+            return {"type": "date", "date": {"start": self._date(), "end": None, "time_zone": None}}
+        raise ValueError(f"Unsupported formula type {result_type}")
+
+    def _rollup(self, result_type):
+        if result_type == "number":
+            return {"type": "number", "number": self._value("number"), "function": "sum"}
+        if result_type == "date":
+            return {"type": "date", "date": {"start": self._date(), "end": None, "time_zone": None}, "function": "latest_date"}
+        if result_type == "array":
+            return {"type": "array", "array": [{"type": "title", "title": self._rich_text(2)} for _ in range(self.random.randint(1, 5))], "function": "show_original"}
+        raise ValueError(f"Unsupported rollup type {result_type}")
+
+    def _template(self):
+        page_id = self._uuid()
+        properties = {}
+        for name, prop_type in self.schema.items():
+            prop_type, _, result_type = prop_type.partition(":")
+            prop = {"id": self.property_ids[name], "type": prop_type}
+            if prop_type == "formula":
+                prop["formula"] = self._formula(result_type)
+            elif prop_type == "rollup":
+                prop["rollup"] = self._rollup(result_type)
+            elif prop_type == "relation":
+                prop["relation"] = [{"id": related_id} for related_id in self.related_ids(page_id, name)[:self.RELATION_PAGE_LIMIT]]
+                prop["has_more"] = self.relation_size > self.RELATION_PAGE_LIMIT
+            else:
+                prop[prop_type] = self._value(prop_type)
+            properties[name] = prop
+        return {
+            "object": "page",
+            "id": page_id,
+            "created_time": self._date(True),
+            "last_edited_time": self._date(True),
+            "created_by": self._user(),
+            "last_edited_by": self._user(),
+            "archived": False,
+            "in_trash": False,
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+            "properties": properties
+        }
+
+    def pool(self):
+        if self._pool is None:
+            self._pool = [self._template() for _ in range(self.pool_size)]
+        return self._pool
+
+    def pages(self, rows):
+        """
+        Yields rows page objects with distinct IDs.
+        """
+        pool = self.pool()
+        for index in range(rows):
+            page = dict(pool[index % len(pool)])
+            page["id"] = str(uuid.UUID(int = index + 1, version = 4))
+            yield page
+
+    def responses(self, rows):
+        """
+        Yields the query responses of a database holding rows pages, PAGE_SIZE pages each.
+        """
+        batch = []
+        for page in self.pages(rows):
+            batch.append(page)
+            if len(batch) == self.PAGE_SIZE:
+                yield {"object": "list", "results": batch, "next_cursor": page["id"], "has_more": True, "type": "page_or_database"}
+                batch = []
+        yield {"object": "list", "results": batch, "next_cursor": None, "has_more": False, "type": "page_or_database"}
+
+    def type_map(self):
+        return {name: prop_type.partition(":")[0] for name, prop_type in self.schema.items()}
+
+    def user_directory(self):
+        return {user_id.replace('-', ''): {"name": f"User {index}", "type": "person", "email": f"user{index}@example.com"} for index, user_id in enumerate(self.users)}
+
+    def get_page_property(self, pageID, propID, start_cursor = None):
+        """
+        Property item endpoint for relation properties, paginated like the Notion API. Used in place of NotionApiHelper.get_page_property.
+        """
+        name = next(name for name, prop_id in self.property_ids.items() if prop_id == propID)
+        related_ids = self.related_ids(self.page_template_id(pageID), name)
+        start = int(start_cursor) if start_cursor else 0
+        end = start + self.RELATION_PAGE_LIMIT
+        return {
+            "object": "list",
+            "results": [{"object": "property_item", "id": propID, "type": "relation", "relation": {"id": related_id}} for related_id in related_ids[start:end]],
+            "next_cursor": str(end) if end < len(related_ids) else None,
+            "has_more": end < len(related_ids),
+            "type": "property_item"
+        }
+
+    def page_template_id(self, page_id):
+        # Yielded pages reuse the relations of their template, the template is found from the page number in the ID.
+        index = uuid.UUID(page_id).int & ((1 << 62) - 1) # Below the version and variant bits.
+        pool = self.pool()
+        return pool[(index - 1) % len(pool)]["id"]
+
+    def attach(self, notion_helper):
+        """
+        Makes a NotionApiHelper work offline on generated pages: relation pages and the user directory come from the generator.
+        """
+        notion_helper.get_page_property = self.get_page_property
+        notion_helper.user_directory = self.user_directory()
+        return notion_helper
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Airtable Table Snapshots
+# Read-only copies of Airtable tables, projected to the fields a lookup needs. Used to find the record of a Notion page when the
+# local RecordHashStore does not know it, without downloading every field of every record for each relation property.
+
+'''
+Dependencies:
+- pyairtable
+
+Usage:
+    snapshots = AirtableSnapshotCache(api)
+    page_index = snapshots.page_index(base_id, table_name)                  # {normalized Notion page ID: record ID}
+    snapshot = snapshots.get(base_id, table_name, ['Status'], formula)      # Any projection, optionally filtered by a formula.
+    snapshots.record_saved(base_id, table_name, {page_id: record_id})      # Write-through after saving records.
+
+A snapshot is fetched once per cache, page by page with Table.iterate, asking only for the projected fields. Every later lookup of the same
+table, projection and formula is answered from memory. One cache is shared by every database and relation property of a run.
+Records saved during the run are written through to the page indexes already loaded, so they stay current without another fetch.
+'''
+
+import logging, re
+
+logger = logging.getLogger(__name__)
+
+NOTION_RECORD_FIELD = 'Notion record'
+
+
+def page_id_from_field(value):
+    """
+    Extracts the Notion page ID from a "Notion record" value, which may hold a bare ID, a dashed ID or a page URL.
+
+    Returns:
+        str: The normalized (lowercase, undashed) page ID, or None.
+    """
+    if not value:
+        return None
+    # With dashes removed, a URL slug ending in hex letters runs into the ID, the ID is the last 32 characters of the run.
+    runs = re.findall(r'[0-9a-f]{32,}', str(value).replace('-', '').lower())
+    return runs[-1][-32:] if runs else None
+
+
+class AirtableSnapshot:
+    PAGE_SIZE = 100 # Records per request, the Airtable maximum.
+
+    def __init__(self, table, fields, formula = None):
+        self.table = table
+        self.fields = list(fields)
+        self.formula = formula
+        self.records = {} # Record ID: projected fields.
+        self.requests = 0
+        self._indexes = {}
+
+    def load(self):
+        print(f"Loading snapshot of Airtable table {self.table.name}, fields {self.fields}")
+        for page in self.table.iterate(fields = self.fields, formula = self.formula, page_size = self.PAGE_SIZE):
+            self.requests += 1
+            for record in page:
+                self.records[record['id']] = record['fields']
+        logger.info(f"Snapshot of {self.table.name}: {len(self.records)} records in {self.requests} requests.")
+        return self
+
+    def index(self, field, key = None):
+        """
+        Maps the values of a projected field to record IDs, built once per field.
+
+        Args:
+            field (str): The field to index.
+            key (callable): Turns a field value into the index key, records it returns None for are left out. Optional.
+        """
+        if field not in self._indexes:
+            key = key if key else (lambda value: value)
+            index = {}
+            for record_id, fields in self.records.items():
+                value = key(fields.get(field))
+                if value is not None:
+                    index[value] = record_id
+            self._indexes[field] = index
+        return self._indexes[field]
+
+
+class AirtableSnapshotCache:
+    def __init__(self, api):
+        self.api = api
+        self.snapshots = {} # (base ID, table name, fields, formula): AirtableSnapshot
+        self.page_indexes = {} # (base ID, table name): {normalized page ID: record ID}
+
+    def get(self, base_id, table_name, fields = (NOTION_RECORD_FIELD,), formula = None):
+        """
+        Returns the snapshot of a table projected to fields, fetching it on first use.
+        """
+        key = (base_id, table_name, tuple(fields), formula)
+        if key not in self.snapshots:
+            self.snapshots[key] = AirtableSnapshot(self.api.table(base_id, table_name), fields, formula).load()
+        return self.snapshots[key]
+
+    def page_index(self, base_id, table_name):
+        """
+        Maps the normalized Notion page IDs found in the "Notion record" field of a table to their record IDs.
+        """
+        key = (base_id, table_name)
+        if key not in self.page_indexes:
+            snapshot = self.get(base_id, table_name)
+            self.page_indexes[key] = dict(snapshot.index(NOTION_RECORD_FIELD, page_id_from_field))
+        return self.page_indexes[key]
+
+    def record_saved(self, base_id, table_name, page_records):
+        """
+        Writes saved records through to the page index of their table, if it is loaded.
+
+        Args:
+            page_records (dict): Notion page ID: Airtable record ID.
+        """
+        page_index = self.page_indexes.get((base_id, table_name))
+        if page_index is None:
+            return
+        for page_id, record_id in page_records.items():
+            if record_id:
+                page_index[page_id.replace('-', '').lower()] = record_id
+
+    def report(self):
+        requests = sum(snapshot.requests for snapshot in self.snapshots.values())
+        records = sum(len(snapshot.records) for snapshot in self.snapshots.values())
+        print(f"Airtable snapshots: {len(self.snapshots)} tables, {records} records in {requests} requests.")
+        return {'tables': len(self.snapshots), 'records': records, 'requests': requests}
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# Airtable Write Scheduler
+# Coordinates writes to Airtable across every table of a base. Airtable allows 5 requests per second per base, so table writers
+# running at the same time have to share one budget per base instead of each pacing themselves.
+
+'''
+Dependencies:
+- pyairtable
+
+Every request goes through a per-base rate slot (REQUESTS_PER_SECOND apart) and a per-base limit on requests in flight.
+Records are written in 10-record batches, the Airtable maximum per request, and several batches of the same base are kept
+in flight at once up to the in-flight limit.
+
+The in-flight limit adapts: a 429 response halves it and the batch is retried after an exponential backoff, every
+ADAPT_AFTER successful requests raise it by one again, up to MAX_IN_FLIGHT.
+pyairtable's default session retries 429 responses itself and only raises a RetryError once its retries run out, so the
+scheduler would never see them. Table writes are therefore sent through an Api without retries, and the generated ORM classes
+set retry = None in their Meta. A RetryError caused by 429 responses still counts as rate limited, for models built without it.
+
+Usage:
+    scheduler = AirtableWriteScheduler()
+    scheduler.batch_save(Airtable_Class, records).wait()     # ORM model instances
+    scheduler.batch_update(table, updates).wait()            # {"id": record ID, "fields": {...}} dictionaries
+    scheduler.report()                                       # Records per second achieved per base.
+    scheduler.shutdown()
+'''
+
+import logging, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from pyairtable import Api
+from requests.exceptions import RetryError
+
+logger = logging.getLogger(__name__)
+
+
+class WriteJob:
+    '''
+    The futures of one batch_save/batch_update call. wait() blocks until every batch is written and raises the first error, if any.
+    '''
+    def __init__(self, futures):
+        self.futures = futures
+
+    def wait(self):
+        wait_futures(self.futures)
+        results = []
+        for future in self.futures:
+            results.extend(future.result() or [])
+        return results
+
+
+class AirtableWriteScheduler:
+    REQUESTS_PER_SECOND = 5 # Per base.
+    BATCH_SIZE = 10 # Records per request.
+    MAX_IN_FLIGHT = 5 # Requests in flight per base.
+    MAX_WORKERS = 20 # Threads shared by all bases.
+    ADAPT_AFTER = 20 # Successful requests before the in-flight limit is raised again.
+    MAX_RETRIES = 5
+    RETRY_DELAY = 1 # seconds, doubled after every 429.
+
+    def __init__(self, requests_per_second = None, max_in_flight = None, max_workers = None):
+        self.requests_per_second = requests_per_second if requests_per_second else self.REQUESTS_PER_SECOND
+        self.max_in_flight = max_in_flight if max_in_flight else self.MAX_IN_FLIGHT
+        self.executor = ThreadPoolExecutor(max_workers = max_workers if max_workers else self.MAX_WORKERS)
+        self.lock = threading.Lock()
+        self.bases = {} # base ID: per base state, see _base.
+        self.apis = {} # Airtable token: Api without retries, used for the table writes.
+
+    def _base(self, base_id):
+        with self.lock:
+            if base_id not in self.bases:
+                self.bases[base_id] = {
+                    'condition': threading.Condition(),
+                    'next_request_time': 0,
+                    'in_flight': 0,
+                    'in_flight_limit': self.max_in_flight,
+                    'successes': 0,
+                    'records': 0,
+                    'requests': 0,
+                    'throttled': 0,
+                    'started': None,
+                    'finished': None
+                }
+            return self.bases[base_id]
+
+    def _acquire(self, base):
+        # Wait for an in-flight slot, then for the next rate slot of the base.
+        with base['condition']:
+            while base['in_flight'] >= base['in_flight_limit']:
+                base['condition'].wait()
+            base['in_flight'] += 1
+            now = time.monotonic()
+            wait = base['next_request_time'] - now
+            base['next_request_time'] = max(now, base['next_request_time']) + 1 / self.requests_per_second
+            if base['started'] is None:
+                base['started'] = now
+        if wait > 0:
+            time.sleep(wait)
+
+    def _release(self, base, throttled = False):
+        with base['condition']:
+            base['in_flight'] -= 1
+            if throttled:
+                base['throttled'] += 1
+                base['successes'] = 0
+                base['in_flight_limit'] = max(1, base['in_flight_limit'] // 2)
+            else:
+                base['successes'] += 1
+                if base['successes'] >= self.ADAPT_AFTER and base['in_flight_limit'] < self.max_in_flight:
+                    base['in_flight_limit'] += 1
+                    base['successes'] = 0
+            base['condition'].notify_all()
+
+    @staticmethod
+    def _is_rate_limited(error):
+        response = getattr(error, 'response', None)
+        if getattr(response, 'status_code', None) == 429:
+            return True
+        # urllib3 gave up retrying, e.g. "Max retries exceeded ... (Caused by ResponseError('too many 429 error responses'))".
+        return isinstance(error, RetryError) and '429' in str(error)
+
+    def _table(self, table):
+        # The same table on an Api without retries, so its 429 responses reach _run.
+        with self.lock:
+            api = self.apis.get(table.api.api_key)
+            if api is None:
+                api = self.apis[table.api.api_key] = Api(table.api.api_key, timeout = table.api.timeout, retry_strategy = None)
+        return api.table(table.base.id, table.name)
+
+    def _run(self, base_id, write, batch):
+        base = self._base(base_id)
+        delay = self.RETRY_DELAY
+        for attempt in range(self.MAX_RETRIES + 1):
+            self._acquire(base)
+            try:
+                result = write(batch)
+            except Exception as e:
+                throttled = self._is_rate_limited(e)
+                self._release(base, throttled)
+                if not throttled or attempt == self.MAX_RETRIES:
+                    logger.error(f"Airtable write to base {base_id} failed: {e}")
+                    raise
+                logger.info(f"Airtable base {base_id} rate limited, retrying in {delay} seconds with {base['in_flight_limit']} requests in flight.")
+                time.sleep(delay)
+                delay *= 2
+                continue
+            self._release(base)
+            with base['condition']:
+                base['records'] += len(batch)
+                base['requests'] += 1
+                base['finished'] = time.monotonic()
+            return result
+
+    def submit(self, base_id, write, records):
+        """
+        Splits records into batches and schedules write(batch) for each under the budget of the base.
+
+        Args:
+            base_id (str): The ID of the Airtable base written to.
+            write (callable): Writes one batch of at most BATCH_SIZE records with one request.
+            records (list): The records to write.
+
+        Returns:
+            WriteJob: The scheduled batches.
+        """
+        futures = []
+        for index in range(0, len(records), self.BATCH_SIZE):
+            futures.append(self.executor.submit(self._run, base_id, write, records[index:index + self.BATCH_SIZE]))
+        return WriteJob(futures)
+
+    def batch_save(self, Airtable_Class, records):
+        """
+        Schedules Model.batch_save for ORM instances. New instances are created, instances with an ID are updated, either way the
+        instances carry their Airtable record ID once the job is done.
+        """
+        def save(batch):
+            Airtable_Class.batch_save(batch)
+            return batch
+        return self.submit(Airtable_Class.Meta.base_id, save, records)
+
+    def batch_update(self, table, updates):
+        """
+        Schedules Table.batch_update for {"id": record ID, "fields": {...}} dictionaries.
+        """
+        return self.submit(table.base.id, self._table(table).batch_update, updates)
+
+    def report(self):
+        """
+        Prints and returns the throughput achieved per base.
+
+        Returns:
+            dict: base ID: {"records", "requests", "throttled", "seconds", "records_per_second"}
+        """
+        report = {}
+        for base_id, base in self.bases.items():
+            seconds = (base['finished'] - base['started']) if base['started'] and base['finished'] else 0
+            report[base_id] = {
+                'records': base['records'],
+                'requests': base['requests'],
+                'throttled': base['throttled'],
+                'seconds': seconds,
+                'records_per_second': base['records'] / seconds if seconds else 0
+            }
+            print(f"Base {base_id}: {base['records']} records in {base['requests']} requests, {seconds:.1f}s, "
+                  f"{report[base_id]['records_per_second']:.1f} records/s, {base['throttled']} rate limited requests.")
+            logger.info(f"Base {base_id} write throughput: {report[base_id]}")
+        return report
+
+    def shutdown(self):
+        self.executor.shutdown(wait = True)
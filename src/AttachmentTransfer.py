@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Attachment Transfer
+# Moves the files of Notion "files" properties into Airtable attachment fields. Notion hosted file URLs expire after an hour,
+# so the files are downloaded while the URLs are fresh, cached on local disk by content hash and attached to Airtable from there.
+
+'''
+Dependencies:
+- requests
+- pyairtable 3.0+ (Table.upload_attachment)
+
+Files are stream-downloaded with a bounded thread pool and stored once per content hash under output/attachments/<hash[:2]>/<hash>.
+The same file attached to many pages is only downloaded once per URL and uploaded to Airtable once per run, later records reuse
+the Airtable copy through a batched update.
+
+Stages, per attachment field:
+1) Download every unique URL concurrently, hashing the content while streaming.
+2) Batch update the records (10 per request) with the attachments Airtable already holds from this run. This also clears stale
+   attachments from earlier runs. Given a write_scheduler, the updates go through it and share its per-base rate budget and 429 backoff.
+3) Upload the remaining files one by one with upload_attachment, which appends to the field. Files above Airtable's upload limit
+   are attached by their Notion URL instead and Airtable fetches them itself.
+'''
+
+import requests, hashlib, logging, os, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class AttachmentTransfer:
+    CACHE_DIR = 'output/attachments'
+    MAX_WORKERS = 4
+    CHUNK_SIZE = 64 * 1024 # bytes
+    AIRTABLE_BATCH_SIZE = 10
+    AIRTABLE_UPLOAD_LIMIT = 5 * 1024 * 1024 # bytes, larger files are attached by URL.
+    MAX_RETRIES = 3
+    RETRY_DELAY = 5 # seconds
+
+    def __init__(self, cache_dir = None, max_workers = None, write_scheduler = None):
+        self.cache_dir = cache_dir if cache_dir else self.CACHE_DIR
+        self.max_workers = max_workers if max_workers else self.MAX_WORKERS
+        self.write_scheduler = write_scheduler # AirtableWriteScheduler for the batch updates, shared with the record saves.
+        self.downloads = {} # url: {"hash", "path", "size"}, files downloaded this run.
+        self.airtable_copies = {} # content hash: Airtable attachment URL, files uploaded this run.
+        self.stats = {"downloaded": 0, "cached": 0, "uploaded": 0, "reused": 0, "by_url": 0, "failed": 0}
+        self._stats_lock = threading.Lock() # Downloads count from the pool threads.
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    @staticmethod
+    def collect_files(files_property):
+        """
+        Returns the files of a raw Notion files property, both Notion hosted ("file") and external ("external") ones.
+
+        Args:
+            files_property (dict): The property object from a page, {"type": "files", "files": [...]}.
+
+        Returns:
+            list of tuple: (file name, url) pairs.
+        """
+        files = []
+        for file in files_property.get('files', []):
+            file_type = file.get('type', 'external' if 'external' in file else 'file')
+            url = file.get(file_type, {}).get('url')
+            if url:
+                files.append((file.get('name') or os.path.basename(url.split('?')[0]), url))
+        return files
+
+    def _cache_path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash[:2], content_hash)
+
+    def download(self, url):
+        """
+        Streams a file to the local cache, hashing it on the way. Content already in the cache is not stored twice.
+
+        Args:
+            url (str): The file URL.
+
+        Returns:
+            dict: {"hash", "path", "size"}, or None if the download failed.
+        """
+        for attempt in range(self.MAX_RETRIES + 1):
+            temp_path = None
+            try:
+                os.makedirs(self.cache_dir, exist_ok = True)
+                sha = hashlib.sha256()
+                size = 0
+                with requests.get(url, stream = True, timeout = 60) as response:
+                    response.raise_for_status()
+                    with tempfile.NamedTemporaryFile(dir = self.cache_dir, delete = False) as temp_file:
+                        temp_path = temp_file.name
+                        for chunk in response.iter_content(chunk_size = self.CHUNK_SIZE):
+                            sha.update(chunk)
+                            temp_file.write(chunk)
+                            size += len(chunk)
+
+                content_hash = sha.hexdigest()
+                cache_path = self._cache_path(content_hash)
+                if os.path.exists(cache_path):
+                    os.remove(temp_path)
+                    self._count("cached")
+                else:
+                    os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+                    os.replace(temp_path, cache_path)
+                    self._count("downloaded")
+                return {"hash": content_hash, "path": cache_path, "size": size}
+            except (requests.exceptions.RequestException, OSError) as e:
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
+                if attempt < self.MAX_RETRIES:
+                    logger.error(f"Error downloading {url}: {e}. Trying again in {self.RETRY_DELAY} seconds.")
+                    time.sleep(self.RETRY_DELAY)
+                else:
+                    logger.error(f"Error downloading {url} too many times: {e}")
+        self._count("failed")
+        return None
+
+    def download_all(self, urls):
+        """
+        Downloads every URL not yet downloaded this run, at most max_workers at a time.
+
+        Args:
+            urls (iterable of str): File URLs, duplicates are fetched once.
+
+        Returns:
+            dict: url: download info, see download.
+        """
+        pending = [url for url in dict.fromkeys(urls) if url not in self.downloads]
+        print(f"Downloading {len(pending)} files with {self.max_workers} workers.")
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            for url, info in zip(pending, executor.map(self.download, pending)):
+                if info:
+                    self.downloads[url] = info
+        return self.downloads
+
+    def transfer(self, table, field_name, record_files):
+        """
+        Attaches downloaded files to an Airtable attachment field.
+
+        Args:
+            table (pyairtable.Table): The Airtable table holding the records.
+            field_name (str): The name of the attachment field.
+            record_files (dict): Airtable record ID: list of (file name, url) pairs from collect_files.
+
+        Returns:
+            dict: The transfer statistics.
+        """
+        self.download_all(url for files in record_files.values() for _, url in files)
+
+        # Split every record's files into attachments Airtable can copy by URL and files that still need an upload.
+        current = {} # record ID: attachment list as last written.
+        uploads = {} # record ID: list of (file name, download info) to upload.
+        for record_id, files in record_files.items():
+            attachments = []
+            for file_name, url in files:
+                info = self.downloads.get(url)
+                if info is None:
+                    continue
+                if info["hash"] in self.airtable_copies:
+                    attachments.append({"url": self.airtable_copies[info["hash"]], "filename": file_name})
+                    self._count("reused")
+                elif info["size"] > self.AIRTABLE_UPLOAD_LIMIT:
+                    attachments.append({"url": url, "filename": file_name})
+                    self._count("by_url")
+                else:
+                    uploads.setdefault(record_id, []).append((file_name, info))
+            current[record_id] = attachments
+        self._batch_update(table, field_name, current)
+
+        # Upload each new file once. Records needing a file another record already uploaded get the Airtable copy afterwards.
+        followups = {}
+        for record_id, files in uploads.items():
+            for file_name, info in files:
+                if info["hash"] in self.airtable_copies:
+                    followups.setdefault(record_id, []).append({"url": self.airtable_copies[info["hash"]], "filename": file_name})
+                    self._count("reused")
+                    continue
+                try:
+                    with open(info["path"], 'rb') as file:
+                        response = table.upload_attachment(record_id, field_name, file_name, file.read())
+                except Exception as e:
+                    self._count("failed")
+                    logger.error(f"Error uploading {file_name} to record {record_id}: {e}")
+                    continue
+                self._count("uploaded")
+                uploaded = list(response.get("fields", {}).values())
+                if uploaded and uploaded[0]:
+                    # The response holds the whole field, existing attachments are kept on later updates by their ID.
+                    current[record_id] = [{"id": attachment["id"]} for attachment in uploaded[0]]
+                    self.airtable_copies[info["hash"]] = uploaded[0][-1]["url"]
+        self._batch_update(table, field_name, {record_id: current[record_id] + attachments for record_id, attachments in followups.items()})
+
+        print(f"Attachment transfer for field {field_name}: {self.stats}")
+        logger.info(f"Attachment transfer for field {field_name}: {self.stats}")
+        return self.stats
+
+    def _batch_update(self, table, field_name, attachments_by_record):
+        updates = [{"id": record_id, "fields": {field_name: attachments}} for record_id, attachments in attachments_by_record.items()]
+        if self.write_scheduler:
+            self.write_scheduler.batch_update(table, updates).wait()
+            return
+        for index in range(0, len(updates), self.AIRTABLE_BATCH_SIZE):
+            table.batch_update(updates[index:index + self.AIRTABLE_BATCH_SIZE])
@@ -16,6 +16,21 @@ send_email method parameters:
 - subject (str): The subject of the email. Optional, defaults to an empty string.
 - body (str): The body of the email. Optional, defaults to an empty string.
 - file_attachment_paths (list of str): A list of file paths for attachments. Optional, defaults to None.
+Returns True if the email was sent, False otherwise.
+
+send_many method parameters:
+- email_config_path (str): The path to the email configuration JSON file. Required.
+- messages (list of dict): One dictionary per email with the keys "subject", "body" and "file_attachment_paths", all optional.
+    "to_email", "cc_email" and "bcc_email" override the recipients from the configuration file for that email.
+Returns a list of per-message results: {"index": int, "subject": str, "sent": bool, "error": str or None}.
+All messages are sent over one authenticated SMTP connection. If the server drops the connection, it is reopened and the message retried once.
+
+Configuration files are cached and only reloaded when they change on disk.
+Connections are reused for as long as the AutomatedEmails object is used as a context manager:
+    with AutomatedEmails() as mailer:
+        mailer.send_email(...)
+        mailer.send_many(...)
+Outside of a with block, send_email and send_many close their connection when they are done.
 
 Example configuration file (email_config.json):
 {
@@ -29,47 +44,161 @@ Example configuration file (email_config.json):
     "cc_email": ["cc_recipient1@example.com", "cc_recipient2@example.com"],
     "bcc_email": []
 }
+"smtp_starttls" (default true) can be set to false for servers without TLS, such as a local relay. Without "smtp_username" no login is attempted.
 '''
 
 import smtplib
+import base64
+import gzip
+import uuid
+import zipfile
+from email.utils import formataddr, formatdate, make_msgid
+from email.header import Header
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 import os
 import json
+import queue
+import collections
+import threading
+import time
+import atexit
+import logging
+
+class _SMTPDataWriter:
+    '''
+    Writes a message to an SMTP connection after the DATA command, dot-stuffing lines that start with a period.
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+        self.at_line_start = True
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        data = data.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+        if self.at_line_start and data.startswith(b'.'):
+            data = b'.' + data
+        data = data.replace(b'\r\n.', b'\r\n..')
+        self.connection.sock.sendall(data)
+        self.at_line_start = data.endswith(b'\r\n')
+
+
+class _Base64Writer:
+    '''
+    File-like object that base64 encodes whatever is written to it into 76 character lines on an _SMTPDataWriter.
+    Used directly for plain attachments and as the output file of GzipFile and ZipFile for compressed ones.
+    '''
+    LINE_BYTES = 57 # 57 bytes encode to one 76 character line.
+
+    def __init__(self, data_writer):
+        self.data_writer = data_writer
+        self.buffer = b''
+        self.written = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.written += len(data)
+        usable = len(self.buffer) - len(self.buffer) % self.LINE_BYTES
+        if usable:
+            self.data_writer.write(base64.encodebytes(self.buffer[:usable]))
+            self.buffer = self.buffer[usable:]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.buffer:
+            self.data_writer.write(base64.encodebytes(self.buffer))
+            self.buffer = b''
+
 
 class AutomatedEmails:
+    MAX_RETRIES = 3
+    RETRY_DELAY = 5 # seconds, doubled after every failed attempt.
+    MAX_DISPATCH_RESULTS = 1000 # Results of queued emails kept until drained, the oldest are dropped first.
+    STOP_TIMEOUT = 5 # seconds, wait for room in the queue for a stop signal before dropping unsent emails.
+
     def __init__(self):
-        pass
+        self._config_cache = {} # path: (modification time, config)
+        self._connections = {} # (server, port, username): open and authenticated smtplib.SMTP
+        self._keep_alive = False
+        self._queue = None
+        self._workers = []
+        self._results_lock = threading.Lock()
+        self.dispatch_results = collections.deque(maxlen = self.MAX_DISPATCH_RESULTS)
 
-    # string, string = "", string = "", list of strings = None
-    def send_email(self, email_config_path, subject = "", body = "", file_attachment_paths = None): 
-        def load_email_config(email_config_file_name):
-            print(f"Loading email configuration from {email_config_file_name}...")
+    def __enter__(self):
+        self._keep_alive = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._keep_alive = False
+        self.close()
+
+    def close(self):
+        for connection in self._connections.values():
             try:
-                with open(email_config_file_name, 'r') as file:
-                    email_config = json.load(file)
-                return email_config
-            except FileNotFoundError:
-                print(f"Email configuration file '{email_config_file_name}' not found.")
-                return None
+                connection.quit()
+            except smtplib.SMTPException:
+                connection.close()
+            except OSError:
+                pass
+        self._connections = {}
 
-        # Load email configuration from JSON file
-        email_config = load_email_config(email_config_path)
-        if email_config is None: return
+    def load_email_config(self, email_config_file_name):
+        try:
+            modified = os.path.getmtime(email_config_file_name)
+            cached = self._config_cache.get(email_config_file_name)
+            if cached and cached[0] == modified:
+                return cached[1]
+            print(f"Loading email configuration from {email_config_file_name}...")
+            with open(email_config_file_name, 'r') as file:
+                email_config = json.load(file)
+            self._config_cache[email_config_file_name] = (modified, email_config)
+            return email_config
+        except FileNotFoundError:
+            print(f"Email configuration file '{email_config_file_name}' not found.")
+            return None
+
+    def _connect(self, email_config):
+        key = (email_config['smtp_server'], email_config['smtp_port'], email_config.get('smtp_username'))
+        connection = self._connections.get(key)
+        if connection is None:
+            print(f"Connecting to {email_config['smtp_server']}...")
+            connection = smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port'])
+            if email_config.get('smtp_starttls', True):
+                connection.starttls()
+            if email_config.get('smtp_username'):
+                connection.login(email_config['smtp_username'], email_config['smtp_password'])
+            self._connections[key] = connection
+        return key, connection
 
+    def _send(self, email_config, from_email, recipients, text):
+        """
+        Sends a message over the pooled connection. A connection the server has dropped is reopened and the message is sent once more.
+        """
+        key, connection = self._connect(email_config)
+        try:
+            connection.sendmail(from_email, recipients, text)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            print("SMTP connection lost, reconnecting...")
+            self._connections.pop(key, None)
+            key, connection = self._connect(email_config)
+            connection.sendmail(from_email, recipients, text)
+
+    # dict, string, string, list of strings, string, list overrides -> (MIMEMultipart, list of strings) or None
+    def build_message(self, email_config, subject = "", body = "", file_attachment_paths = None, email_config_path = "", to_email = None, cc_email = None, bcc_email = None):
         # Set email configuration variables
         print("Setting email configuration variables...")
-        smtp_server = email_config['smtp_server'] # string
-        smtp_port = email_config['smtp_port'] # int
-        smtp_username = email_config['smtp_username'] # string
-        smtp_password = email_config['smtp_password'] # string
         from_name = email_config['from_name'] # string
         from_email = email_config['from_email'] # string
-        to_email = email_config['to_email'] # list of strings
-        cc_email = email_config['cc_email'] # list of strings
-        bcc_email = email_config['bcc_email'] # list of strings
+        to_email = to_email if to_email is not None else email_config['to_email'] # list of strings
+        cc_email = cc_email if cc_email is not None else email_config['cc_email'] # list of strings
+        bcc_email = bcc_email if bcc_email is not None else email_config['bcc_email'] # list of strings
 
         # Create the email
         print("Generating email...")
@@ -77,11 +206,11 @@ class AutomatedEmails:
         if from_email: msg['From'] = f"{from_name} <{from_email}>"
         else:
             print(f"No sender address in {email_config_path}.")
-            return
+            return None
         if to_email: msg['To'] = ', '.join(to_email)
         else:
             print(f"No recipient address in {email_config_path}.")
-            return
+            return None
         if cc_email: msg['Cc'] = ', '.join(cc_email)
         if bcc_email: msg['Bcc'] = ', '.join(bcc_email)
         msg['Subject'] = subject if subject else ""
@@ -103,26 +232,340 @@ class AutomatedEmails:
                         msg.attach(part)
                 except FileNotFoundError:
                     print(f"File '{file_path}' not found. Aborting email.")
-                    return
+                    return None
                 except Exception as e:
                     print(f"Failed to attach file '{file_path}': {e}")
-                    return
+                    return None
 
-        # Combine all recipients
-        all_recipients = to_email
+        # Combine all recipients. Copied so the cached configuration is left untouched.
+        all_recipients = list(to_email)
         if cc_email: all_recipients += cc_email
         if bcc_email: all_recipients += bcc_email
+        return msg, all_recipients
+
+    # string, string = "", string = "", list of strings = None
+    def send_email(self, email_config_path, subject = "", body = "", file_attachment_paths = None): 
+        # Load email configuration from JSON file
+        email_config = self.load_email_config(email_config_path)
+        if email_config is None: return False
+
+        built = self.build_message(email_config, subject, body, file_attachment_paths, email_config_path)
+        if built is None: return False
+        msg, all_recipients = built
 
         # Send the email
         try:
             print("Sending email...")
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            text = msg.as_string()
-            server.sendmail(from_email, all_recipients, text)
-            server.quit()
+            self._send(email_config, email_config['from_email'], all_recipients, msg.as_string())
+            print("Email sent successfully.")
+            return True
+        except Exception as e:
+            print(f"Failed to send email: {e}")
+            return False
+        finally:
+            if not self._keep_alive: self.close()
+
+    # string, list of dicts
+    def send_many(self, email_config_path, messages):
+        email_config = self.load_email_config(email_config_path)
+        if email_config is None:
+            return [{"index": index, "subject": message.get("subject", ""), "sent": False, "error": "Email configuration not found."} for index, message in enumerate(messages)]
+
+        results = []
+        try:
+            for index, message in enumerate(messages):
+                result = {"index": index, "subject": message.get("subject", ""), "sent": False, "error": None}
+                built = self.build_message(
+                    email_config, message.get("subject", ""), message.get("body", ""), message.get("file_attachment_paths"), email_config_path,
+                    message.get("to_email"), message.get("cc_email"), message.get("bcc_email")
+                )
+                if built is None:
+                    result["error"] = "Message could not be built."
+                    results.append(result)
+                    continue
+                msg, all_recipients = built
+                try:
+                    self._send(email_config, email_config['from_email'], all_recipients, msg.as_string())
+                    result["sent"] = True
+                except Exception as e:
+                    print(f"Failed to send email {index}: {e}")
+                    result["error"] = str(e)
+                results.append(result)
+        finally:
+            if not self._keep_alive: self.close()
+
+        print(f"{sum(result['sent'] for result in results)} of {len(messages)} emails sent successfully.")
+        return results
+
+    # int = 1, int = 100
+    def start_dispatcher(self, workers = 1, max_queue = 100):
+        if self._workers:
+            return
+        print(f"Starting email dispatcher with {workers} workers...")
+        self._queue = queue.Queue(maxsize = max_queue)
+        for number in range(workers):
+            worker = threading.Thread(target = self._dispatch_worker, name = f"EmailDispatcher-{number}", daemon = True)
+            worker.start()
+            self._workers.append(worker)
+        atexit.register(self.stop_dispatcher)
+
+    # string, string = "", string = "", list of strings = None, float = 10
+    def send_email_async(self, email_config_path, subject = "", body = "", file_attachment_paths = None, enqueue_timeout = 10):
+        if not self._workers:
+            self.start_dispatcher()
+        message = {"email_config_path": email_config_path, "subject": subject, "body": body, "file_attachment_paths": file_attachment_paths}
+        try:
+            self._queue.put(message, timeout = enqueue_timeout)
+            return True
+        except queue.Full:
+            print(f"Email queue is full, dropping email '{subject}'.")
+            logging.error(f"Email queue is full, dropping email '{subject}'.")
+            return False
+
+    # float = None -> bool
+    def flush(self, timeout = None):
+        if self._queue is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    print(f"Email queue not drained, {self._queue.unfinished_tasks} emails still pending.")
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    # -> list of dict
+    def drain_results(self):
+        # Returns and forgets the results of the emails sent by the dispatcher so far.
+        with self._results_lock:
+            results = list(self.dispatch_results)
+            self.dispatch_results.clear()
+        return results
+
+    # bool = True, float = None
+    def stop_dispatcher(self, flush = True, timeout = None):
+        if not self._workers:
+            return
+        if flush:
+            self.flush(timeout)
+        for _ in self._workers:
+            self._put_stop_signal() # One stop signal per worker.
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+        atexit.unregister(self.stop_dispatcher)
+        print("Email dispatcher stopped.")
+
+    def _put_stop_signal(self):
+        try:
+            self._queue.put(None, timeout = self.STOP_TIMEOUT)
+            return
+        except queue.Full:
+            pass
+        # The queue stays full, drop the unsent emails to make room. Stop signals already queued are kept.
+        signals = 0
+        dropped = 0
+        while True:
+            try:
+                message = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if message is None:
+                signals += 1
+            else:
+                dropped += 1
+        print(f"Email queue still full while stopping, dropped {dropped} unsent emails.")
+        logging.error(f"Email queue still full while stopping, dropped {dropped} unsent emails.")
+        for _ in range(signals + 1):
+            self._queue.put_nowait(None)
+
+    def _dispatch_worker(self):
+        # Every worker has its own mailer, SMTP connections cannot be shared between threads.
+        with AutomatedEmails() as mailer:
+            while True:
+                message = self._queue.get()
+                try:
+                    if message is None:
+                        return
+                    try:
+                        result = mailer._send_with_retry(message)
+                    except Exception as e:
+                        # A broken config or message fails this email only, the worker keeps serving the queue.
+                        print(f"Failed to send email '{message.get('subject')}': {e}")
+                        logging.error(f"Failed to send email '{message.get('subject')}': {e}")
+                        result = {"subject": message.get("subject"), "sent": False, "error": str(e), "attempts": 0}
+                    with self._results_lock:
+                        self.dispatch_results.append(result)
+                finally:
+                    self._queue.task_done()
+
+    def _send_with_retry(self, message):
+        result = {"subject": message["subject"], "sent": False, "error": None, "attempts": 0}
+        email_config = self.load_email_config(message["email_config_path"])
+        if email_config is None:
+            result["error"] = "Email configuration not found."
+            return result
+        built = self.build_message(email_config, message["subject"], message["body"], message["file_attachment_paths"], message["email_config_path"])
+        if built is None:
+            result["error"] = "Message could not be built."
+            return result
+        msg, all_recipients = built
+        text = msg.as_string()
+
+        delay = self.RETRY_DELAY
+        while True:
+            result["attempts"] += 1
+            try:
+                self._send(email_config, email_config['from_email'], all_recipients, text)
+                result["sent"] = True
+                return result
+            except Exception as e:
+                result["error"] = str(e)
+                self.close() # Start over with a fresh connection.
+                if result["attempts"] > self.MAX_RETRIES:
+                    print(f"Failed to send email '{message['subject']}' too many times: {e}")
+                    logging.error(f"Failed to send email '{message['subject']}' too many times: {e}")
+                    return result
+                print(f"Failed to send email '{message['subject']}': {e}. Trying again in {delay} seconds.")
+                time.sleep(delay)
+                delay *= 2
+
+    # string, string = "", string = "", list of strings = None, string = None, int = None, string = "compress"
+    def send_email_streaming(self, email_config_path, subject = "", body = "", file_attachment_paths = None, compression = None, max_attachment_size = None, oversize_policy = "compress"):
+        email_config = self.load_email_config(email_config_path)
+        if email_config is None: return False
+
+        from_email = email_config['from_email']
+        to_email = email_config['to_email']
+        cc_email = email_config['cc_email']
+        if not from_email:
+            print(f"No sender address in {email_config_path}.")
+            return False
+        if not to_email:
+            print(f"No recipient address in {email_config_path}.")
+            return False
+        all_recipients = list(to_email) + list(cc_email or []) + list(email_config['bcc_email'] or [])
+
+        # Decide per attachment how it is sent before anything goes on the wire.
+        attachments = [] # (file path, compression)
+        skipped = []
+        for file_path in file_attachment_paths or []:
+            if not os.path.isfile(file_path):
+                print(f"File '{file_path}' not found. Aborting email.")
+                return False
+            file_compression = compression
+            if max_attachment_size and os.path.getsize(file_path) > max_attachment_size:
+                if oversize_policy == "skip":
+                    print(f"File '{file_path}' is larger than {max_attachment_size} bytes, skipping.")
+                    skipped.append(os.path.basename(file_path))
+                    continue
+                if oversize_policy == "compress" and not file_compression:
+                    file_compression = "gzip"
+            attachments.append((file_path, file_compression))
+
+        body = body if body else ""
+        if skipped:
+            body += "\n\nAttachments left out for size: " + ", ".join(skipped)
+
+        boundary = f"=============={uuid.uuid4().hex}=="
+        headers = [
+            f"From: {formataddr((str(Header(email_config['from_name'], 'utf-8')), from_email))}",
+            f"To: {', '.join(to_email)}",
+        ]
+        if cc_email: headers.append(f"Cc: {', '.join(cc_email)}")
+        headers += [
+            f"Subject: {Header(subject if subject else '', 'utf-8').encode()}",
+            f"Date: {formatdate(localtime = True)}",
+            f"Message-ID: {make_msgid()}",
+            "MIME-Version: 1.0",
+            f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        ]
+
+        def write_message(data_writer):
+            data_writer.write("\r\n".join(headers) + "\r\n\r\n")
+            data_writer.write(f"--{boundary}\r\nContent-Type: text/plain; charset=\"utf-8\"\r\nContent-Transfer-Encoding: base64\r\n\r\n")
+            text_writer = _Base64Writer(data_writer)
+            text_writer.write(body.encode('utf-8'))
+            text_writer.close()
+            for file_path, file_compression in attachments:
+                print(f"Streaming attachment '{file_path}'...")
+                file_name = os.path.basename(file_path)
+                content_type = "application/octet-stream"
+                if file_compression == "gzip":
+                    file_name, content_type = f"{file_name}.gz", "application/gzip"
+                elif file_compression == "zip":
+                    file_name, content_type = f"{file_name}.zip", "application/zip"
+                data_writer.write(
+                    f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\nContent-Transfer-Encoding: base64\r\n"
+                    f"Content-Disposition: attachment; filename=\"{file_name}\"\r\n\r\n"
+                )
+                encoder = _Base64Writer(data_writer)
+                with open(file_path, 'rb') as attachment:
+                    if file_compression == "gzip":
+                        with gzip.GzipFile(filename = os.path.basename(file_path), mode = 'wb', fileobj = encoder) as compressed:
+                            self._copy_chunks(attachment, compressed)
+                    elif file_compression == "zip":
+                        with zipfile.ZipFile(encoder, 'w', compression = zipfile.ZIP_DEFLATED) as archive:
+                            with archive.open(os.path.basename(file_path), 'w', force_zip64 = True) as compressed:
+                                self._copy_chunks(attachment, compressed)
+                    else:
+                        self._copy_chunks(attachment, encoder)
+                encoder.close()
+            data_writer.write(f"\r\n--{boundary}--\r\n")
+
+        try:
+            print("Sending email...")
+            self._send_streaming(email_config, from_email, all_recipients, write_message)
             print("Email sent successfully.")
+            return True
         except Exception as e:
             print(f"Failed to send email: {e}")
+            self.close() # The connection may be in the middle of a DATA command.
+            return False
+        finally:
+            if not self._keep_alive: self.close()
 
+    def _copy_chunks(self, source, destination, chunk_size = 57 * 1024):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            destination.write(chunk)
+
+    def _send_streaming(self, email_config, from_email, recipients, write_message):
+        """
+        Runs the SMTP envelope commands and streams the message through write_message(data_writer) instead of sending one string.
+        A dropped connection is reopened once, before any data has been sent.
+        """
+        key, connection = self._connect(email_config)
+        try:
+            code, response = connection.mail(from_email)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            print("SMTP connection lost, reconnecting...")
+            self._connections.pop(key, None)
+            key, connection = self._connect(email_config)
+            code, response = connection.mail(from_email)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, response, from_email)
+        accepted = 0
+        for recipient in recipients:
+            code, response = connection.rcpt(recipient)
+            if code in (250, 251):
+                accepted += 1
+        if not accepted:
+            connection.rset()
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, response) for recipient in recipients})
+        code, response = connection.docmd("DATA")
+        if code != 354:
+            raise smtplib.SMTPDataError(code, response)
+        data_writer = _SMTPDataWriter(connection)
+        write_message(data_writer)
+        if not data_writer.at_line_start:
+            data_writer.write("\r\n")
+        connection.sock.sendall(b".\r\n")
+        code, response = connection.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# Notion to Airtable Migration CLI
+# One entry point for the migration tools: planning, migrating, linking, syncing and exporting, for all configured databases or
+# only some of them. Each command imports the modules it uses when it runs, so the CLI starts without loading pyairtable, pyarrow
+# or any credentials, and --help answers immediately.
+
+'''
+Dependencies:
+- Per command, the modules it runs (see below) and their dependencies.
+
+Usage:
+    python src/MigrationCLI.py <command> [--config path] [-d database ...] [options]
+
+    -d / --database selects databases by Notion database ID (dashed or not) or Airtable table name, and can be repeated.
+    Without it every database of the configuration is used.
+
+Commands:
+    plan      MigrationPlanner.py, dry-run estimate.                    [--no-count]
+    migrate   NotionToAirtableMigrator.py.                              [--stages records,attachments,bodies,link] [--spill-to-disk]
+                                                                        [--response-cache] [--profile [cpu|memory]]
+              The schema stages (table check, type map, property repair, class generation) always run. Skipped stages reuse the
+              records saved by earlier runs, e.g. --stages attachments re-transfers files without saving records again.
+    link      The relation link stage of NotionToAirtableMigrator.py on its own, from the relation map and record hashes
+              of an earlier migration.                                  [--response-cache] [--profile [cpu|memory]]
+    sync      SyncDaemon.py, or ReverseSync.py with --reverse.
+    export    NotionExport.py.                                          [--format parquet|arrow] [--out-dir path] [--row-group-size n]
+
+Examples:
+    python src/MigrationCLI.py plan --no-count
+    python src/MigrationCLI.py migrate -d Tasks -d Projects --stages records,link
+    python src/MigrationCLI.py link -d Tasks
+    python src/MigrationCLI.py export -d 1f2e3d4c5b6a79881f2e3d4c5b6a7988 --format arrow
+'''
+
+import argparse, json, logging, os, sys
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'conf/NotionAirtableMigrationConfig.json'
+MIGRATION_STAGES = ('records', 'attachments', 'bodies', 'link') # Same as NotionToAirtableMigrator.MIGRATION_STAGES.
+
+
+def _normalize_id(notion_id):
+    return notion_id.replace('-', '').lower()
+
+def load_config(config_path):
+    with open(config_path, 'r') as config_file:
+        return json.load(config_file)
+
+def select_databases(config, selection = None):
+    """
+    Returns the entries of config whose Notion database ID or Airtable table name is in selection, all of them if selection is empty.
+    Selections matching no entry are reported and ignored.
+    """
+    if not selection:
+        return config
+    selected = []
+    for item in selection:
+        matches = [
+            database for database in config
+            if _normalize_id(database['notion_db_id']) == _normalize_id(item) or database['airtable_table_name'] == item
+        ]
+        if not matches:
+            print(f"Database {item} is not in the configuration, ignoring it.")
+            logger.error(f"Database {item} is not in the configuration, ignoring it.")
+        selected += [database for database in matches if database not in selected]
+    return selected
+
+def parse_stages(value):
+    stages = [stage.strip() for stage in value.split(',') if stage.strip()]
+    unknown = [stage for stage in stages if stage not in MIGRATION_STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stages {', '.join(unknown)}, expected any of {', '.join(MIGRATION_STAGES)}")
+    return stages
+
+
+def run_plan(args, config):
+    from MigrationPlanner import MigrationPlanner
+    planner = MigrationPlanner(count_pages = not args.no_count)
+    migration_plan = planner.plan(config)
+    planner.print_plan(migration_plan)
+    planner.write_plan(migration_plan)
+    return 0
+
+def _init_migrator(args):
+    import NotionToAirtableMigrator as migrator
+    migrator.configure_logging()
+    notion_helper, _ = migrator.init_clients()
+    if args.response_cache:
+        notion_helper.enable_response_cache()
+    if args.profile:
+        from StageProfiler import StageProfiler
+        migrator.profiler = StageProfiler(enabled = True, cpu = args.profile != 'memory', memory = args.profile != 'cpu')
+        notion_helper.profiler = migrator.profiler
+    return migrator
+
+def _finish_migrator(migrator):
+    migrator.notion_helper.report_response_cache()
+    migrator.profiler.write_summary()
+
+def run_migrate(args, config):
+    migrator = _init_migrator(args)
+    try:
+        migrator.migrate(config, spill_to_disk = args.spill_to_disk, stages = args.stages)
+    finally:
+        _finish_migrator(migrator)
+    return 0
+
+def run_link(args, config):
+    migrator = _init_migrator(args)
+    try:
+        migrator.link(config)
+    finally:
+        _finish_migrator(migrator)
+    return 0
+
+def run_sync(args, config):
+    import NotionToAirtableMigrator as migrator
+    migrator.configure_logging()
+    if args.reverse:
+        from ReverseSync import ReverseSync as Sync
+    else:
+        from SyncDaemon import SyncDaemon as Sync
+    sync = Sync(args.config)
+    sync.config = config
+    sync.run()
+    return 0
+
+def run_export(args, config):
+    from NotionExport import NotionExport
+    exporter = NotionExport(row_group_size = args.row_group_size)
+    for database in config:
+        path = None
+        if args.out_dir:
+            path = os.path.join(args.out_dir, f"{database['airtable_table_name']}{NotionExport.FORMATS[args.format]}")
+        exporter.export(database['notion_db_id'], path, args.format)
+    return 0
+
+
+COMMANDS = {
+    'plan': run_plan,
+    'migrate': run_migrate,
+    'link': run_link,
+    'sync': run_sync,
+    'export': run_export
+}
+
+
+def build_parser():
+    shared = argparse.ArgumentParser(add_help = False)
+    shared.add_argument('--config', default = CONFIG_PATH, help = f'Migration configuration file (default {CONFIG_PATH}).')
+    shared.add_argument('-d', '--database', action = 'append', dest = 'databases', metavar = 'ID_OR_TABLE',
+                        help = 'Notion database ID or Airtable table name to include, repeatable. Default: every configured database.')
+
+    parser = argparse.ArgumentParser(prog = 'MigrationCLI.py', description = 'Notion to Airtable migration tools.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    plan = commands.add_parser('plan', parents = [shared], help = 'Estimate the requests and time a migration needs.')
+    plan.add_argument('--no-count', action = 'store_true', help = 'Skip the page count pass.')
+
+    migrate = commands.add_parser('migrate', parents = [shared], help = 'Migrate databases to Airtable.')
+    migrate.add_argument('--stages', type = parse_stages, default = list(MIGRATION_STAGES),
+                         help = f"Comma separated stages to run (default {','.join(MIGRATION_STAGES)}).")
+    migrate.add_argument('--spill-to-disk', action = 'store_true', help = 'Keep pages and rows in spool files instead of memory.')
+
+    link = commands.add_parser('link', parents = [shared], help = 'Link the records of migrated databases.')
+
+    for command in (migrate, link):
+        command.add_argument('--response-cache', action = 'store_true',
+                             help = 'Cache page and page property responses, see NotionApiHelper.enable_response_cache.')
+        command.add_argument('--profile', nargs = '?', const = 'all', choices = ('all', 'cpu', 'memory'),
+                             help = 'Profile every stage with cProfile and/or tracemalloc, see StageProfiler. Written to output/profiles.')
+
+    sync = commands.add_parser('sync', parents = [shared], help = 'Push Notion edits to Airtable continuously.')
+    sync.add_argument('--reverse', action = 'store_true', help = 'Push Airtable edits back to Notion once instead.')
+
+    export = commands.add_parser('export', parents = [shared], help = 'Export databases to Parquet or Arrow IPC files.')
+    export.add_argument('--format', choices = ('parquet', 'arrow'), default = 'parquet')
+    export.add_argument('--out-dir', help = 'Directory of the exported files, named after the Airtable tables. Default output/export.')
+    export.add_argument('--row-group-size', type = int)
+    return parser
+
+
+def main(argv = None):
+    args = build_parser().parse_args(argv)
+    config = select_databases(load_config(args.config), args.databases)
+    if not config:
+        print("No databases selected.")
+        return 1
+    return COMMANDS[args.command](args, config)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+# Migration Job Ledger
+# Splits a NotionToAirtableMigrator.py run into jobs kept in a SQLite ledger, so several worker processes (on one machine, or on several
+# sharing the ledger directory) can convert and save the databases in parallel, each taking the next job available.
+
+'''
+Dependencies:
+- pyairtable
+- NotionToAirtableMigrator.py and the modules it uses.
+
+Usage:
+    python src/MigrationLedger.py start [config_path]              # Creates a run, prints its ID.
+    python src/MigrationLedger.py work <run_id> [--processes n]    # Runs workers until the run is finished, start as many as wanted.
+    python src/MigrationLedger.py status <run_id>
+
+Jobs, in order:
+    1) fetch (one per database): Streams the database into shard spools of SHARD_SIZE pages, repairs the Airtable table, finds the
+       related databases and generates the class, then adds one convert job per shard and the finalize job of the database.
+    2) convert (one per shard): Converts the pages of its shard and saves them to Airtable. The saved fingerprints and record IDs
+       are checkpointed into the ledger after every chunk, a reclaimed job does not save those pages a second time.
+    3) finalize (one per database): Merges the convert results into the RecordHashStore of the table, then transfers attachments
+       and page bodies.
+    4) link (one per run): The relation link pass over every database, then output/relation_map.json.
+A job is only handed out once the earlier jobs it depends on are done: finalize waits for the jobs of its database, link for every job.
+The result is the same as a serial run of NotionToAirtableMigrator.py.
+
+Leases:
+A claimed job is leased to its worker for LEASE_SECONDS, extended by a heartbeat every LEASE_SECONDS / 3 while it runs. A worker that
+crashes stops heartbeating, its lease expires and the job is handed to the next worker that asks. Results of a worker whose lease was
+taken over are refused. Failing jobs go back to the queue up to MAX_ATTEMPTS times, then stay failed and the run does not finish.
+
+Shard spools, the record hash stores (record_hashes/) and the page body cache are kept next to the ledger file, workers on several
+machines need the ledger directory on a shared file system.
+The ledger uses the rollback journal rather than WAL for the same reason.
+
+Rate limits:
+Each process paces its own Airtable writes with an AirtableWriteScheduler set to REQUESTS_PER_SECOND divided by the number of jobs
+leased in the ledger, every worker running a job being a writer. The share is refreshed every RATE_REFRESH seconds while a job runs,
+so it follows workers starting and stopping, and the 429 backoff of the scheduler covers the gap until it does.
+Files shared by every worker (the page body cache) are merged under the ledger's write lock, see MigrationLedger.lock.
+'''
+
+import itertools, json, logging, os, re, socket, sqlite3, sys, threading, time, uuid
+from multiprocessing import Process
+
+from pyairtable import Api
+from NotionApiHelper import NotionApiHelper
+from RecordHashStore import RecordHashStore
+from RecordSpool import RecordSpool
+from AttachmentTransfer import AttachmentTransfer
+from AirtableWriteScheduler import AirtableWriteScheduler
+from AirtableSnapshot import AirtableSnapshotCache
+import NotionToAirtableMigrator as migrator
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationLedger:
+    LEDGER_PATH = 'output/migration_ledger.sqlite'
+    LEASE_SECONDS = 300
+    MAX_ATTEMPTS = 3
+    STAGE_ORDER = {'fetch': 0, 'convert': 1, 'finalize': 2, 'link': 3}
+
+    def __init__(self, path = None, lease_seconds = None):
+        self.path = path if path else self.LEDGER_PATH
+        self.lease_seconds = lease_seconds if lease_seconds else self.LEASE_SECONDS
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok = True)
+        connection = sqlite3.connect(self.path, timeout = 60)
+        with connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    created REAL,
+                    config_json TEXT
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT,
+                    stage TEXT,
+                    stage_order INTEGER,
+                    notion_db_id TEXT,
+                    shard INTEGER,
+                    params_json TEXT,
+                    status TEXT DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER DEFAULT 0,
+                    result_json TEXT,
+                    error TEXT,
+                    updated REAL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_run_status ON jobs (run_id, status, stage_order);
+            ''')
+        connection.close()
+
+    def _connect(self):
+        # One connection per call, the ledger is used from worker threads and processes.
+        connection = sqlite3.connect(self.path, timeout = 60, isolation_level = None)
+        connection.row_factory = sqlite3.Row
+        return _Transaction(connection)
+
+    def create_run(self, config):
+        """
+        Creates a run with one fetch job per database of the config and its link job.
+
+        Returns:
+            str: The run ID.
+        """
+        run_id = uuid.uuid4().hex[:12]
+        with self._connect() as connection:
+            connection.execute('INSERT INTO runs (run_id, created, config_json) VALUES (?, ?, ?)', (run_id, time.time(), json.dumps(config)))
+            for database in config:
+                self._add_job(connection, run_id, 'fetch', migrator.normalize_notion_id(database['notion_db_id']))
+            self._add_job(connection, run_id, 'link')
+        logger.info(f"Created migration run {run_id} for {len(config)} databases.")
+        return run_id
+
+    def _add_job(self, connection, run_id, stage, notion_db_id = None, shard = None, params = None):
+        connection.execute(
+            'INSERT INTO jobs (run_id, stage, stage_order, notion_db_id, shard, params_json, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (run_id, stage, self.STAGE_ORDER[stage], notion_db_id, shard, json.dumps(params or {}), time.time())
+        )
+
+    def config(self, run_id):
+        with self._connect() as connection:
+            row = connection.execute('SELECT config_json FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        return json.loads(row['config_json']) if row else None
+
+    @staticmethod
+    def _job(row):
+        job = dict(row)
+        job['params'] = json.loads(job.pop('params_json') or '{}')
+        job['result'] = json.loads(job.pop('result_json')) if job['result_json'] else None
+        return job
+
+    def claim(self, run_id, worker):
+        """
+        Leases the next job of the run whose dependencies are done. Jobs whose lease expired are handed out again.
+
+        Returns:
+            dict: The job, or None if no job can be claimed right now.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            # An expired lease counts as a failed attempt, like fail() the job stays failed after MAX_ATTEMPTS.
+            expired = connection.execute(
+                "UPDATE jobs SET status = 'failed', worker = NULL, error = 'Lease expired', updated = ? "
+                "WHERE run_id = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, run_id, now, self.MAX_ATTEMPTS)
+            ).rowcount
+            if expired:
+                logger.error(f"{expired} jobs of run {run_id} failed, their lease expired after {self.MAX_ATTEMPTS} attempts.")
+            row = connection.execute('''
+                SELECT * FROM jobs AS job
+                WHERE job.run_id = ? AND (job.status = 'pending' OR (job.status = 'leased' AND job.lease_expires < ?))
+                AND NOT EXISTS (
+                    SELECT 1 FROM jobs AS earlier
+                    WHERE earlier.run_id = job.run_id AND earlier.status != 'done' AND earlier.stage_order < job.stage_order
+                    AND (job.stage = 'link' OR earlier.notion_db_id = job.notion_db_id)
+                )
+                ORDER BY job.stage_order, job.job_id LIMIT 1
+            ''', (run_id, now)).fetchone()
+            if row is None:
+                return None
+            if row['status'] == 'leased':
+                logger.info(f"Lease of job {row['job_id']} held by {row['worker']} expired, reclaiming it.")
+            connection.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                (worker, now + self.lease_seconds, now, row['job_id'])
+            )
+            row = connection.execute('SELECT * FROM jobs WHERE job_id = ?', (row['job_id'],)).fetchone()
+        return self._job(row)
+
+    def heartbeat(self, job_id, worker):
+        """
+        Extends the lease of a job. Returns False if the worker no longer holds it.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE job_id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, time.time(), job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def checkpoint(self, job_id, worker, result):
+        """
+        Stores the partial result of a running job, read back by whichever worker runs the job next if this one dies.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET result_json = ?, updated = ? WHERE job_id = ? AND worker = ? AND status = 'leased'",
+                (json.dumps(result, default = str), time.time(), job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result, new_jobs = ()):
+        """
+        Marks a job done with its result and adds the jobs it produced, in one transaction.
+
+        Args:
+            new_jobs (iterable): (stage, notion_db_id, shard, params) tuples.
+
+        Returns:
+            bool: False if the lease was lost, nothing is written then.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'done', result_json = ?, error = NULL, updated = ? WHERE job_id = ? AND worker = ? AND status = 'leased'",
+                (json.dumps(result, default = str), time.time(), job_id, worker)
+            )
+            if cursor.rowcount != 1:
+                logger.error(f"Job {job_id} is no longer leased to {worker}, its result was dropped.")
+                return False
+            run_id = connection.execute('SELECT run_id FROM jobs WHERE job_id = ?', (job_id,)).fetchone()['run_id']
+            for stage, notion_db_id, shard, params in new_jobs:
+                self._add_job(connection, run_id, stage, notion_db_id, shard, params)
+        return True
+
+    def fail(self, job_id, worker, error):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL, error = ?, updated = ? "
+                "WHERE job_id = ? AND worker = ? AND status = 'leased'",
+                (self.MAX_ATTEMPTS, str(error), time.time(), job_id, worker)
+            )
+
+    def results(self, run_id, stage, notion_db_id = None):
+        """
+        Returns the results of the done jobs of a stage, optionally of one database.
+        """
+        query = "SELECT * FROM jobs WHERE run_id = ? AND stage = ? AND status = 'done'"
+        params = [run_id, stage]
+        if notion_db_id is not None:
+            query += ' AND notion_db_id = ?'
+            params.append(notion_db_id)
+        with self._connect() as connection:
+            rows = connection.execute(query + ' ORDER BY job_id', params).fetchall()
+        return [self._job(row) for row in rows]
+
+    def status(self, run_id):
+        """
+        Returns:
+            dict: stage: {status: job count}
+        """
+        with self._connect() as connection:
+            rows = connection.execute('SELECT stage, status, COUNT(*) AS jobs FROM jobs WHERE run_id = ? GROUP BY stage, status ORDER BY MIN(stage_order)', (run_id,)).fetchall()
+        status = {}
+        for row in rows:
+            status.setdefault(row['stage'], {})[row['status']] = row['jobs']
+        return status
+
+    def is_finished(self, run_id):
+        """
+        True once no job of the run is pending or leased. Failed jobs count as finished, see status().
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT COUNT(*) AS open FROM jobs WHERE run_id = ? AND status IN ('pending', 'leased')", (run_id,)).fetchone()
+        return row['open'] == 0
+
+    def leased_jobs(self):
+        """
+        Returns the number of jobs leased to a worker and not expired, across every run of the ledger.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT COUNT(*) AS leased FROM jobs WHERE status = 'leased' AND lease_expires >= ?", (time.time(),)).fetchone()
+        return row['leased']
+
+    def lock(self):
+        """
+        Returns a context holding the write lock of the ledger, for read-modify-write of files shared by the worker processes.
+        Claims and heartbeats of the other workers wait until it is released, keep the work inside short.
+        """
+        return self._connect()
+
+    def is_blocked(self, run_id):
+        """
+        True if a failed job keeps the remaining jobs of the run from ever being claimed.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT COUNT(*) AS failed FROM jobs WHERE run_id = ? AND status = 'failed'", (run_id,)).fetchone()
+        return row['failed'] > 0
+
+
+class _Transaction:
+    # Runs the statements of a with block in one immediate transaction, so two workers never claim the same job.
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.connection.close()
+
+
+class LedgerWorker:
+    SHARD_SIZE = 5000 # Pages per convert job.
+    POLL_INTERVAL = 5 # seconds, wait before asking again when every claimable job is taken.
+    RATE_REFRESH = 10 # seconds, how often a running job recomputes its share of the Airtable rate limit.
+
+    def __init__(self, ledger, run_id, worker_id = None, notion_helper = None, api = None):
+        self.ledger = ledger
+        self.run_id = run_id
+        self.worker_id = worker_id if worker_id else f'{socket.gethostname()}:{os.getpid()}'
+        self.config = {migrator.normalize_notion_id(database['notion_db_id']): database for database in ledger.config(run_id)}
+        self.notion_helper = notion_helper if notion_helper else NotionApiHelper()
+        if api is None:
+            with open('conf/Airtable_Token.txt', 'r') as file:
+                api = Api(file.read().strip())
+        self.api = api
+        migrator.notion_helper = self.notion_helper # The migrator stages read these module globals.
+        migrator.api = self.api
+        self.write_scheduler = None
+        self.classes = {} # Airtable table name: Model class, built once per process.
+        ledger_dir = os.path.dirname(ledger.path) or '.'
+        self.spool_dir = os.path.join(ledger_dir, 'ledger_spool', run_id)
+        # Read and written by every worker, so kept next to the ledger rather than in the local output directory.
+        self.record_hash_dir = os.path.join(ledger_dir, 'record_hashes')
+        self.page_body_cache_path = os.path.join(ledger_dir, 'page_body_cache.json')
+
+    def run(self):
+        """
+        Claims and runs jobs until the run is finished.
+
+        Returns:
+            int: The number of jobs this worker completed.
+        """
+        self.write_scheduler = AirtableWriteScheduler()
+        completed = 0
+        try:
+            while True:
+                job = self.ledger.claim(self.run_id, self.worker_id)
+                if job is None:
+                    if self.ledger.is_finished(self.run_id) or self.ledger.is_blocked(self.run_id):
+                        break
+                    time.sleep(self.POLL_INTERVAL)
+                    continue
+                self._share_rate_limit()
+                if self.run_job(job):
+                    completed += 1
+        finally:
+            self.write_scheduler.shutdown()
+        print(f"Worker {self.worker_id} done, {completed} jobs completed.")
+        return completed
+
+    def run_job(self, job):
+        print(f"Worker {self.worker_id} running {job['stage']} job {job['job_id']} ({job['notion_db_id']}, shard {job['shard']}).")
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target = self._heartbeat, args = (job['job_id'], stop_heartbeat), daemon = True)
+        heartbeat.start()
+        try:
+            handler = getattr(self, f"_{job['stage']}")
+            result, new_jobs = handler(job)
+        except Exception as e:
+            logger.error(f"{job['stage']} job {job['job_id']} failed on {self.worker_id}: {e}")
+            self.ledger.fail(job['job_id'], self.worker_id, e)
+            return False
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+        return self.ledger.complete(job['job_id'], self.worker_id, result, new_jobs)
+
+    def _heartbeat(self, job_id, stop):
+        interval = min(self.RATE_REFRESH, self.ledger.lease_seconds / 3)
+        next_heartbeat = time.monotonic() + self.ledger.lease_seconds / 3
+        while not stop.wait(interval):
+            if time.monotonic() >= next_heartbeat:
+                next_heartbeat += self.ledger.lease_seconds / 3
+                if not self.ledger.heartbeat(job_id, self.worker_id):
+                    logger.error(f"Worker {self.worker_id} lost the lease of job {job_id}.")
+                    return
+            self._share_rate_limit()
+
+    def _share_rate_limit(self):
+        # Every worker holding a job may be writing to the same base, each gets an equal share of its budget.
+        writers = max(1, self.ledger.leased_jobs())
+        requests_per_second = AirtableWriteScheduler.REQUESTS_PER_SECOND / writers
+        if self.write_scheduler.requests_per_second != requests_per_second:
+            logger.info(f"Worker {self.worker_id} writes at {requests_per_second:.2f} requests per second per base, {writers} workers running jobs.")
+            self.write_scheduler.requests_per_second = requests_per_second
+
+    def _fetch_result(self, notion_db_id):
+        results = self.ledger.results(self.run_id, 'fetch', notion_db_id)
+        return results[0]['result'] if results else None
+
+    def _airtable_class(self, database, type_map):
+        # Built in memory from the same source generate_airtable_class writes, workers on other machines have no NTAM_ file.
+        airtable_table_name = database['airtable_table_name']
+        if airtable_table_name not in self.classes:
+            namespace = {}
+            exec(migrator.construct_class(database['property_map'], database['airtable_base_id'], airtable_table_name, type_map), namespace)
+            self.classes[airtable_table_name] = namespace[re.sub(r'\W+', '', airtable_table_name.replace(" ", "_"))]
+        return self.classes[airtable_table_name]
+
+    @staticmethod
+    def _shard_pages(shard_paths):
+        for path in shard_paths:
+            yield from RecordSpool.read(path)
+
+    def _fetch(self, job):
+        notion_db_id = job['notion_db_id']
+        database = self.config[notion_db_id]
+        airtable_table_name = database['airtable_table_name']
+        property_map = database['property_map']
+
+        current_table = migrator.check_table_exists(database['airtable_base_id'], airtable_table_name)
+        if current_table is None:
+            raise RuntimeError(f"Table {airtable_table_name} not found in Airtable and could not be created.")
+
+        shard_paths = []
+        spool = None
+        first_page = None
+        for page in self.notion_helper.query_iter(notion_db_id):
+            if spool is None or len(spool) >= self.SHARD_SIZE:
+                if spool is not None:
+                    spool.close()
+                spool = RecordSpool(os.path.join(self.spool_dir, f'{notion_db_id}_{len(shard_paths)}.jsonl'))
+                shard_paths.append(spool.path)
+            spool.append(page)
+            if first_page is None:
+                first_page = page
+        if spool is not None:
+            spool.close()
+        if first_page is None:
+            print(f"No records found for database {notion_db_id}, skipping it.")
+            return {'type_map': None, 'shards': []}, []
+
+        type_map = {name: first_page['properties'][name]['type'] for name in property_map}
+        current_table, relation_list = migrator.repair_table_properties(current_table, property_map, type_map)
+        relations = {notion_db_id: {'airtable_table_name': airtable_table_name, 'airtable_base_id': database['airtable_base_id'], 'relation_mapping': {}}}
+        relations = migrator.find_relation_database(relations, relation_list, notion_db_id, self._shard_pages(shard_paths))
+        migrator.generate_airtable_class(property_map, database['airtable_base_id'], airtable_table_name, type_map)
+
+        result = {'type_map': type_map, 'relation_mapping': relations[notion_db_id]['relation_mapping'], 'table_id': current_table.id, 'shards': shard_paths}
+        new_jobs = [('convert', notion_db_id, shard, {'spool': path}) for shard, path in enumerate(shard_paths)]
+        new_jobs.append(('finalize', notion_db_id, None, {}))
+        return result, new_jobs
+
+    def _convert(self, job):
+        notion_db_id = job['notion_db_id']
+        database = self.config[notion_db_id]
+        property_map = database['property_map']
+        type_map = self._fetch_result(notion_db_id)['type_map']
+        Airtable_Class = self._airtable_class(database, type_map)
+
+        # Pages saved before a previous attempt died count as unchanged, they are not saved twice.
+        partial = job['result'] or {'saved': {}}
+        hash_store = RecordHashStore(database['airtable_table_name'], self.record_hash_dir)
+        for page_id, (record_hash, record_id) in partial['saved'].items():
+            hash_store.update(page_id, record_hash, record_id)
+
+        link_sources = {}
+        saved = dict(partial['saved'])
+        rows = migrator.convert_notion_records(RecordSpool.read(job['params']['spool']), property_map, type_map, notion_db_id, hash_store, link_sources)
+        while True:
+            chunk = list(itertools.islice(rows, migrator.SPOOL_CHUNK_SIZE))
+            if not chunk:
+                break
+            records = [migrator.build_airtable_record(row, Airtable_Class, hash_store) for row in chunk]
+            self.write_scheduler.batch_save(Airtable_Class, records).wait()
+            for page_id in hash_store.commit_staged():
+                entry = hash_store.entries[page_id]
+                saved[page_id] = [entry['hash'], entry['record_id']]
+            self.ledger.checkpoint(job['job_id'], self.worker_id, {'saved': saved})
+        skipped = hash_store.skipped - len(partial['saved'])
+        logger.info(f"Shard {job['shard']} of {notion_db_id}: {len(saved)} records saved, {skipped} unchanged.")
+        return {'saved': saved, 'link_sources': link_sources, 'skipped': skipped}, []
+
+    def _finalize(self, job):
+        notion_db_id = job['notion_db_id']
+        database = self.config[notion_db_id]
+        fetch_result = self._fetch_result(notion_db_id)
+        if fetch_result['type_map'] is None:
+            return {'saved': 0}, []
+        property_map = database['property_map']
+        current_table = self.api.table(database['airtable_base_id'], database['airtable_table_name'])
+
+        hash_store = RecordHashStore(database['airtable_table_name'], self.record_hash_dir)
+        saved_page_ids = set()
+        for convert_job in self.ledger.results(self.run_id, 'convert', notion_db_id):
+            for page_id, (record_hash, record_id) in convert_job['result']['saved'].items():
+                hash_store.update(page_id, record_hash, record_id)
+                saved_page_ids.add(page_id)
+        hash_store.save()
+
+        files_properties = [name for name, prop_type in fetch_result['type_map'].items() if prop_type == 'files' and name in property_map]
+        if files_properties and saved_page_ids:
+            attachment_transfer = AttachmentTransfer(write_scheduler = self.write_scheduler)
+            for notion_property_name in files_properties:
+                record_files = {}
+                for page in self._shard_pages(fetch_result['shards']):
+                    if page['id'] in saved_page_ids and notion_property_name in page['properties']:
+                        record_files[hash_store.record_id(page['id'])] = AttachmentTransfer.collect_files(page['properties'][notion_property_name])
+                attachment_transfer.transfer(current_table, property_map[notion_property_name], record_files)
+
+        if database.get('page_body_field'):
+            # Finalize jobs of other databases update the same cache file, it is read and merged under the ledger lock.
+            with self.ledger.lock():
+                page_body_cache = migrator.load_page_body_cache(self.page_body_cache_path)
+            migrator.migrate_page_bodies(current_table, database['page_body_field'], self._shard_pages(fetch_result['shards']), hash_store, page_body_cache, self.write_scheduler)
+            with self.ledger.lock():
+                migrator.save_page_body_cache(dict(migrator.load_page_body_cache(self.page_body_cache_path), **page_body_cache), self.page_body_cache_path)
+
+        for path in fetch_result['shards']:
+            if os.path.exists(path):
+                os.remove(path)
+        return {'saved': len(saved_page_ids)}, []
+
+    def _link(self, job):
+        relation_map = {}
+        id_indexes = {}
+        link_sources = {}
+        for notion_db_id, database in self.config.items():
+            fetch_result = self._fetch_result(notion_db_id)
+            if not fetch_result or fetch_result['type_map'] is None:
+                continue
+            relation_map[notion_db_id] = {
+                'airtable_table_name': database['airtable_table_name'],
+                'airtable_base_id': database['airtable_base_id'],
+                'relation_mapping': fetch_result['relation_mapping'],
+                'table_id': fetch_result['table_id'],
+                'property_map': database['property_map']
+            }
+            id_indexes[notion_db_id] = migrator.build_id_index(RecordHashStore(database['airtable_table_name'], self.record_hash_dir))
+            link_sources[notion_db_id] = {}
+            for convert_job in self.ledger.results(self.run_id, 'convert', notion_db_id):
+                for notion_property, sources in convert_job['result']['link_sources'].items():
+                    link_sources[notion_db_id].setdefault(notion_property, {}).update(sources)
+
+        link_count = migrator.make_relation_links(link_sources, relation_map, id_indexes, self.write_scheduler, AirtableSnapshotCache(self.api))
+
+        migrator.save_relation_map(relation_map)
+        return {'links': link_count}, []
+
+
+def _work(ledger_path, run_id):
+    migrator.configure_logging() # Worker processes that are spawned rather than forked start without it.
+    LedgerWorker(MigrationLedger(ledger_path), run_id).run()
+
+
+if __name__ == "__main__":
+    migrator.configure_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    ledger = MigrationLedger()
+
+    if command == 'start':
+        with open(sys.argv[2] if len(sys.argv) > 2 else 'conf/NotionAirtableMigrationConfig.json', 'r') as config_file:
+            run_id = ledger.create_run(json.load(config_file))
+        print(f"Run {run_id} created. Start workers with: python src/MigrationLedger.py work {run_id}")
+
+    elif command == 'work' and len(sys.argv) > 2:
+        run_id = sys.argv[2]
+        processes = int(sys.argv[sys.argv.index('--processes') + 1]) if '--processes' in sys.argv else 1
+        workers = [Process(target = _work, args = (ledger.path, run_id)) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        print(f"Run {run_id}: {ledger.status(run_id)}")
+
+    elif command == 'status' and len(sys.argv) > 2:
+        print(json.dumps(ledger.status(sys.argv[2]), indent = 4))
+
+    else:
+        print("Usage: python src/MigrationLedger.py start [config_path] | work <run_id> [--processes n] | status <run_id>")
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# Notion to Airtable Migration Planner
+# Dry-run estimator for NotionToAirtableMigrator.py. Reads the migration config, samples each Notion database and predicts
+# how many Notion/Airtable requests, batches and how much wall-clock time a migration will need, without writing anything.
+
+'''
+Dependencies:
+- NotionApiHelper (and its headers.json). No Airtable credentials are needed, nothing is written to Airtable.
+
+Usage:
+    python src/MigrationPlanner.py [config_path] [--no-count]
+
+    --no-count skips the lightweight page count pass. Record counts will then only be known for databases that fit in the
+    first sampled page, larger databases are reported as a lower bound.
+
+The plan is printed and written to output/migration_plan.json.
+
+Estimates follow the stages of NotionToAirtableMigrator.py:
+    - fetch: The full database query in build_type_map, 100 pages per request.
+    - relation_discovery: One get_page per relation property in find_relation_database. The planner makes the same
+      request once to find out which database each relation points to.
+    - relation_followups: One get_page_property per page per relation property holding more than 25 items.
+      The share of truncated relations is extrapolated from the sampled page.
+    - schema: Base/table lookups plus one create_field per mapped property (upper bound, the Airtable schema is not read).
+    - batch_save: One Airtable request per 10 records.
+    - attachments: Per files property, the file downloads (from the file hosts, CONCURRENT_DOWNLOADS at a time), one batch update
+      per 10 records holding files and one upload_attachment per file (upper bound, files shared by several pages are uploaded
+      once). Files per page are extrapolated from the sampled page.
+    - bodies: Only for databases with a page_body_field. One get_block_children per page and per nested block, measured on the
+      block trees of BODY_SAMPLE_PAGES sampled pages, plus one update per 10 records.
+    - link_pass: One schema read and at most one create_field per linked relation property, then one update per 10 records
+      holding links. Record IDs come from the record hashes of the migrated tables, related tables are not downloaded.
+      The share of records holding links is extrapolated from the sampled page.
+Every stage is estimated whether or not it is selected with --stages, a migrate run without a stage skips its time.
+'''
+
+import json, logging, math, os, sys
+
+from NotionApiHelper import NotionApiHelper
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationPlanner:
+    NOTION_REQUEST_LATENCY = 0.4  # seconds, average round trip of a Notion request.
+    NOTION_REQUEST_DELAY = 0.5  # seconds, NotionApiHelper sleeps this long before paginated and page requests.
+    AIRTABLE_REQUESTS_PER_SECOND = 5  # Airtable per-base rate limit.
+    AIRTABLE_BATCH_SIZE = 10  # Records per Airtable create/update request.
+    RELATION_PAGE_LIMIT = 25  # Relation items returned inline on a page object.
+    BODY_SAMPLE_PAGES = 3  # Pages whose block trees are fetched to size the bodies stage.
+    DOWNLOAD_SECONDS = 1.0  # seconds, average download of one attachment.
+    CONCURRENT_DOWNLOADS = 4  # Concurrent downloads, AttachmentTransfer.MAX_WORKERS.
+
+    def __init__(self, notion_helper = None, count_pages = True):
+        self.notion_helper = notion_helper if notion_helper else NotionApiHelper()
+        self.count_pages = count_pages
+
+    def load_config(self, config_path):
+        with open(config_path, 'r') as config_file:
+            return json.load(config_file)
+
+    def sample_database(self, notion_db_id, property_map, page_body_field = None):
+        """
+        Samples a Notion database with as few requests as possible.
+        The first page of results is used for the schema, relation and file statistics, the rest of the database is only counted
+        with a query projected down to the title property.
+
+        Args:
+            notion_db_id (str): The ID of the Notion database.
+            property_map (dict): Notion to Airtable property mapping for the database.
+            page_body_field (str): The page body field of the config entry. Optional, the block trees are only sampled with it.
+
+        Returns:
+            dict: Sample statistics, or {} if the database could not be queried.
+        """
+        print(f"Sampling Notion database {notion_db_id}")
+        sample = self.notion_helper.query(notion_db_id, page_num = self.notion_helper.PAGE_SIZE)
+        if not sample:
+            logger.error(f"Could not sample Notion database {notion_db_id}.")
+            return {}
+
+        sampled_requests = 1
+        type_map = {}
+        for property_name in property_map:
+            if property_name in sample[0]['properties']:
+                type_map[property_name] = sample[0]['properties'][property_name]['type']
+
+        # Share of pages whose relation property is truncated at 25 items, per relation property.
+        # One related page is fetched per relation property to learn which database it points to.
+        relation_overflow = {}
+        relation_targets = {}
+        for property_name, prop_type in type_map.items():
+            if prop_type != 'relation':
+                continue
+            truncated = 0
+            related_page_id = None
+            for page in sample:
+                prop = page['properties'].get(property_name, {})
+                if prop.get('has_more') or len(prop.get('relation', [])) >= self.RELATION_PAGE_LIMIT:
+                    truncated += 1
+                if related_page_id is None and prop.get('relation'):
+                    related_page_id = prop['relation'][0]['id']
+            relation_overflow[property_name] = truncated / len(sample)
+
+            relation_targets[property_name] = None
+            if related_page_id:
+                related_page = self.notion_helper.get_page(related_page_id)
+                sampled_requests += 1
+                if related_page:
+                    relation_targets[property_name] = related_page['parent'].get('database_id', '').replace('-', '')
+
+        # Relation properties holding at least one item, per sampled page, to size the link pass.
+        relation_filled = [
+            [name for name, prop_type in type_map.items() if prop_type == 'relation' and page['properties'].get(name, {}).get('relation')]
+            for page in sample
+        ]
+
+        # Files per page and share of pages holding files, per files property.
+        files_per_page = {}
+        files_page_share = {}
+        for property_name, prop_type in type_map.items():
+            if prop_type != 'files':
+                continue
+            file_counts = [len(page['properties'].get(property_name, {}).get('files', [])) for page in sample]
+            files_per_page[property_name] = sum(file_counts) / len(sample)
+            files_page_share[property_name] = sum(1 for count in file_counts if count) / len(sample)
+
+        body_requests_per_page = None
+        if page_body_field:
+            block_trees = self.notion_helper.get_block_trees([page['id'] for page in sample[:self.BODY_SAMPLE_PAGES]])
+            body_requests = [self._block_requests(blocks) for blocks in block_trees.values() if blocks is not None]
+            sampled_requests += sum(body_requests)
+            body_requests_per_page = sum(body_requests) / len(body_requests) if body_requests else 1
+
+        record_count = len(sample)
+        count_is_exact = len(sample) < self.notion_helper.PAGE_SIZE
+        if not count_is_exact and self.count_pages:
+            # Only the title property is returned, the cheapest way to page through a whole database.
+            title_pages = self.notion_helper.query(notion_db_id, filter_properties = ["title"])
+            if title_pages:
+                record_count = len(title_pages)
+                count_is_exact = True
+                sampled_requests += math.ceil(record_count / self.notion_helper.PAGE_SIZE)
+
+        return {
+            'record_count': record_count,
+            'count_is_exact': count_is_exact,
+            'type_map': type_map,
+            'missing_properties': [name for name in property_map if name not in type_map],
+            'relation_overflow': relation_overflow,
+            'relation_targets': relation_targets,
+            'relation_filled': relation_filled,
+            'files_per_page': files_per_page,
+            'files_page_share': files_page_share,
+            'body_requests_per_page': body_requests_per_page,
+            'sample_requests': sampled_requests
+        }
+
+    def _block_requests(self, blocks):
+        # get_block_trees pages through the children of the page and of every block it descends into, 100 per request.
+        requests = max(1, math.ceil(len(blocks) / self.notion_helper.PAGE_SIZE))
+        for block in blocks:
+            if 'children' in block:
+                requests += self._block_requests(block['children'])
+        return requests
+
+    def notion_seconds(self, requests, delayed = True):
+        return requests * (self.NOTION_REQUEST_LATENCY + (self.NOTION_REQUEST_DELAY if delayed else 0))
+
+    def airtable_seconds(self, requests):
+        return requests / self.AIRTABLE_REQUESTS_PER_SECOND
+
+    def plan_database(self, database, sample, samples_by_db_id):
+        """
+        Predicts request counts and durations per migration stage for one config entry.
+
+        Args:
+            database (dict): The config entry.
+            sample (dict): The result of sample_database for this entry.
+            samples_by_db_id (dict): Samples of every database in the config, relations to databases outside it are not linked.
+
+        Returns:
+            dict: The plan for this database.
+        """
+        record_count = sample['record_count']
+        type_map = sample['type_map']
+        relation_properties = [name for name, prop_type in type_map.items() if prop_type == 'relation']
+        stages = {}
+
+        fetch_requests = max(1, math.ceil(record_count / self.notion_helper.PAGE_SIZE))
+        stages['fetch'] = {
+            'notion_requests': fetch_requests,
+            'airtable_requests': 0,
+            'seconds': self.notion_seconds(1, delayed = False) + self.notion_seconds(fetch_requests - 1)
+        }
+
+        stages['relation_discovery'] = {
+            'notion_requests': len(relation_properties),
+            'airtable_requests': 0,
+            'seconds': self.notion_seconds(len(relation_properties))
+        }
+
+        followups = sum(math.ceil(record_count * share) for share in sample['relation_overflow'].values())
+        stages['relation_followups'] = {
+            'notion_requests': followups,
+            'airtable_requests': 0,
+            'seconds': self.notion_seconds(followups)
+        }
+
+        schema_requests = 2 + len(database['property_map'])
+        stages['schema'] = {
+            'notion_requests': 0,
+            'airtable_requests': schema_requests,
+            'seconds': self.airtable_seconds(schema_requests)
+        }
+
+        save_batches = math.ceil(record_count / self.AIRTABLE_BATCH_SIZE)
+        stages['batch_save'] = {
+            'notion_requests': 0,
+            'airtable_requests': save_batches,
+            'batches': save_batches,
+            'seconds': self.airtable_seconds(save_batches)
+        }
+
+        file_count = 0
+        attachment_requests = 0
+        attachment_batches = 0
+        for property_name, files_per_page in sample['files_per_page'].items():
+            property_files = math.ceil(record_count * files_per_page)
+            batches = math.ceil(record_count * sample['files_page_share'][property_name] / self.AIRTABLE_BATCH_SIZE)
+            file_count += property_files
+            attachment_batches += batches
+            attachment_requests += batches + property_files
+        stages['attachments'] = {
+            'notion_requests': 0,
+            'airtable_requests': attachment_requests,
+            'batches': attachment_batches,
+            'downloads': file_count,
+            'seconds': file_count * self.DOWNLOAD_SECONDS / self.CONCURRENT_DOWNLOADS + self.airtable_seconds(attachment_requests)
+        }
+
+        body_requests = 0
+        body_airtable_requests = 0
+        if database.get('page_body_field') and sample['body_requests_per_page'] is not None:
+            body_requests = math.ceil(record_count * sample['body_requests_per_page'])
+            body_airtable_requests = 1 + save_batches # Schema read, then one update per 10 records.
+        stages['bodies'] = {
+            'notion_requests': body_requests,
+            'airtable_requests': body_airtable_requests,
+            'seconds': self.notion_seconds(body_requests) + self.airtable_seconds(body_airtable_requests)
+        }
+
+        # Links are written from the record hashes, one update per 10 records holding links over every linked property together.
+        # Related databases outside the config are never built, so they cannot be linked.
+        linked_properties = [name for name in relation_properties if sample['relation_targets'].get(name) in samples_by_db_id]
+        link_requests = 0
+        link_batches = 0
+        if linked_properties:
+            linked_share = sum(1 for filled in sample['relation_filled'] if set(filled) & set(linked_properties)) / max(1, len(sample['relation_filled']))
+            link_batches = math.ceil(record_count * linked_share / self.AIRTABLE_BATCH_SIZE)
+            link_requests = 2 * len(linked_properties) + link_batches # Schema read and link field creation per property.
+        stages['link_pass'] = {
+            'notion_requests': 0,
+            'airtable_requests': link_requests,
+            'batches': link_batches,
+            'seconds': self.airtable_seconds(link_requests)
+        }
+
+        total_seconds = sum(stage['seconds'] for stage in stages.values())
+        dominant_stage = max(stages, key = lambda name: stages[name]['seconds'])
+        return {
+            'airtable_table_name': database['airtable_table_name'],
+            'airtable_base_id': database['airtable_base_id'],
+            'notion_db_id': database['notion_db_id'],
+            'record_count': record_count,
+            'count_is_exact': sample['count_is_exact'],
+            'relation_properties': relation_properties,
+            'missing_properties': sample['missing_properties'],
+            'planner_requests': sample['sample_requests'],
+            'stages': stages,
+            'notion_requests': sum(stage['notion_requests'] for stage in stages.values()),
+            'airtable_requests': sum(stage['airtable_requests'] for stage in stages.values()),
+            'seconds': total_seconds,
+            'dominant_stage': dominant_stage
+        }
+
+    def plan(self, config):
+        """
+        Builds a dry-run plan for every database in a migration config.
+
+        Args:
+            config (list of dict): The parsed NotionAirtableMigrationConfig.json.
+
+        Returns:
+            dict: Per database plans plus run totals and the stage share of the total duration.
+        """
+        samples = {}
+        for database in config:
+            sample = self.sample_database(database['notion_db_id'], database['property_map'], database.get('page_body_field'))
+            if sample:
+                samples[database['notion_db_id'].replace('-', '')] = sample
+
+        databases = []
+        for database in config:
+            notion_db_id = database['notion_db_id'].replace('-', '')
+            if notion_db_id not in samples:
+                print(f"Skipping {database['airtable_table_name']}, the Notion database could not be sampled.")
+                continue
+            databases.append(self.plan_database(database, samples[notion_db_id], samples))
+
+        stage_seconds = {}
+        for database_plan in databases:
+            for stage_name, stage in database_plan['stages'].items():
+                stage_seconds[stage_name] = stage_seconds.get(stage_name, 0) + stage['seconds']
+        total_seconds = sum(stage_seconds.values())
+
+        return {
+            'databases': databases,
+            'notion_requests': sum(plan['notion_requests'] for plan in databases),
+            'airtable_requests': sum(plan['airtable_requests'] for plan in databases),
+            'seconds': total_seconds,
+            'stage_share': {name: (seconds / total_seconds if total_seconds else 0) for name, seconds in stage_seconds.items()}
+        }
+
+    def print_plan(self, plan):
+        for database_plan in plan['databases']:
+            count = database_plan['record_count'] if database_plan['count_is_exact'] else f">={database_plan['record_count']}"
+            print(f"\n{database_plan['airtable_table_name']} ({database_plan['notion_db_id']}): {count} records")
+            if database_plan['missing_properties']:
+                print(f"  Missing Notion properties: {database_plan['missing_properties']}")
+            for stage_name, stage in database_plan['stages'].items():
+                print(f"  {stage_name:<20} notion {stage['notion_requests']:>7}  airtable {stage['airtable_requests']:>7}  {stage['seconds']:>9.1f}s")
+            print(f"  Dominant stage: {database_plan['dominant_stage']}, estimated {database_plan['seconds']:.1f}s")
+
+        print(f"\nTotal: {plan['notion_requests']} Notion requests, {plan['airtable_requests']} Airtable requests, estimated {plan['seconds'] / 60:.1f} minutes.")
+        for stage_name, share in sorted(plan['stage_share'].items(), key = lambda item: item[1], reverse = True):
+            print(f"  {stage_name:<20} {share:>6.1%}")
+
+    def write_plan(self, plan, plan_file_path = 'output/migration_plan.json'):
+        os.makedirs(os.path.dirname(plan_file_path), exist_ok = True)
+        with open(plan_file_path, 'w') as plan_file:
+            json.dump(plan, plan_file, indent = 4)
+        print(f"Plan written to {plan_file_path}")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    config_path = args[0] if args else 'conf/NotionAirtableMigrationConfig.json'
+
+    planner = MigrationPlanner(count_pages = '--no-count' not in sys.argv)
+    migration_plan = planner.plan(planner.load_config(config_path))
+    planner.print_plan(migration_plan)
+    planner.write_plan(migration_plan)
@@ -10,10 +10,10 @@ Dependencies:
 '''
 
 
-#  query(self, databaseID, filter_properties = None, content_filter = None, page_num = None):
+#  query(self, databaseID, filter_properties = None, content_filter = None, page_num = None, limit = None, sorts = None):
 """
 Sends a post request to a specified Notion database, returning the response as a dictionary. Will return {} if the request fails.
-query(string, list(opt.), dict(opt.),int(opt.)) -> dict
+query(string, list(opt.), dict(opt.), int(opt.), int(opt.), list(opt.)) -> dict
 
     Args:
         databaseID (str): The ID of the Notion database.
@@ -39,14 +39,21 @@ query(string, list(opt.), dict(opt.),int(opt.)) -> dict
                         }
                     ]
                 }
-        page_num (int): The number of pages to retrieve. Optional.
-            If not specified, all pages will be retrieved.
+        page_num (int): The page size of a single request, only the first page of results is returned. Optional, at most 100.
+            If not specified, all pages will be retrieved. Use limit to cap the number of pages instead.
+        limit (int): The most pages to return. Optional.
+            Pagination stops as soon as the limit is reached and the last request only asks for the pages still missing,
+            so the 250 most recently edited pages take 3 requests whatever the size of the database.
+        sorts (list of dict): Sort objects, applied in order. Optional.
+            Example: [{"timestamp": "last_edited_time", "direction": "descending"}, {"property": "Name", "direction": "ascending"}]
 
     Returns:
         list of dictionary objects: The "results" of the JSON response from the Notion API. This will cut out the pagination information, returning only the page data.
 
 Additional information on content filters can be found at https://developers.notion.com/reference/post-database-query-filter#the-filter-object
 Additional information on Notion queries can be found at https://developers.notion.com/reference/post-database-query
+Additional information on sorts can be found at https://developers.notion.com/reference/post-database-query-sort
+query_iter(databaseID, filter_properties = None, content_filter = None, limit = None, sorts = None) yields the same pages one at a time.
 """
 
 #  get_page(self, pageID):
@@ -108,6 +115,78 @@ update_page(string, dict) -> dict
         dict: The dictionary response from the Notion API.
 '''
 
+#  update_page_if_changed(self, pageID, properties, current_page = None):
+'''
+Change-aware version of update_page. Compares the properties against the known state of the page (current_page, the page cache, or a fresh get_page)
+and sends a patch request with only the properties that changed. No request is sent when nothing changed.
+update_pages_if_changed(updates, databaseID) does the same for many pages, fetching missing page states with one paginated query of the database.
+Counts of sent, skipped and failed requests are kept in self.update_stats and printed by report_update_stats().
+
+update_page_if_changed(string, dict, dict(opt.)) -> dict
+    Args:
+        pageID (str): The ID of the Notion page.
+        properties (dict): The properties of the page as a dictionary, built with generate_property_body.
+        current_page (dict): The current page object. Optional.
+
+    Returns:
+        dict: The dictionary response from the Notion API, or the known page object if nothing changed.
+'''
+
+#  worker_helper(self):
+'''
+The retry counter, page cache and update statistics of a helper are not thread safe. Threads updating pages each use their own worker helper,
+which shares the headers, request throttle and response cache of this one. merge_update_stats(worker) adds its statistics back afterwards.
+
+worker_helper() -> NotionApiHelper
+'''
+
+#  get_block_trees(self, blockIDs, max_workers = None):
+'''
+Fetches the body content (block children) of pages, walking nested blocks breadth first with concurrent, rate limited requests and following
+pagination cursors. Children are attached to their parent block under "children". render_blocks_text() turns the result into plain text.
+
+get_block_trees(list of string, int(opt.)) -> dict
+    Args:
+        blockIDs (list of str): The IDs of the pages or blocks.
+        max_workers (int): Number of concurrent requests. Optional.
+
+    Returns:
+        dict: blockID: list of top level child blocks, None if the tree could not be fetched.
+'''
+
+#  load_user_directory(self, refresh = False):
+'''
+Loads the workspace users (ID, name, type, email) with the paginated users list. The directory is saved to USER_CACHE_PATH and reused
+until it is older than USER_CACHE_TTL. return_property_value uses it to turn people, created_by and last_edited_by values into names,
+so decoding person columns costs no request per row. get_user_name(user) loads the directory on first use.
+
+load_user_directory(bool(opt.)) -> dict
+    Args:
+        refresh (bool): Fetch the users list even if the saved directory is still fresh. Optional.
+
+    Returns:
+        dict: userID: {"name", "type", "email"}
+'''
+
+#  enable_response_cache(self, max_entries = None, ttl = None, path = None):
+'''
+Opt-in cache of get_page and get_page_property responses, for runs that fetch the same related pages again and again (relation discovery,
+relation follow-ups past 25 items, scripts looking up the same pages). Off by default, every call makes a request.
+The cache keeps up to max_entries responses for ttl seconds, dropping the least recently used first. Concurrent calls for the same page or
+property wait for the request already in flight instead of sending their own. update_page drops the cached responses of the page it changes,
+update_page_if_changed always diffs against a fresh page. With a path, the cache is loaded when enabled and written by save_response_cache(),
+so a later run within the TTL starts warm. report_response_cache() prints the hit and miss ratios.
+
+enable_response_cache(int(opt.), int(opt.), string(opt.)) -> ResponseCache
+    Args:
+        max_entries (int): Responses kept. Optional, defaults to RESPONSE_CACHE_SIZE.
+        ttl (int): Seconds a response is served from the cache. Optional, defaults to RESPONSE_CACHE_TTL.
+        path (str): Cache file. Optional.
+
+    Returns:
+        ResponseCache: The cache, its report() returns the counts and ratios.
+'''
+
 # generate_property_body(self, prop_name, prop_type, prop_value, prop_value2 = None, annotation = None):
 '''
 Accepts a range of property types and generates a dictionary based on the input.
@@ -184,28 +263,209 @@ Accepts a range of property types and generates a dictionary based on the input.
             Acceptable Colors: Colors: "blue", "blue_background", "brown", "brown_background", "default", "gray", "gray_background", "green", "green_background", "orange", "orange_background", "pink", "pink_background", "purple", "purple_background", "red", "red_background", "yellow", "yellow_background"
 '''
 
-import requests, time, json, logging
+import requests, time, json, logging, datetime, threading, os, contextlib, copy
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# JSON codec for request and response bodies, the fastest one installed. orjson and msgspec decode large query responses several times faster.
+try:
+    import orjson
+    JSON_CODEC = "orjson"
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    try:
+        import msgspec
+        JSON_CODEC = "msgspec"
+        json_loads = msgspec.json.decode
+        json_dumps = msgspec.json.encode
+    except ImportError:
+        JSON_CODEC = "json"
+        json_loads = json.loads
+        def json_dumps(obj):
+            return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+# Compressed responses, requests decodes these transparently. Brotli is only asked for when a decoder for it is installed.
+try:
+    import brotli
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    try:
+        import brotlicffi
+        ACCEPT_ENCODING = "br, gzip, deflate"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+class ResponseCache:
+    """
+    Bounded LRU cache of API responses with a time to live, safe to share between threads.
+    Concurrent lookups of a key that is being fetched wait for that fetch instead of making their own request (single flight).
+    Cached responses are shared between callers and must not be modified.
+    """
+    def __init__(self, max_entries, ttl, path = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict() # key: (time stored, response), least recently used first.
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "expired": 0, "evicted": 0}
+        self._page_keys = {} # normalized page ID: keys cached for the page, for invalidate_page.
+        self._inflight = {} # key: [threading.Event, response] of the fetch in progress.
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    def get(self, key, fetch):
+        """
+        Returns the cached response of key, calling fetch() on a miss. Empty responses (failed requests) are not cached.
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if time.time() - entry[0] < self.ttl:
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                self._discard(key)
+                self.stats["expired"] += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = [threading.Event(), {}]
+                self.stats["misses"] += 1
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            flight[0].wait()
+            return flight[1]
+        try:
+            flight[1] = fetch()
+        finally:
+            with self._lock:
+                if flight[1]:
+                    self._store(key, flight[1])
+                del self._inflight[key]
+            flight[0].set()
+        return flight[1]
+
+    def _store(self, key, response):
+        self.entries[key] = (time.time(), response)
+        self.entries.move_to_end(key)
+        self._page_keys.setdefault(key[1], set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._discard(next(iter(self.entries)))
+            self.stats["evicted"] += 1
+
+    def _discard(self, key):
+        self.entries.pop(key, None)
+        page_keys = self._page_keys.get(key[1])
+        if page_keys is not None:
+            page_keys.discard(key)
+            if not page_keys:
+                del self._page_keys[key[1]]
+
+    def invalidate_page(self, page_id):
+        """
+        Drops every cached response of a page (the page and its property items), after the page was changed.
+        """
+        with self._lock:
+            for key in list(self._page_keys.get(page_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._page_keys.clear()
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as cache_file:
+                saved = json_loads(cache_file.read())
+        except (FileNotFoundError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            for key, stored, response in saved:
+                if now - stored < self.ttl:
+                    self._store(tuple(key), response)
+
+    def save(self):
+        """
+        Writes the entries that have not expired to the cache file, if the cache has one.
+        """
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            saved = [[list(key), stored, response] for key, (stored, response) in self.entries.items() if now - stored < self.ttl]
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok = True)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'wb') as cache_file:
+            cache_file.write(json_dumps(saved))
+        os.replace(temp_path, self.path)
+
+    def report(self):
+        stats = dict(self.stats, entries = len(self.entries))
+        lookups = stats["hits"] + stats["misses"] + stats["shared"]
+        stats["hit_ratio"] = (stats["hits"] + stats["shared"]) / lookups if lookups else 0
+        stats["miss_ratio"] = stats["misses"] / lookups if lookups else 0
+        return stats
 
 class NotionApiHelper:
     MAX_RETRIES = 3
     RETRY_DELAY = 30  # seconds
     PAGE_SIZE = 100
+    REQUEST_INTERVAL = 1 / 3  # seconds, Notion allows an average of 3 requests per second.
+    BLOCK_WORKERS = 3
+    USER_CACHE_PATH = 'output/notion_users.json'
+    USER_CACHE_TTL = 24 * 60 * 60  # seconds
+    RESPONSE_CACHE_SIZE = 4096  # responses, see enable_response_cache.
+    RESPONSE_CACHE_TTL = 5 * 60  # seconds
     
 
     def __init__(self):
         # Load headers from the external JSON file
         with open('src/headers.json', 'r') as file:
             self.headers = json.load(file)
+        self.headers.setdefault("Accept-Encoding", ACCEPT_ENCODING)
         
         self.endPoint = "https://api.notion.com/v1"
         self.counter = 0
+        self.page_cache = {} # pageID: page object, last known state of pages used by update_page_if_changed.
+        self.update_stats = {"sent": 0, "skipped": 0, "failed": 0, "properties_skipped": 0}
+        self._rate_lock = threading.Lock() # Spaces out requests made from worker threads.
+        self._next_request_time = 0
+        self.user_directory = None # userID: {"name", "type", "email"}, loaded on first use by get_user_name.
+        self._user_lock = threading.Lock()
+        self.response_cache = None # ResponseCache of get_page / get_page_property, off until enable_response_cache is called.
+        self.profiler = None # StageProfiler wrapping query and get_block_trees, set by the caller to profile a run.
     
-    def query(self, databaseID, filter_properties = None, content_filter = None, page_num = None):
+    def _profile(self, stage):
+        return self.profiler.stage(stage) if self.profiler is not None else contextlib.nullcontext()
+
+    def query(self, databaseID, filter_properties = None, content_filter = None, page_num = None, limit = None, sorts = None):
+        with self._profile("notion_query"):
+            return self._query(databaseID, filter_properties, content_filter, page_num, limit, sorts)
+
+    def _query_body(self, page_size, content_filter = None, sorts = None, start_cursor = None):
+        bodyJson = {"page_size": page_size}
+        if start_cursor:
+            bodyJson["start_cursor"] = start_cursor
+        if content_filter:
+            bodyJson["filter"] = content_filter
+        if sorts:
+            bodyJson["sorts"] = sorts
+        return bodyJson
+
+    def _query(self, databaseID, filter_properties = None, content_filter = None, page_num = None, limit = None, sorts = None):
 
         databaseJson = {}
+        if limit is not None and limit < 1:
+            return []
         get_all = page_num is None
         page_size = self.PAGE_SIZE if get_all else page_num
-        bodyJson = {"page_size": page_size, "filter": content_filter} if content_filter else {"page_size": page_size}
+        if limit is not None:
+            page_size = min(page_size, limit)
+        bodyJson = self._query_body(page_size, content_filter, sorts)
         filter_properties = "?filter_properties=" + "&filter_properties=".join(filter_properties) if filter_properties else ""
         print(f"Body JSON: {json.dumps(bodyJson)}")
         databaseJson = self._make_query_request(databaseID, filter_properties, bodyJson)
@@ -216,11 +476,13 @@ class NotionApiHelper:
 
         results = databaseJson["results"]
         print("Data returned.")
-        while databaseJson["has_more"] and get_all:
+        while databaseJson["has_more"] and get_all and (limit is None or len(results) < limit):
             print("More data available.")
             time.sleep(0.5) # To avoid rate limiting
             print("Querying next page...")
-            bodyJson = {"page_size": page_size, "start_cursor": databaseJson["next_cursor"], "filter": content_filter} if content_filter else {"page_size": page_size, "start_cursor": databaseJson["next_cursor"]}
+            if limit is not None:
+                page_size = min(self.PAGE_SIZE, limit - len(results)) # Only ask for what is still missing.
+            bodyJson = self._query_body(page_size, content_filter, sorts, databaseJson["next_cursor"])
             new_data = self._make_query_request(databaseID, filter_properties, bodyJson)
             if not new_data:
                 self.counter = 0
@@ -229,7 +491,41 @@ class NotionApiHelper:
             results.extend(databaseJson["results"])
         print("All data retrieved, returning results.")
         self.counter = 0
-        return results
+        return results[:limit] if limit is not None else results
+
+    def query_iter(self, databaseID, filter_properties = None, content_filter = None, limit = None, sorts = None):
+        """
+        Streaming version of query. Yields pages one at a time, requesting the next page of results only when the current one is used up,
+        so at most PAGE_SIZE pages are held in memory. Stops without error if a request fails.
+
+        Args:
+            databaseID (str): The ID of the Notion database.
+            filter_properties (list): Filter properties as a list of strings. Optional.
+            content_filter (dict): Content filter as a dictionary. Optional.
+            limit (int): The most pages to yield. No further page of results is requested once reached. Optional.
+            sorts (list of dict): Sort objects, e.g. [{"timestamp": "last_edited_time", "direction": "descending"}]. Optional.
+
+        Yields:
+            dict: Page objects from the "results" of each response.
+        """
+        filter_properties = "?filter_properties=" + "&filter_properties=".join(filter_properties) if filter_properties else ""
+        remaining = limit
+        start_cursor = None
+        while remaining is None or remaining > 0:
+            page_size = self.PAGE_SIZE if remaining is None else min(self.PAGE_SIZE, remaining)
+            databaseJson = self._make_query_request(databaseID, filter_properties, self._query_body(page_size, content_filter, sorts, start_cursor))
+            self.counter = 0
+            if not databaseJson:
+                print("No data returned.")
+                return
+            results = databaseJson["results"] if remaining is None else databaseJson["results"][:remaining]
+            yield from results
+            if remaining is not None:
+                remaining -= len(results)
+            if not databaseJson["has_more"]:
+                return
+            time.sleep(0.5) # To avoid rate limiting
+            start_cursor = databaseJson["next_cursor"]
 
     def _make_query_request(self, databaseID, filter_properties, bodyJson):
         """
@@ -246,10 +542,10 @@ class NotionApiHelper:
         try:
             print("Sending post request...")
             print(f"{self.endPoint}/databases/{databaseID}/query{filter_properties}")
-            response = requests.post(f"{self.endPoint}/databases/{databaseID}/query{filter_properties}", headers=self.headers, json=bodyJson)
+            response = requests.post(f"{self.endPoint}/databases/{databaseID}/query{filter_properties}", headers=self.headers, data=json_dumps(bodyJson))
             response.raise_for_status()
             print("Post request successful.")
-            return response.json()
+            return json_loads(response.content)
         except requests.exceptions.RequestException as e:
             if self.counter < self.MAX_RETRIES:
                 print(f"Network error occurred: {e}. Trying again in {self.RETRY_DELAY} seconds.")
@@ -264,53 +560,89 @@ class NotionApiHelper:
                 return {}
 
     def get_page(self, pageID):
+        if self.response_cache is not None:
+            return self.response_cache.get(("page", self._normalize_id(pageID)), lambda: self._fetch_page(pageID))
+        return self._fetch_page(pageID)
+
+    def _fetch_page(self, pageID):
         try:
             time.sleep(0.5) # To avoid rate limiting
             print(f"{self.endPoint}/pages/{pageID}")
             response = requests.get(f"{self.endPoint}/pages/{pageID}", headers=self.headers)
             response.raise_for_status()
             self.counter = 0
-            return response.json()
+            return json_loads(response.content)
         except requests.exceptions.RequestException as e:
             if self.counter < self.MAX_RETRIES:
                 logging.error(f"Network error occurred: {e}. Trying again in {self.RETRY_DELAY} seconds.")
                 time.sleep(self.RETRY_DELAY)
                 self.counter += 1
-                return self.get_page(pageID)
+                return self._fetch_page(pageID)
             else:    
                 logging.error(f"Network error occurred too many times: {e}")
                 time.sleep(3)
                 self.counter = 0
                 return {}
         
-    def get_page_property(self, pageID, propID):
+    def get_page_property(self, pageID, propID, start_cursor = None):
+        if self.response_cache is not None:
+            key = ("property", self._normalize_id(pageID), propID, start_cursor)
+            return self.response_cache.get(key, lambda: self._fetch_page_property(pageID, propID, start_cursor))
+        return self._fetch_page_property(pageID, propID, start_cursor)
+
+    def _fetch_page_property(self, pageID, propID, start_cursor = None):
+        cursor_query = f"?start_cursor={start_cursor}" if start_cursor else ""
         try:
             time.sleep(0.5) # To avoid rate limiting
-            print(f"{self.endPoint}/pages/{pageID}/properties/{propID}")
-            response = requests.get(f"{self.endPoint}/pages/{pageID}/properties/{propID}", headers=self.headers)
+            print(f"{self.endPoint}/pages/{pageID}/properties/{propID}{cursor_query}")
+            response = requests.get(f"{self.endPoint}/pages/{pageID}/properties/{propID}{cursor_query}", headers=self.headers)
             response.raise_for_status()
             self.counter = 0
-            return response.json()
+            return json_loads(response.content)
         except requests.exceptions.RequestException as e:
             if self.counter < self.MAX_RETRIES:
                 logging.error(f"Network error occurred: {e}. Trying again in {self.RETRY_DELAY} seconds.")
                 time.sleep(self.RETRY_DELAY)
                 self.counter += 1
-                return self.get_page_property(pageID, propID)
+                return self._fetch_page_property(pageID, propID, start_cursor)
             else:    
                 logging.error(f"Network error occurred too many times: {e}")
                 time.sleep(3)
                 self.counter = 0
                 return {}
 
+    def get_relation_ids(self, pageID, propID):
+        """
+        Returns every related page ID of a relation property, following the pagination of the property item endpoint.
+        Page objects only carry the first 25 relations, this is used when their relation property has "has_more".
+
+        Args:
+            pageID (str): The ID of the Notion page.
+            propID (str): The ID of the relation property.
+
+        Returns:
+            list of str: The related page IDs, or None if a request failed.
+        """
+        related_ids = []
+        cursor = None
+        while True:
+            response = self.get_page_property(pageID, propID, cursor)
+            if not response:
+                return None
+            for item in response.get("results", []):
+                related_ids.append(item["relation"]["id"])
+            if not response.get("has_more"):
+                return related_ids
+            cursor = response["next_cursor"]
+
     def create_page(self, databaseID, properties): # Will update to allow icon and cover images later.
         jsonBody = {"parent": {"database_id": databaseID}, "properties": properties}
         try:
             print(f"{self.endPoint}/pages")
-            response = requests.post(f"{self.endPoint}/pages", headers=self.headers, json=jsonBody)
+            response = requests.post(f"{self.endPoint}/pages", headers=self.headers, data=json_dumps(jsonBody))
             response.raise_for_status()
             self.counter = 0
-            return response.json()
+            return json_loads(response.content)
         except requests.exceptions.RequestException as e:
             if self.counter < self.MAX_RETRIES:
                 logging.error(f"Network error occurred: {e}. Trying again in {self.RETRY_DELAY} seconds.")
@@ -324,22 +656,24 @@ class NotionApiHelper:
                 return {}
             
     def update_page(self, pageID, properties, trash = False): # Will update to allow icon and cover images later.
+        if self.response_cache is not None:
+            self.response_cache.invalidate_page(self._normalize_id(pageID))
         jsonBody = {"properties": properties}
         print(jsonBody)
         try:
             print("Sending patch request...")
             print(f"{self.endPoint}/pages/{pageID}")
-            response = requests.patch(f"{self.endPoint}/pages/{pageID}", headers=self.headers, json=jsonBody)
+            response = requests.patch(f"{self.endPoint}/pages/{pageID}", headers=self.headers, data=json_dumps(jsonBody))
             # print(response.text)
             response.raise_for_status()
             self.counter = 0
-            return response.json()
+            return json_loads(response.content)
         except requests.exceptions.RequestException as e:
             if self.counter < self.MAX_RETRIES:
                 logging.error(f"Network error occurred: {e}. Trying again in {self.RETRY_DELAY} seconds.")
                 time.sleep(self.RETRY_DELAY)
                 self.counter += 1
-                return self.update_page(pageID, properties)
+                return self.update_page(pageID, properties, trash)
             else:    
                 logging.error(f"Network error occurred too many times: {e}")
                 time.sleep(3)
@@ -347,6 +681,421 @@ class NotionApiHelper:
                 return {}
 
 
+    def _throttle(self):
+        """
+        Blocks until the next request slot is free. Safe to call from several threads, slots are REQUEST_INTERVAL apart.
+        """
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + self.REQUEST_INTERVAL
+        if wait > 0:
+            time.sleep(wait)
+
+    def get_block_children(self, blockID):
+        """
+        Sends get requests for all children of a block or page, following pagination cursors. Thread safe, retries are counted per call
+        and rate limited requests wait for the Retry-After header. Will return None if the request fails.
+
+        Args:
+            blockID (str): The ID of the block or page.
+
+        Returns:
+            list of dict: The child block objects.
+        """
+        children = []
+        cursor = None
+        attempts = 0
+        while True:
+            url = f"{self.endPoint}/blocks/{blockID}/children?page_size={self.PAGE_SIZE}"
+            if cursor:
+                url += f"&start_cursor={cursor}"
+            try:
+                self._throttle()
+                print(url)
+                response = requests.get(url, headers=self.headers)
+                if response.status_code == 429:
+                    time.sleep(float(response.headers.get("Retry-After", self.RETRY_DELAY)))
+                    continue
+                response.raise_for_status()
+                data = json_loads(response.content)
+            except requests.exceptions.RequestException as e:
+                if attempts < self.MAX_RETRIES:
+                    logging.error(f"Network error occurred: {e}. Trying again in {self.RETRY_DELAY} seconds.")
+                    time.sleep(self.RETRY_DELAY)
+                    attempts += 1
+                    continue
+                logging.error(f"Network error occurred too many times: {e}")
+                return None
+            children.extend(data["results"])
+            if not data.get("has_more"):
+                return children
+            cursor = data["next_cursor"]
+
+    def get_block_trees(self, blockIDs, max_workers = None):
+        with self._profile("notion_block_trees"):
+            return self._get_block_trees(blockIDs, max_workers)
+
+    def _get_block_trees(self, blockIDs, max_workers = None):
+        """
+        Fetches the nested block trees of several pages breadth first. Every level of every tree is fetched concurrently,
+        children are attached to their parent block under the "children" key. Child pages and databases are not descended into.
+
+        Args:
+            blockIDs (list of str): The IDs of the pages or blocks.
+            max_workers (int): Number of concurrent requests. Optional, defaults to BLOCK_WORKERS.
+
+        Returns:
+            dict: blockID: list of top level child blocks, or None for trees that could not be fetched completely.
+        """
+        max_workers = max_workers if max_workers else self.BLOCK_WORKERS
+        trees = {}
+        failed_roots = set()
+        frontier = [(blockID, blockID, None) for blockID in blockIDs] # (root ID, block ID, parent block object)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while frontier:
+                results = executor.map(lambda item: self.get_block_children(item[1]), frontier)
+                next_frontier = []
+                for (rootID, blockID, parent), children in zip(frontier, results):
+                    if children is None:
+                        failed_roots.add(rootID)
+                        continue
+                    if parent is None:
+                        trees[rootID] = children
+                    else:
+                        parent["children"] = children
+                    for child in children:
+                        if child.get("has_children") and child["type"] not in ("child_page", "child_database"):
+                            next_frontier.append((rootID, child["id"], child))
+                frontier = next_frontier
+        for rootID in failed_roots:
+            trees[rootID] = None
+        return trees
+
+    def get_block_tree(self, blockID, max_workers = None):
+        return self.get_block_trees([blockID], max_workers)[blockID]
+
+    def render_blocks_text(self, blocks, depth = 0):
+        """
+        Renders a block tree from get_block_trees as plain text with light markdown (headings, lists, quotes, code fences).
+
+        Args:
+            blocks (list of dict): Block objects, with nested "children".
+            depth (int): Indentation level of nested blocks.
+
+        Returns:
+            str: The rendered text.
+        """
+        lines = []
+        indent = "    " * depth
+        number = 0
+        for block in blocks or []:
+            block_type = block["type"]
+            data = block.get(block_type, {})
+            text = "".join(rich["plain_text"] for rich in data.get("rich_text", []))
+            number = number + 1 if block_type == "numbered_list_item" else 0
+            prefixes = {
+                "heading_1": "# ", "heading_2": "## ", "heading_3": "### ",
+                "bulleted_list_item": "- ", "numbered_list_item": f"{number}. ",
+                "quote": "> ", "callout": "> ", "toggle": "- ",
+                "to_do": "- [x] " if data.get("checked") else "- [ ] "
+            }
+            if block_type == "code":
+                lines.append(f"{indent}```{data.get('language', '')}\n{text}\n{indent}```")
+            elif block_type == "divider":
+                lines.append(f"{indent}---")
+            elif block_type == "child_page":
+                lines.append(f"{indent}[Page: {data.get('title', '')}]")
+            elif block_type == "child_database":
+                lines.append(f"{indent}[Database: {data.get('title', '')}]")
+            elif block_type in ("image", "file", "pdf", "video", "bookmark", "embed"):
+                url = data.get("url") or data.get(data.get("type", ""), {}).get("url", "")
+                caption = "".join(rich["plain_text"] for rich in data.get("caption", []))
+                lines.append(f"{indent}[{block_type}: {caption or url}]({url})")
+            elif block_type == "table_row":
+                lines.append(indent + " | ".join("".join(rich["plain_text"] for rich in cell) for cell in data.get("cells", [])))
+            else:
+                lines.append(f"{indent}{prefixes.get(block_type, '')}{text}")
+            if block.get("children"):
+                lines.append(self.render_blocks_text(block["children"], depth + 1))
+        return "\n".join(lines)
+
+    def list_users(self, start_cursor = None):
+        cursor_query = f"&start_cursor={start_cursor}" if start_cursor else ""
+        try:
+            print(f"{self.endPoint}/users?page_size={self.PAGE_SIZE}{cursor_query}")
+            response = requests.get(f"{self.endPoint}/users?page_size={self.PAGE_SIZE}{cursor_query}", headers=self.headers)
+            response.raise_for_status()
+            self.counter = 0
+            return json_loads(response.content)
+        except requests.exceptions.RequestException as e:
+            if self.counter < self.MAX_RETRIES:
+                logging.error(f"Network error occurred: {e}. Trying again in {self.RETRY_DELAY} seconds.")
+                time.sleep(self.RETRY_DELAY)
+                self.counter += 1
+                return self.list_users(start_cursor)
+            else:
+                logging.error(f"Network error occurred too many times: {e}")
+                time.sleep(3)
+                self.counter = 0
+                return {}
+
+    def load_user_directory(self, refresh = False):
+        """
+        Loads every user of the workspace into self.user_directory. The directory is read from USER_CACHE_PATH while it is younger
+        than USER_CACHE_TTL, otherwise it is fetched with the paginated users list and saved there.
+
+        Args:
+            refresh (bool): Fetch the users list even if the saved directory is still fresh. Optional.
+
+        Returns:
+            dict: userID: {"name", "type", "email"}
+        """
+        with self._user_lock:
+            if not refresh:
+                try:
+                    with open(self.USER_CACHE_PATH, 'r') as user_file:
+                        saved = json.load(user_file)
+                    if time.time() - saved["fetched_at"] < self.USER_CACHE_TTL:
+                        self.user_directory = saved["users"]
+                        return self.user_directory
+                except (FileNotFoundError, json.JSONDecodeError, KeyError):
+                    pass
+
+            users = {}
+            cursor = None
+            while True:
+                response = self.list_users(cursor)
+                if not response: # Keep what was read, unknown users fall back to their IDs.
+                    logging.error("Could not load the Notion user directory.")
+                    break
+                for user in response.get("results", []):
+                    users[self._normalize_id(user["id"])] = {
+                        "name": user.get("name"),
+                        "type": user.get("type"),
+                        "email": user.get("person", {}).get("email") if user.get("type") == "person" else None
+                    }
+                if not response.get("has_more"):
+                    os.makedirs(os.path.dirname(self.USER_CACHE_PATH), exist_ok = True)
+                    with open(self.USER_CACHE_PATH, 'w') as user_file:
+                        json.dump({"fetched_at": time.time(), "users": users}, user_file)
+                    break
+                cursor = response["next_cursor"]
+                time.sleep(0.5) # To avoid rate limiting
+            self.user_directory = users
+            return self.user_directory
+
+    def get_user_name(self, user):
+        """
+        Returns the name of a user object as found in people, created_by and last_edited_by properties.
+        Property values usually only carry the user ID, names come from the user directory, loaded once on first use.
+
+        Args:
+            user (dict): The user object, {"object": "user", "id": ...}.
+
+        Returns:
+            str: The name of the user, or its ID if the user is not in the directory.
+        """
+        if user.get("name"):
+            return user["name"]
+        if self.user_directory is None:
+            self.load_user_directory()
+        entry = self.user_directory.get(self._normalize_id(user["id"]))
+        return entry["name"] if entry and entry.get("name") else user["id"]
+
+    def cache_pages(self, pages):
+        """
+        Stores page objects as the known state used by update_page_if_changed.
+
+        Args:
+            pages (list of dict): Page objects, as returned by query or get_page.
+        """
+        for page in pages:
+            if page and 'id' in page:
+                self.page_cache[self._normalize_id(page['id'])] = page
+
+    def update_page_if_changed(self, pageID, properties, current_page = None):
+        """
+        Sends a patch request containing only the properties that differ from the known state of the page.
+        No request is made if nothing differs. The page state is taken from current_page, the page cache, or a get_page request, in that order.
+
+        Args:
+            pageID (str): The ID of the Notion page.
+            properties (dict): The properties of the page as a dictionary, built with generate_property_body.
+            current_page (dict): The current page object. Optional.
+
+        Returns:
+            dict: The dictionary response from the Notion API, or the known page object if no request was needed.
+        """
+        if current_page is None:
+            current_page = self.page_cache.get(self._normalize_id(pageID))
+        if current_page is None:
+            current_page = self._fetch_page(pageID) # Never a cached response, the diff needs the current state.
+            self.cache_pages([current_page])
+
+        changed_properties = self.diff_properties(properties, current_page.get('properties', {})) if current_page else properties
+        self.update_stats["properties_skipped"] += len(properties) - len(changed_properties)
+        if not changed_properties:
+            print(f"No changes for page {pageID}, skipping update.")
+            self.update_stats["skipped"] += 1
+            return current_page
+
+        response = self.update_page(pageID, changed_properties)
+        if not response:
+            self.update_stats["failed"] += 1
+            return response
+        self.update_stats["sent"] += 1
+        self.cache_pages([response])
+        return response
+
+    def update_pages_if_changed(self, updates, databaseID = None, content_filter = None):
+        """
+        Applies update_page_if_changed to many pages. Page states missing from the cache are fetched in bulk with a single
+        paginated database query when databaseID is given, instead of one get_page request per page.
+
+        Args:
+            updates (dict): pageID: properties dictionary.
+            databaseID (str): The ID of the database the pages belong to. Optional.
+            content_filter (dict): Content filter narrowing the state query to the updated pages. Optional.
+
+        Returns:
+            dict: The update statistics, see report_update_stats.
+        """
+        missing = [pageID for pageID in updates if self._normalize_id(pageID) not in self.page_cache]
+        if missing and databaseID:
+            print(f"Fetching current state of {len(missing)} pages from database {databaseID}")
+            self.cache_pages(self.query(databaseID, content_filter = content_filter) or [])
+
+        for pageID, properties in updates.items():
+            self.update_page_if_changed(pageID, properties)
+        return self.report_update_stats()
+
+    def enable_response_cache(self, max_entries = None, ttl = None, path = None):
+        """
+        Caches the responses of get_page and get_page_property (and so get_relation_ids) in a bounded LRU cache with a time to live.
+        Concurrent requests for the same page or property share one request. update_page drops the cached responses of its page.
+
+        Args:
+            max_entries (int): Responses kept, least recently used first out. Optional, defaults to RESPONSE_CACHE_SIZE.
+            ttl (int): Seconds a response is served from the cache. Optional, defaults to RESPONSE_CACHE_TTL.
+            path (str): File the cache is loaded from now and written to by save_response_cache, to reuse it across runs. Optional.
+
+        Returns:
+            ResponseCache: The cache.
+        """
+        self.response_cache = ResponseCache(
+            max_entries if max_entries else self.RESPONSE_CACHE_SIZE,
+            ttl if ttl is not None else self.RESPONSE_CACHE_TTL,
+            path
+        )
+        return self.response_cache
+
+    def save_response_cache(self):
+        if self.response_cache is not None:
+            self.response_cache.save()
+
+    def report_response_cache(self):
+        if self.response_cache is None:
+            return {}
+        stats = self.response_cache.report()
+        print(f"Response cache: {stats['hit_ratio']:.1%} hits, {stats['miss_ratio']:.1%} misses ({stats['hits']} hits, {stats['shared']} shared in flight, {stats['misses']} misses), {stats['entries']} entries, {stats['evicted']} evicted, {stats['expired']} expired.")
+        logging.info(f"Response cache: {stats}")
+        return stats
+
+    def worker_helper(self):
+        """
+        Returns a helper for one worker thread, see the module notes. It starts from a copy of the page cache.
+        """
+        worker = copy.copy(self)
+        worker.counter = 0
+        worker.page_cache = dict(self.page_cache)
+        worker.update_stats = {stat: 0 for stat in self.update_stats}
+        worker._throttle = self._throttle # Requests of every worker are spaced out together.
+        return worker
+
+    def merge_update_stats(self, worker):
+        for stat, count in worker.update_stats.items():
+            self.update_stats[stat] += count
+        self.cache_pages(worker.page_cache.values())
+
+    def report_update_stats(self):
+        stats = dict(self.update_stats)
+        total = stats["sent"] + stats["skipped"] + stats["failed"]
+        print(f"Page updates: {stats['sent']} sent, {stats['skipped']} skipped, {stats['failed']} failed of {total}. {stats['properties_skipped']} unchanged properties left out of requests.")
+        logging.info(f"Page updates: {stats['sent']} sent, {stats['skipped']} skipped, {stats['failed']} failed of {total}. {stats['properties_skipped']} unchanged properties left out of requests.")
+        return stats
+
+    def diff_properties(self, properties, current_properties):
+        """
+        Compares a property body built with generate_property_body against the properties of a page object.
+
+        Args:
+            properties (dict): Property name or ID: property body.
+            current_properties (dict): The "properties" of a page object.
+
+        Returns:
+            dict: The subset of properties whose value differs from the page.
+        """
+        current_by_id = {prop.get('id'): prop for prop in current_properties.values()}
+        changed = {}
+        for prop_key, prop_body in properties.items():
+            current = current_properties.get(prop_key) or current_by_id.get(prop_key)
+            if current is None:
+                changed[prop_key] = prop_body
+                continue
+            prop_type = current['type']
+            if prop_type not in prop_body:
+                changed[prop_key] = prop_body
+                continue
+            if self._comparable_value(prop_type, prop_body[prop_type]) != self._comparable_value(prop_type, current[prop_type]):
+                changed[prop_key] = prop_body
+        return changed
+
+    def _normalize_id(self, object_id):
+        return object_id.replace('-', '').lower() if object_id else object_id
+
+    def _normalize_date(self, value):
+        if not value or 'T' not in value:
+            return value
+        try:
+            return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value
+
+    def _comparable_value(self, prop_type, value):
+        """
+        Reduces a property value, either from a request body or from a page object, to a form that can be compared with ==.
+        """
+        if value is None:
+            return None
+        if prop_type in ('select', 'status'):
+            return value.get('name') if value else None
+        if prop_type == 'date':
+            return (self._normalize_date(value.get('start')), self._normalize_date(value.get('end'))) if value else None
+        if prop_type == 'multi_select':
+            return sorted(option['name'] for option in value)
+        if prop_type in ('relation', 'people'):
+            return sorted(self._normalize_id(item['id']) for item in value)
+        if prop_type == 'files':
+            files = []
+            for file in value:
+                file_type = 'external' if 'external' in file else 'file'
+                files.append((file.get('name'), file.get(file_type, {}).get('url')))
+            return files
+        if prop_type in ('rich_text', 'title'):
+            texts = []
+            for text in value:
+                content = text.get('text', {}).get('content', text.get('plain_text'))
+                link = text.get('text', {}).get('link')
+                link = link.get('url') if isinstance(link, dict) else link
+                annotations = text.get('annotations')
+                texts.append((content, link, annotations))
+            return texts
+        if prop_type == 'number':
+            return float(value)
+        return value
+
+
     def simple_prop_gen(self, prop_name, prop_type, prop_value):
         '''
         Generates a simple property dictionary.
@@ -449,31 +1198,32 @@ class NotionApiHelper:
 
     def generate_property_body(self, prop_name, prop_type, prop_value, prop_value2 = None, annotation = None): # Should have been named generate_body_property, will fix in future.
 
-        type_dict = {
-            'checkbox': self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
-            'email': self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
-            'number': self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
-            'phone_number': self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
-            'url': self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
-            'select': self.selstat_prop_gen(prop_name, prop_type, prop_value), # string, string, string
-            'status': self.selstat_prop_gen(prop_name, prop_type, prop_value), # string, string, string
-            'date': self.date_prop_gen(prop_name, prop_type, prop_value, prop_value2), # string, string, string, string
-            'files': self.files_prop_gen(prop_name, prop_type, prop_value, prop_value2), # string, string, array of string, array of string
-            'multi_select': self.mulsel_prop_gen(prop_name, prop_type, prop_value), # string, string, array of strings
-            'relation': self.relation_prop_gen(prop_name, prop_type, prop_value), # string, string, array of strings
-            'people': self.people_prop_gen(prop_name, prop_type, prop_value), # string, string, array of strings
-            'rich_text': self.rich_text_prop_gen(prop_name, prop_type, prop_value, prop_value2, annotation), # string, string, array of strings, array of strings, array of objects
-            'title': self.title_prop_gen(prop_name, prop_type, prop_value, prop_value2, annotation) # string, string, array of strings, array of strings, array of objects
+        type_dict = { # Generators are called lazily, only the requested type is built.
+            'checkbox': lambda: self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
+            'email': lambda: self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
+            'number': lambda: self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
+            'phone_number': lambda: self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
+            'url': lambda: self.simple_prop_gen(prop_name, prop_type, prop_value), # string, string, string
+            'select': lambda: self.selstat_prop_gen(prop_name, prop_type, prop_value), # string, string, string
+            'status': lambda: self.selstat_prop_gen(prop_name, prop_type, prop_value), # string, string, string
+            'date': lambda: self.date_prop_gen(prop_name, prop_type, prop_value, prop_value2), # string, string, string, string
+            'files': lambda: self.files_prop_gen(prop_name, prop_type, prop_value, prop_value2), # string, string, array of string, array of string
+            'multi_select': lambda: self.mulsel_prop_gen(prop_name, prop_type, prop_value), # string, string, array of strings
+            'relation': lambda: self.relation_prop_gen(prop_name, prop_type, prop_value), # string, string, array of strings
+            'people': lambda: self.people_prop_gen(prop_name, prop_type, prop_value), # string, string, array of strings
+            'rich_text': lambda: self.rich_text_prop_gen(prop_name, prop_type, prop_value, prop_value2, annotation), # string, string, array of strings, array of strings, array of objects
+            'title': lambda: self.title_prop_gen(prop_name, prop_type, prop_value, prop_value2, annotation) # string, string, array of strings, array of strings, array of objects
         }
-        return type_dict[prop_type]
+        return type_dict[prop_type]()
     
-    def return_property_value(self, property):
+    def return_property_value(self, property, page_id = None):
         """
         Returns the value of a given property based on its type.
         This method uses a router dictionary to map property types to their respective handler functions.
         Each handler function processes the property data and returns the value in the correct format.
         Args:
             property (dict): The property dictionary containing the type and data of the property.
+            page_id (str): The ID of the page the property belongs to. Optional, needed to fetch relations past the first 25.
         Returns:
             The value of the property in the appropriate format, or None if an error occurs.
         Raises:
@@ -484,10 +1234,11 @@ class NotionApiHelper:
             - is_selstat: Returns the name of the selected status.
             - is_formula: Processes and returns the value of a formula property.
             - is_rich_text: Concatenates and returns plain text from rich text property.
-            - is_relation: Processes and returns a list of related IDs.
+            - is_relation: Processes and returns a list of related IDs, fetching the full list when the page object truncates it.
             - is_date: Returns the start date from the property data.
-            - is_files: Returns a list of external file URLs.
-            - is_person: Returns the ID of a person property.
+            - is_files: Returns a list of file URLs, both Notion hosted and external.
+            - is_person: Returns the name of a created_by or last_edited_by user, from the user directory.
+            - is_people: Returns a list of names from a people property, from the user directory.
             - is_multi_select: Returns a list of names from a multi-select property.
             - is_rollup: Processes and returns the value of a rollup property.
         Router Dictionary:
@@ -498,7 +1249,8 @@ class NotionApiHelper:
             return data[prop_type]
         
         def is_uid(data, prop_type):
-            return data[prop_type]['prefix'] + data[prop_type]['number']
+            prefix = data[prop_type]['prefix']
+            return f"{prefix}-{data[prop_type]['number']}" if prefix else str(data[prop_type]['number'])
         
         def is_selstat(data, prop_type):
             return data[prop_type]['name']
@@ -517,14 +1269,15 @@ class NotionApiHelper:
             return ", ".join(text_list)
         
         def is_relation(data, prop_type):
-            package = []
-            if "has_more" in data:
-                if data["has_more"]: # If there are more than 25 relations, replace data with full data (up to 100).
-                    response = self.get_page_property(id, data['id'])
-                    data[prop_type] = response[prop_type]
+            if data.get("has_more") and page_id: # More than 25 relations, fetch the full list from the property endpoint.
+                related_ids = self.get_relation_ids(page_id, data['id'])
+                if related_ids is not None:
+                    return related_ids
             
-            for id in data[prop_type]:
-                package.append(id['id'])
+            package = []
+            for relation in data[prop_type]:
+                package.append(relation['id'])
+            return package
         
         def is_date(data, prop_type):
             return data[prop_type]['start']
@@ -532,11 +1285,18 @@ class NotionApiHelper:
         def is_files(data, prop_type):
             file_list = []
             for file in data[prop_type]:
-                file_list.append(file['external']['url'])
+                file_type = file.get('type', 'external') # Notion hosted files are "file", linked files are "external".
+                file_list.append(file[file_type]['url'])
             return file_list
         
         def is_person(data, prop_type):
-            return data[prop_type]['id']
+            return self.get_user_name(data[prop_type])
+
+        def is_people(data, prop_type):
+            package = []
+            for person in data[prop_type]:
+                package.append(self.get_user_name(person))
+            return package
         
         def is_multi_select(data, prop_type):
             package = []
@@ -552,16 +1312,16 @@ class NotionApiHelper:
                     return_list.append(self.return_property_value(each))
                 return return_list
             else:
-                return self.return_property_value(data[prop_type][roll_type])
+                return self.return_property_value(data[prop_type]) # {"type": "number", "number": ...} reads like a property.
         
         router = { # This is a dictionary of functions that return the data in the correct format.
             'checkbox': is_simple,
-            'created_by': is_person,
+            'created_by': is_person, # Names from the user directory, see get_user_name.
             'created_time': is_simple,
             'email': is_simple,
             'number': is_simple,
             'phone_number': is_simple,
-            'people': is_multi_select, # This will return a list of names instead of IDs.
+            'people': is_people, # This will return a list of names instead of IDs.
             'url': is_simple,
             'last_edited_time': is_simple,
             'select': is_selstat,
@@ -573,7 +1333,7 @@ class NotionApiHelper:
             'relation': is_relation,
             'date': is_date,
             'files': is_files,
-            'last_edited_by': is_selstat, # This will return the name instead of the ID.
+            'last_edited_by': is_person, # This will return the name instead of the ID.
             'multi_select': is_multi_select,
             'rollup': is_rollup
         }
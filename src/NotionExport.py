@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Notion Columnar Export
+# Streams Notion databases into Parquet or Arrow IPC files with typed columns, so reporting can load them directly instead of
+# post-processing the nested page dictionaries returned by NotionApiHelper.query.
+
+'''
+Dependencies:
+- pyarrow (pip install pyarrow)
+- NotionApiHelper (and its headers.json)
+
+Usage:
+    python src/NotionExport.py <database_id> [--format parquet|arrow] [--out path] [--row-group-size n]
+
+    exporter = NotionExport()
+    exporter.export(database_id)                                   # output/export/<database_id>.parquet
+    exporter.export(database_id, 'output/tasks.arrow', 'arrow')    # Arrow IPC file
+
+Pages are read with query_iter and decoded with return_property_value, ROW_GROUP_SIZE rows at a time. Every full batch is written as
+one row group (Parquet) or record batch (Arrow IPC), so memory use does not grow with the size of the database.
+
+Columns:
+    - id, created_time, last_edited_time: The page ID and timestamps.
+    - One column per property, named like the property (id, created_time and last_edited_time get a _property suffix).
+      The column type is taken from the first page:
+        number -> float64, checkbox -> bool
+        date, created_time, last_edited_time -> timestamp (UTC, date only values at midnight, the start of date ranges)
+        multi_select, relation, people, files -> list of strings
+        anything else (text, select, status, formulas, rollups, unique_id...) -> string
+'''
+
+import datetime, logging, os, sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from NotionApiHelper import NotionApiHelper
+
+logger = logging.getLogger(__name__)
+
+
+class NotionExport:
+    ROW_GROUP_SIZE = 10000
+    EXPORT_DIR = 'output/export'
+    FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+    TIMESTAMP_TYPES = ('date', 'created_time', 'last_edited_time')
+    LIST_TYPES = ('multi_select', 'relation', 'people', 'files')
+
+    def __init__(self, notion_helper = None, row_group_size = None):
+        if pa is None:
+            raise ImportError("NotionExport requires pyarrow, install it with 'pip install pyarrow'.")
+        self.notion_helper = notion_helper if notion_helper else NotionApiHelper()
+        self.row_group_size = row_group_size if row_group_size else self.ROW_GROUP_SIZE
+
+    @staticmethod
+    def parse_timestamp(value):
+        """
+        Parses a Notion ISO 8601 date or datetime into a UTC datetime. Date only values are read as midnight UTC.
+        """
+        if not value:
+            return None
+        if len(value) == 10:
+            return datetime.datetime.fromisoformat(value).replace(tzinfo = datetime.timezone.utc)
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            return parsed.replace(tzinfo = datetime.timezone.utc)
+        return parsed.astimezone(datetime.timezone.utc)
+
+    def build_schema(self, page):
+        """
+        Builds the Arrow schema and one converter per column from the property types of a page.
+
+        Returns:
+            tuple: (pyarrow.Schema, list of (column name, converter taking the page and returning the cell value))
+        """
+        timestamp = pa.timestamp('us', tz = 'UTC')
+        fields = [pa.field('id', pa.string()), pa.field('created_time', timestamp), pa.field('last_edited_time', timestamp)]
+        converters = [
+            ('id', lambda page: page['id']),
+            ('created_time', lambda page: self.parse_timestamp(page.get('created_time'))),
+            ('last_edited_time', lambda page: self.parse_timestamp(page.get('last_edited_time')))
+        ]
+        for name, prop in page['properties'].items():
+            if name in ('id', 'created_time', 'last_edited_time'): # Page columns keep their names, properties colliding with them are suffixed.
+                column = f'{name}_property'
+            else:
+                column = name
+            prop_type = prop['type']
+            if prop_type == 'number':
+                arrow_type, convert = pa.float64(), self._as_float
+            elif prop_type == 'checkbox':
+                arrow_type, convert = pa.bool_(), self._as_bool
+            elif prop_type in self.TIMESTAMP_TYPES:
+                arrow_type, convert = timestamp, self.parse_timestamp
+            elif prop_type in self.LIST_TYPES:
+                arrow_type, convert = pa.list_(pa.string()), self._as_list
+            else:
+                arrow_type, convert = pa.string(), self._as_string
+            fields.append(pa.field(column, arrow_type))
+            converters.append((column, self._property_converter(name, convert)))
+        return pa.schema(fields), converters
+
+    def _property_converter(self, name, convert):
+        def converter(page):
+            prop = page['properties'].get(name)
+            if prop is None:
+                return None
+            return convert(self.notion_helper.return_property_value(prop, page['id']))
+        return converter
+
+    @staticmethod
+    def _as_float(value):
+        return float(value) if value is not None else None
+
+    @staticmethod
+    def _as_bool(value):
+        return bool(value) if value is not None else None
+
+    @staticmethod
+    def _as_list(value):
+        if value is None:
+            return []
+        return [str(item) for item in value if item is not None]
+
+    @staticmethod
+    def _as_string(value):
+        if value is None or value == '':
+            return None
+        if isinstance(value, list):
+            return ', '.join(str(item) for item in value if item is not None)
+        return str(value)
+
+    def export(self, database_id, path = None, file_format = 'parquet', filter_properties = None, content_filter = None):
+        """
+        Streams a Notion database into a Parquet or Arrow IPC file.
+
+        Args:
+            database_id (str): The ID of the Notion database.
+            path (str): The output file. Optional, defaults to EXPORT_DIR/<database_id>.<format extension>.
+            file_format (str): "parquet" or "arrow". Optional.
+            filter_properties (list): Property IDs to export, passed to query_iter. Optional.
+            content_filter (dict): Notion filter selecting the pages to export. Optional.
+
+        Returns:
+            int: The number of rows written, 0 if the database returned no pages.
+        """
+        if file_format not in self.FORMATS:
+            raise ValueError(f"Unknown export format {file_format}, expected one of {list(self.FORMATS)}.")
+        if path is None:
+            path = os.path.join(self.EXPORT_DIR, f"{database_id.replace('-', '')}{self.FORMATS[file_format]}")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+
+        schema = converters = writer = sink = None
+        columns = {}
+        rows = 0
+        try:
+            for page in self.notion_helper.query_iter(database_id, filter_properties, content_filter):
+                if writer is None:
+                    schema, converters = self.build_schema(page)
+                    if file_format == 'parquet':
+                        writer = pq.ParquetWriter(path, schema)
+                    else:
+                        sink = pa.OSFile(path, 'wb')
+                        writer = pa.ipc.new_file(sink, schema)
+                    columns = {column: [] for column, _ in converters}
+                for column, convert in converters:
+                    columns[column].append(convert(page))
+                rows += 1
+                if len(columns['id']) >= self.row_group_size:
+                    writer.write_table(pa.Table.from_pydict(columns, schema = schema))
+                    columns = {column: [] for column in columns}
+            if writer is not None and columns['id']:
+                writer.write_table(pa.Table.from_pydict(columns, schema = schema))
+        finally:
+            if writer is not None:
+                writer.close()
+            if sink is not None:
+                sink.close()
+
+        if rows:
+            print(f"Exported {rows} pages of database {database_id} to {path}")
+            logger.info(f"Exported {rows} pages of database {database_id} to {path}")
+        else:
+            print(f"No pages returned for database {database_id}, nothing exported.")
+        return rows
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {'--format': 'parquet', '--out': None, '--row-group-size': None}
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+    if not args:
+        print("Usage: python src/NotionExport.py <database_id> [--format parquet|arrow] [--out path] [--row-group-size n]")
+        sys.exit(1)
+    row_group_size = int(options['--row-group-size']) if options['--row-group-size'] else None
+    NotionExport(row_group_size = row_group_size).export(args[0], options['--out'], options['--format'])
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# Notion Mirror
+# Local SQLite copy of Notion databases. Keeps pages and their decoded property values on disk, refreshes them incrementally by
+# last_edited_time and answers common Notion filters from indexed tables instead of downloading the database again.
+
+'''
+Dependencies:
+- NotionApiHelper (and its headers.json)
+- RecordConverter.py (parse_notion_date)
+
+Usage:
+    mirror = NotionMirror()                               # output/notion_mirror.sqlite
+    pages = mirror.query(database_id, content_filter)     # Same shape as NotionApiHelper.query: a list of page objects.
+    mirror.sync(database_id, full = True)                 # Full refresh, also drops pages that were deleted or archived in Notion.
+
+query() runs an incremental sync first (sync = False skips it). The first sync of a database downloads it completely, every later one
+only asks Notion for pages edited since the newest last_edited_time already stored, usually a single request.
+Pages deleted in Notion are only noticed by a full sync.
+Dates are stored as fixed width UTC strings (DATE_FORMAT), so values with different offsets and date-only values compare correctly
+as text and the date index is used. Date-only filter values match on the UTC date. Relations holding more than the 25 items of the
+page object are read in full with NotionApiHelper.get_relation_ids.
+
+Supported filters, anything else is sent to Notion through NotionApiHelper.query:
+    - "and" / "or" compound filters, nested.
+    - rich_text, title, url, email, phone_number, select, status, formula string:
+        equals, does_not_equal, contains, does_not_contain, starts_with, ends_with, is_empty, is_not_empty
+    - number, formula number: equals, does_not_equal, greater_than, less_than, greater_than_or_equal_to, less_than_or_equal_to, is_empty, is_not_empty
+    - checkbox, formula checkbox: equals, does_not_equal
+    - multi_select, relation, people: contains, does_not_contain, is_empty, is_not_empty
+    - date, formula date, created_time and last_edited_time (also as timestamp filters):
+        equals, before, after, on_or_before, on_or_after, is_empty, is_not_empty
+'''
+
+import json, logging, os, sqlite3
+from urllib.parse import unquote
+
+from NotionApiHelper import NotionApiHelper
+from RecordConverter import parse_notion_date
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedFilter(Exception):
+    pass
+
+
+class NotionMirror:
+    DB_PATH = 'output/notion_mirror.sqlite'
+    TEXT_TYPES = ('rich_text', 'title', 'url', 'email', 'phone_number', 'select', 'status', 'string', 'unique_id')
+    LIST_TYPES = ('multi_select', 'relation', 'people', 'files')
+    DATE_TYPES = ('date', 'created_time', 'last_edited_time')
+    DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f' # UTC, every stored date has the same width.
+    VALUES_VERSION = 1 # Bumped when the decoding of property values changes, stored values are then rebuilt from the pages.
+
+    def __init__(self, notion_helper = None, db_path = None):
+        self.notion_helper = notion_helper if notion_helper else NotionApiHelper()
+        self.db_path = db_path if db_path else self.DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok = True)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id TEXT PRIMARY KEY,
+                db_id TEXT NOT NULL,
+                last_edited_time TEXT,
+                page_json TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_db_edited ON pages (db_id, last_edited_time);
+            CREATE TABLE IF NOT EXISTS property_values (
+                page_id TEXT NOT NULL,
+                db_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                type TEXT,
+                text_value TEXT,
+                number_value REAL,
+                date_start TEXT,
+                date_end TEXT
+            );
+            CREATE INDEX IF NOT EXISTS values_page ON property_values (page_id);
+            CREATE INDEX IF NOT EXISTS values_text ON property_values (db_id, name, text_value);
+            CREATE INDEX IF NOT EXISTS values_number ON property_values (db_id, name, number_value);
+            CREATE INDEX IF NOT EXISTS values_date ON property_values (db_id, name, date_start);
+        ''')
+        self.connection.commit()
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] < self.VALUES_VERSION:
+            self._rebuild_values()
+
+    def _rebuild_values(self):
+        # Re-decodes the stored pages, no database is downloaded again.
+        for (db_id,) in self.connection.execute('SELECT DISTINCT db_id FROM pages').fetchall():
+            pages = [json.loads(row[0]) for row in self.connection.execute('SELECT page_json FROM pages WHERE db_id = ?', (db_id,))]
+            logger.info(f"Rebuilding the mirrored values of {len(pages)} pages of database {db_id}.")
+            self._store_pages(db_id, pages)
+        self.connection.execute(f'PRAGMA user_version = {self.VALUES_VERSION}')
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _normalize_id(object_id):
+        return object_id.replace('-', '').lower()
+
+    @classmethod
+    def _utc(cls, value):
+        return parse_notion_date(value).strftime(cls.DATE_FORMAT) if value else None
+
+    def _date_row(self, data):
+        return ('date', None, None, self._utc(data['start']), self._utc(data.get('end'))) if data else ('date', None, None, None, None)
+
+    def _value_rows(self, prop, page_id):
+        """
+        Decodes a property object into (type, text, number, date start, date end) rows. List properties give one row per item,
+        empty properties give one row of NULLs so is_empty can be answered.
+        """
+        prop_type = prop['type']
+        data = prop.get(prop_type)
+        if prop_type == 'formula' and data:
+            prop_type, data = data['type'], data.get(data['type'])
+            if prop_type == 'date':
+                return [self._date_row(data)]
+            return [(prop_type, None if data is None else str(data), data if isinstance(data, (int, float)) and not isinstance(data, bool) else None, None, None)]
+        if prop_type == 'date':
+            return [self._date_row(data)]
+        if prop_type in ('created_time', 'last_edited_time'):
+            return [(prop_type, data, None, self._utc(data), None)]
+        if prop_type == 'number':
+            return [('number', None if data is None else str(data), data, None, None)]
+        if prop_type == 'checkbox':
+            return [('checkbox', 'true' if data else 'false', None, None, None)]
+        if prop_type == 'relation' and prop.get('has_more'):
+            related_ids = self.notion_helper.get_relation_ids(page_id, prop['id'])
+            if related_ids is None:
+                logger.error(f"Could not read every relation of page {page_id}, mirroring the first {len(data)}.")
+            else:
+                data = [{'id': related_id} for related_id in related_ids]
+        if prop_type in ('relation', 'people'):
+            items = [self._normalize_id(item['id']) for item in data or []]
+            return [(prop_type, item, None, None, None) for item in items] or [(prop_type, None, None, None, None)]
+        if prop_type in ('multi_select', 'files'):
+            items = [item['name'] for item in data or []]
+            return [(prop_type, item, None, None, None) for item in items] or [(prop_type, None, None, None, None)]
+        value = self.notion_helper.return_property_value(prop)
+        if isinstance(value, list):
+            return [(prop_type, str(item), None, None, None) for item in value] or [(prop_type, None, None, None, None)]
+        return [(prop_type, None if value in (None, '') else str(value), value if isinstance(value, (int, float)) and not isinstance(value, bool) else None, None, None)]
+
+    def _store_pages(self, db_id, pages):
+        cursor = self.connection.cursor()
+        for page in pages:
+            page_id = self._normalize_id(page['id'])
+            cursor.execute('DELETE FROM property_values WHERE page_id = ?', (page_id,))
+            cursor.execute(
+                'INSERT OR REPLACE INTO pages (page_id, db_id, last_edited_time, page_json) VALUES (?, ?, ?, ?)',
+                (page_id, db_id, page.get('last_edited_time'), json.dumps(page, separators = (',', ':')))
+            )
+            rows = [
+                (page_id, db_id, '$created_time', 'created_time', page.get('created_time'), None, self._utc(page.get('created_time')), None),
+                (page_id, db_id, '$last_edited_time', 'last_edited_time', page.get('last_edited_time'), None, self._utc(page.get('last_edited_time')), None)
+            ]
+            for name, prop in page['properties'].items():
+                for row in self._value_rows(prop, page['id']):
+                    rows.append((page_id, db_id, name) + row)
+            cursor.executemany('INSERT INTO property_values VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.connection.commit()
+
+    def sync(self, database_id, full = False):
+        """
+        Brings the mirror of a database up to date.
+
+        Args:
+            database_id (str): The ID of the Notion database.
+            full (bool): Re-download everything and drop pages no longer returned by Notion. Optional, defaults to False.
+
+        Returns:
+            int: The number of pages written to the mirror.
+        """
+        db_id = self._normalize_id(database_id)
+        newest = self.connection.execute('SELECT MAX(last_edited_time) FROM pages WHERE db_id = ?', (db_id,)).fetchone()[0]
+        if full or newest is None:
+            print(f"Mirroring all pages of database {database_id}")
+            pages = self.notion_helper.query(database_id)
+            if pages == {}: # The query failed, keep what we have.
+                return 0
+            if full:
+                seen = {self._normalize_id(page['id']) for page in pages}
+                stored = [row[0] for row in self.connection.execute('SELECT page_id FROM pages WHERE db_id = ?', (db_id,))]
+                removed = [(page_id,) for page_id in stored if page_id not in seen]
+                self.connection.executemany('DELETE FROM pages WHERE page_id = ?', removed)
+                self.connection.executemany('DELETE FROM property_values WHERE page_id = ?', removed)
+        else:
+            # last_edited_time is rounded to the minute, on_or_after picks up edits made in the same minute as the newest stored page.
+            pages = self.notion_helper.query(database_id, content_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": newest}})
+            if pages == {}:
+                return 0
+        self._store_pages(db_id, pages)
+        logger.info(f"Mirror of database {database_id} updated with {len(pages)} pages.")
+        return len(pages)
+
+    def _compile_filter(self, content_filter, params):
+        if 'and' in content_filter or 'or' in content_filter:
+            operator = 'and' if 'and' in content_filter else 'or'
+            parts = [self._compile_filter(sub_filter, params) for sub_filter in content_filter[operator]]
+            return '(' + f' {operator.upper()} '.join(parts or ['1']) + ')'
+
+        if 'timestamp' in content_filter:
+            prop_type = content_filter['timestamp']
+            name = f'${prop_type}' # Page timestamps are stored as pseudo properties, see _store_pages.
+            condition = content_filter[prop_type]
+        else:
+            name = content_filter['property']
+            prop_type = next((key for key in content_filter if key != 'property'), None)
+            condition = content_filter.get(prop_type)
+            if prop_type == 'formula':
+                prop_type, condition = next(iter(condition.items()))
+        if not isinstance(condition, dict) or len(condition) != 1:
+            raise UnsupportedFilter(content_filter)
+        operator, value = next(iter(condition.items()))
+
+        def exists(sql, *values, negate = False):
+            params.append(name)
+            params.extend(values)
+            return f"{'NOT ' if negate else ''}EXISTS (SELECT 1 FROM property_values v WHERE v.page_id = p.page_id AND v.name = ? AND ({sql}))"
+
+        if prop_type in self.TEXT_TYPES and isinstance(value, str):
+            like = "v.text_value LIKE ? ESCAPE '\\'"
+            text_conditions = {
+                'equals': ('v.text_value = ?', value, False),
+                'does_not_equal': ('v.text_value = ?', value, True),
+                'contains': (like, f'%{self._escape_like(value)}%', False),
+                'does_not_contain': (like, f'%{self._escape_like(value)}%', True),
+                'starts_with': (like, f'{self._escape_like(value)}%', False),
+                'ends_with': (like, f'%{self._escape_like(value)}', False),
+            }
+            if operator in text_conditions:
+                sql, sql_value, negate = text_conditions[operator]
+                return exists(sql, sql_value, negate = negate)
+        elif prop_type == 'number':
+            comparisons = {'equals': '=', 'greater_than': '>', 'less_than': '<', 'greater_than_or_equal_to': '>=', 'less_than_or_equal_to': '<='}
+            if operator in comparisons:
+                return exists(f'v.number_value {comparisons[operator]} ?', value)
+            if operator == 'does_not_equal':
+                return exists('v.number_value = ?', value, negate = True)
+        elif prop_type == 'checkbox' and operator in ('equals', 'does_not_equal'):
+            return exists('v.text_value = ?', 'true' if value == (operator == 'equals') else 'false')
+        elif prop_type in self.LIST_TYPES and operator in ('contains', 'does_not_contain') and isinstance(value, str):
+            item = self._normalize_id(value) if prop_type in ('relation', 'people') else value
+            return exists('v.text_value = ?', item, negate = operator == 'does_not_contain')
+        elif prop_type in self.DATE_TYPES and isinstance(value, str):
+            comparisons = {'equals': '=', 'before': '<', 'after': '>', 'on_or_before': '<=', 'on_or_after': '>='}
+            if operator in comparisons:
+                # Date-only filter values compare against the UTC date of stored values, datetimes against the UTC datetime.
+                if len(value) == 10:
+                    return exists(f'substr(v.date_start, 1, 10) {comparisons[operator]} ?', self._utc(value)[:10])
+                return exists(f'v.date_start {comparisons[operator]} ?', self._utc(value))
+
+        if operator == 'is_empty' and value is True:
+            return exists('v.text_value IS NOT NULL OR v.number_value IS NOT NULL OR v.date_start IS NOT NULL', negate = True)
+        if operator == 'is_not_empty' and value is True:
+            return exists('v.text_value IS NOT NULL OR v.number_value IS NOT NULL OR v.date_start IS NOT NULL')
+        raise UnsupportedFilter(content_filter)
+
+    @staticmethod
+    def _escape_like(value):
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def query(self, databaseID, filter_properties = None, content_filter = None, sync = True):
+        """
+        Answers a database query from the mirror. Same arguments and return shape as NotionApiHelper.query.
+        Filters outside the supported subset are sent to Notion instead.
+
+        Args:
+            databaseID (str): The ID of the Notion database.
+            filter_properties (list): Property IDs to keep on the returned pages. Optional.
+            content_filter (dict): Notion filter object. Optional.
+            sync (bool): Run an incremental sync first. Optional, defaults to True.
+
+        Returns:
+            list of dict: The matching page objects.
+        """
+        if sync:
+            self.sync(databaseID)
+        db_id = self._normalize_id(databaseID)
+        params = [db_id]
+        where = 'p.db_id = ?'
+        if content_filter:
+            try:
+                where += ' AND ' + self._compile_filter(content_filter, params)
+            except (UnsupportedFilter, KeyError, TypeError, ValueError, StopIteration):
+                print(f"Filter not supported by the local mirror, querying Notion: {json.dumps(content_filter)}")
+                return self.notion_helper.query(databaseID, filter_properties, content_filter)
+
+        pages = [json.loads(row[0]) for row in self.connection.execute(f'SELECT p.page_json FROM pages p WHERE {where} ORDER BY p.rowid', params)]
+        if filter_properties:
+            keep = {unquote(prop_id) for prop_id in filter_properties}
+            for page in pages:
+                page['properties'] = {name: prop for name, prop in page['properties'].items() if prop.get('id') in keep or name in keep}
+        return pages
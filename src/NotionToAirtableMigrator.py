@@ -2,7 +2,14 @@
 from pyairtable import Table, Api
 from pyairtable.orm import Model, fields as F
 from NotionApiHelper import NotionApiHelper
-import importlib, json, logging, re, sys, os, datetime
+from RecordHashStore import RecordHashStore
+from AttachmentTransfer import AttachmentTransfer
+from AirtableWriteScheduler import AirtableWriteScheduler
+from RecordSpool import RecordSpool
+from AirtableSnapshot import AirtableSnapshotCache
+from RecordConverter import RecordConverter
+from StageProfiler import StageProfiler
+import importlib, itertools, json, logging, re, sys, os
         
 '''
 IT IS EXTREMELY IMPORTANT THAT EVERY DATABASE BEING MIGRATED HAS A 'Notion record' PROPERTY.
@@ -19,7 +26,8 @@ IT IS EXTREMELY IMPORTANT THAT EVERY DATABASE BEING MIGRATED HAS A 'Notion recor
         'notion_property_name': 'airtable_property_name',
         'notion_property_name': 'airtable_property_name',
         etc...
-    }
+    },
+    'page_body_field': 'airtable_property_name' # Optional. Long text field the page body content is rendered into.
     }   
 ]
 '''        
@@ -27,16 +35,58 @@ IT IS EXTREMELY IMPORTANT THAT EVERY DATABASE BEING MIGRATED HAS A 'Notion recor
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src')) # Add the src directory to the path for imports.
         
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("output/logs/NotionToAirtableMigrator.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+AIRTABLE_LONG_TEXT_LIMIT = 100000 # Characters, the maximum length of a long text cell.
+SPOOL_DIR = 'output/spool' # Fetched pages and converted rows are written here in spill-to-disk mode.
+SPOOL_CHUNK_SIZE = 1000 # Converted rows held in memory at a time when saving from a spool.
+CONVERT_BATCH_SIZE = 500 # Pages converted per RecordConverter.convert_batch call.
+AIRTABLE_FIELD_OPTIONS = { # Options required by create_field for some Airtable field types.
+    'dateTime': {'dateFormat': {'name': 'iso'}, 'timeFormat': {'name': '24hour'}, 'timeZone': 'utc'}
+}
+LINK_FIELD_PREFIX = 'REL__' # Link fields sit next to the text copy of each relation property as REL__<airtable property name>.
+LOG_PATH = 'output/logs/NotionToAirtableMigrator.log'
+CONFIG_PATH = 'conf/NotionAirtableMigrationConfig.json'
+AIRTABLE_TOKEN_PATH = 'conf/Airtable_Token.txt'
+RELATION_MAP_PATH = 'output/relation_map.json'
+MIGRATION_STAGES = ('records', 'attachments', 'bodies', 'link') # Optional stages of migrate, the schema stages always run.
+
+# Set by init_clients, or assigned directly by the scripts driving the stages (SyncDaemon, ReverseSync, the benchmarks).
+notion_helper = None
+api = None
+profiler = StageProfiler() # Disabled, replace with StageProfiler(enabled = True) before migrate or link to profile their stages.
+
+
+def configure_logging(log_path = LOG_PATH, level = logging.DEBUG):
+    """
+    Sends the log to log_path and the console. Called by the scripts running a migration, importing this module configures nothing.
+    """
+    os.makedirs(os.path.dirname(log_path), exist_ok = True)
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_path),
+            logging.StreamHandler()
+        ]
+    )
+
+def init_clients(notion_helper_instance = None, airtable_api = None, token_path = AIRTABLE_TOKEN_PATH):
+    """
+    Sets the NotionApiHelper and Airtable Api used by the stages of this module. Credentials are only read for the clients not given.
+    """
+    global notion_helper, api
+    notion_helper = notion_helper_instance if notion_helper_instance is not None else NotionApiHelper()
+    if airtable_api is None:
+        with open(token_path, 'r') as file:
+            airtable_api = Api(file.read().strip())
+    api = airtable_api
+    return notion_helper, api
+
+def load_config(config_path = CONFIG_PATH):
+    with open(config_path, 'r') as config_file:
+        return json.load(config_file)
+
 
 def build_airtable_class_headers(airtable_table_name):
     print(f"Building class headers for Airtable table {airtable_table_name}")
@@ -61,6 +111,7 @@ def build_airtable_class_meta(airtable_base_id, airtable_table_name):
     class Meta:
         with open('conf/Airtable_Token.txt', 'r') as file:
             api_key = file.read().strip()
+        retry = None # 429 responses are retried by AirtableWriteScheduler.
         base_id = '{airtable_base_id}'
         table_name = '{airtable_table_name}'       
     '''
@@ -104,8 +155,8 @@ def build_airtable_class_body(property_map, type_map):
             'rich_text': f'    {class_property_name} = F.TextField(\'{airtable_property_name}\')',
             'title': f'    {class_property_name} = F.TextField(\'{airtable_property_name}\')',
             'relation': f'    {class_property_name} = F.TextField(\'{airtable_property_name}\')',
-            'date': f'    {class_property_name} = F.DateField(\'{airtable_property_name}\')',
-            'files': f'    {class_property_name} = F.UrlField(\'{airtable_property_name}\')',
+            'date': f'    {class_property_name} = F.DatetimeField(\'{airtable_property_name}\')',
+            'files': f'    {class_property_name} = F.AttachmentsField(\'{airtable_property_name}\')',
             'last_edited_by': f'    {class_property_name} = F.TextField(\'{airtable_property_name}\')',
             'multi_select': f'    {class_property_name} = F.MultipleSelectField(\'{airtable_property_name}\')',
             'rollup': f'    {class_property_name} = F.TextField(\'{airtable_property_name}\')'    
@@ -116,7 +167,7 @@ def build_airtable_class_body(property_map, type_map):
         print(f"{class_property_map[prop_type]}")
         body += f'{class_property_map[prop_type]}\n'
         
-    logger.info(f"Returning class body for Airtable table {airtable_table_name}")
+    logger.info(f"Returning class body for {len(property_map)} properties")
     
     return body
     
@@ -129,6 +180,22 @@ def construct_class(property_map, airtable_base_id, airtable_table_name, type_ma
     logger.info(f"Returning class string for Airtable table {airtable_table_name}")
     return class_code 
 
+def generate_airtable_class(property_map, airtable_base_id, airtable_table_name, type_map):
+    """
+    Builds the class for an Airtable table, writes it to src/NTAM_<table name>.py and imports it.
+    Returns:
+        The generated Model class, or None if it could not be imported.
+    """
+    class_code = construct_class(property_map, airtable_base_id, airtable_table_name, type_map)
+    
+    # Write the class to a file
+    with open(f'src/NTAM_{airtable_table_name}.py', 'w') as file:
+        file.write(class_code)
+    logger.info(f"Class {airtable_table_name} created as NTAM_{airtable_table_name}.py")
+    
+    # Import the new class
+    return import_new_class(airtable_table_name)
+
 def import_new_class(airtable_table_name):
     try:
         module = importlib.import_module(f'NTAM_{airtable_table_name}')
@@ -139,15 +206,25 @@ def import_new_class(airtable_table_name):
     class_name = airtable_table_name.replace(" ", "_")
     return getattr(module, class_name)   
         
-def build_type_map(property_map, db_id):
+def build_type_map(property_map, db_id, spool = None):
+    """
+    Fetches the Notion database and builds the type map from its first record.
+    When a RecordSpool is given, the pages are streamed into it instead of being held in memory, and the spool is returned as the records.
+    Returns:
+        tuple: (type map, records) or (None, None) if the database has no records.
+    """
     
     print(f"Building type map for database {db_id}")
     type_map = {}
-    records = fetch_notion_data(db_id)
-    if records is None:
+    if spool is None:
+        records = fetch_notion_data(db_id)
+    else:
+        spool.extend(notion_helper.query_iter(db_id))
+        records = spool
+    if not records:
         print(f"No records found for database {db_id}, skipping to next database.")
         return None, None
-    record = records[0] # We only need one record to get the property types
+    record = next(iter(records)) # We only need one record to get the property types
     for property_name in property_map:
         if property_name not in type_map:
             print(f"Adding property {property_name} to the type map as {record['properties'][property_name]['type']}.")
@@ -229,8 +306,8 @@ def convert_type_map(type_map):
     'rich_text': f'multilineText', # I know there's a rich text property, we're not transferring it.
     'title': f'singleLineText',
     'relation': f'singleLineText',
-    'date': f'date',
-    'files': f'url',
+    'date': f'dateTime', # Keeps the time of Notion datetimes, date only values are midnight UTC.
+    'files': f'multipleAttachments', # Filled by the attachment transfer stage after the records are saved.
     'last_edited_by': f'singleLineText',
     'multi_select': f'multipleSelects',
     'rollup': f'multilineText'    
@@ -289,70 +366,157 @@ def repair_table_properties(air_table, property_map, type_map):
         if airtable_property not in existing_field_list:
             print(f"Adding property {airtable_property} to Airtable table {air_table.name}")
             logger.info(f"Adding property {airtable_property} to Airtable table {air_table.name}")
-            air_table.create_field(airtable_property, type_map[notion_property])
+            air_table.create_field(airtable_property, type_map[notion_property], options=AIRTABLE_FIELD_OPTIONS.get(type_map[notion_property]))
             
     print(f"Properties assessed and repaired for Airtable table {air_table.name}")
     return air_table, relation_list
 
-def create_airtable_records(airtable_record_list, notion_db_records, property_map, type_map, Airtable_Class, notion_db_id):
-    # Iterate through the Notion DB records to create Airtable records
-    for page in notion_db_records:
-        print(f"Processing record {page['id']} from database {notion_db_id}")
-        
-        # Create an instanced Airtable Table Class
-        airtable_record = Airtable_Class()
+def convert_notion_records(notion_db_records, property_map, type_map, notion_db_id, hash_store = None, link_sources = None):
+    """
+    Converts Notion pages into Airtable class attribute values with the column converters of RecordConverter, CONVERT_BATCH_SIZE
+    pages per convert_batch call, yielding one row at a time.
+    When a RecordHashStore is given, records whose converted values match the fingerprint stored on the last run are skipped,
+    and changed records carry their stored Airtable record ID so saving them updates the existing record instead of creating a duplicate.
+    When link_sources is given, the related page IDs of every relation property are collected into it for the link pass,
+    as {notion property: {page ID: [related page IDs]}}, skipped records included.
+    Args:
+        notion_db_records (iterable): Notion pages, a list or a RecordSpool.
+    Yields:
+        dict: {'page_id', 'fields': {class attribute: value}, 'hash', 'record_id'}
+    """
+    converter = RecordConverter(property_map, type_map, notion_helper) # Compiled once for the table.
+    pages = iter(notion_db_records)
+    while True:
+        batch = list(itertools.islice(pages, CONVERT_BATCH_SIZE))
+        if not batch:
+            return
+        print(f"Processing {len(batch)} records from database {notion_db_id}")
+        yield from _hash_converted_rows(converter.convert_batch(batch, link_sources), hash_store)
+
+def _hash_converted_rows(converted, hash_store):
+    # attribute_values are set on the Airtable class instance, record_fields are fingerprinted for change detection.
+    for page, attribute_values, record_fields in converted:
+        record_hash = None
+        existing_record_id = None
+        if hash_store is not None:
+            record_hash = hash_store.fingerprint(record_fields)
+            if hash_store.is_unchanged(page['id'], record_hash):
+                print(f"Record {page['id']} unchanged since last run, skipping.")
+                hash_store.skipped += 1
+                continue
+            existing_record_id = hash_store.record_id(page['id'])
         
-        # Iterate through the property map
-        print(f"Itterating through property map for record {page['id']}")
-        for notion_property_name, airtable_property_name in property_map.items():
-            class_property_name = airtable_property_name.lower().replace(" ", "_")
-            class_property_name = re.sub(r'\W+', '', class_property_name) # Remove any non-alphanumeric characters.
-            prop_type = type_map[notion_property_name]
-            
-            # Fetch the Notion property value and assign it to the Airtable record
-            if notion_property_name in page['properties']:
-                print(f"Property {notion_property_name} found in record {page['id']}")
-                notion_property_value = notion_helper.return_property_value(page['properties'][notion_property_name])
-                
-                # Convert the date to a string in a date format for airtable.
-                if prop_type == 'date' and notion_property_value:
-                    if isinstance(notion_property_value, str):
-                        notion_property_value = datetime.datetime.strptime(notion_property_value, '%Y-%m-%d')
-                
-                # Convert the array types to a string for airtable.
-                array_types_to_string = ['relation', 'rollup', 'people', 'files']
-                if prop_type in array_types_to_string and notion_property_value:
-                    notion_property_value = str(notion_property_value)
-                
-                if notion_property_value == []:
-                    notion_property_value = None
-                    
-                print(f"Setting property {class_property_name} to {notion_property_value}")
-                setattr(airtable_record, class_property_name, notion_property_value)
-                
-            else:
-                print(f"Setting property {class_property_name} to None")
-                setattr(airtable_record, class_property_name, None)
-                
+        yield {'page_id': page['id'], 'fields': attribute_values, 'hash': record_hash, 'record_id': existing_record_id}
+
+def build_airtable_record(row, Airtable_Class, hash_store = None):
+    """
+    Creates an instance of the generated Airtable class from a converted row, staging its fingerprint in the hash store.
+    """
+    airtable_record = Airtable_Class()
+    for class_property_name, value in row['fields'].items():
+        setattr(airtable_record, class_property_name, value)
+    if row['record_id']:
+        airtable_record.id = row['record_id'] # Batch save will update the existing Airtable record.
+    if hash_store is not None:
+        hash_store.stage(row['page_id'], row['hash'], airtable_record)
+    return airtable_record
+
+def create_airtable_records(airtable_record_list, notion_db_records, property_map, type_map, Airtable_Class, notion_db_id, hash_store = None, link_sources = None):
+    """
+    Converts Notion pages into Airtable class instances and appends them to the batch save list. See convert_notion_records.
+    """
+    for row in convert_notion_records(notion_db_records, property_map, type_map, notion_db_id, hash_store, link_sources):
         # Add the record to a list of records to batch save
-        logger.info(f"Adding record {page['id']} to batch save list for table {airtable_table_name}.")
-        airtable_record_list.append(airtable_record) # List of objects.
+        logger.info(f"Adding record {row['page_id']} to batch save list for table {Airtable_Class.Meta.table_name}.")
+        airtable_record_list.append(build_airtable_record(row, Airtable_Class, hash_store)) # List of objects.
     return airtable_record_list
 
+def save_spooled_records(row_spool, Airtable_Class, hash_store, write_scheduler, chunk_size = SPOOL_CHUNK_SIZE):
+    """
+    Streams converted rows back from a RecordSpool and saves them chunk by chunk, so only chunk_size class instances exist at a time.
+    Returns:
+        list of str: The page IDs saved, see RecordHashStore.commit_staged.
+    """
+    saved_page_ids = []
+    for chunk in row_spool.chunks(chunk_size):
+        records = [build_airtable_record(row, Airtable_Class, hash_store) for row in chunk]
+        write_scheduler.batch_save(Airtable_Class, records).wait()
+        saved_page_ids.extend(hash_store.commit_staged())
+    return saved_page_ids
+
+
+def load_page_body_cache(cache_file_path = 'output/page_body_cache.json'):
+    try:
+        with open(cache_file_path, 'r') as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_page_body_cache(page_body_cache, cache_file_path = 'output/page_body_cache.json'):
+    os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+    with open(cache_file_path, 'w') as cache_file:
+        json.dump(page_body_cache, cache_file)
+
+def migrate_page_bodies(air_table, page_body_field, notion_db_records, hash_store, page_body_cache, write_scheduler):
+    """
+    Renders the body content of Notion pages into a long text field of their Airtable records.
+    Pages whose last_edited_time matches the cache are skipped, the rest are fetched together with get_block_trees.
+    Args:
+        air_table (Table): The Airtable table holding the records.
+        page_body_field (str): The name of the long text field, created if missing.
+        notion_db_records (iterable): The Notion pages of the database, a list or a RecordSpool.
+        hash_store (RecordHashStore): Used to look up the Airtable record ID of each page.
+        page_body_cache (dict): Page ID: last_edited_time of the body last written, updated in place.
+        write_scheduler (AirtableWriteScheduler): Shared scheduler for the record updates.
+    Returns:
+        int: The number of records updated.
+    """
+    if page_body_field not in [field.name for field in air_table.schema().fields]:
+        logger.info(f"Adding page body field {page_body_field} to Airtable table {air_table.name}")
+        air_table.create_field(page_body_field, 'multilineText')
+    
+    changed_pages = {}
+    page_count = 0
+    for page in notion_db_records:
+        page_count += 1
+        record_id = hash_store.record_id(page['id'])
+        if record_id and page_body_cache.get(page['id']) != page['last_edited_time']:
+            changed_pages[page['id']] = (record_id, page['last_edited_time'])
+    print(f"{len(changed_pages)} of {page_count} page bodies changed in table {air_table.name}")
+    
+    block_trees = notion_helper.get_block_trees(list(changed_pages))
+    updates = []
+    for page_id, blocks in block_trees.items():
+        if blocks is None:
+            logger.error(f"Could not fetch the body of page {page_id}, it will be retried on the next run.")
+            continue
+        record_id, last_edited_time = changed_pages[page_id]
+        body_text = notion_helper.render_blocks_text(blocks)[:AIRTABLE_LONG_TEXT_LIMIT]
+        updates.append(({"id": record_id, "fields": {page_body_field: body_text}}, page_id, last_edited_time))
+    
+    job = write_scheduler.batch_update(air_table, [update for update, _, _ in updates])
+    batch_size = write_scheduler.BATCH_SIZE
+    for index, future in enumerate(job.futures):
+        if future.exception() is None: # Only the bodies of written batches are cached, the others are retried on the next run.
+            for _, page_id, last_edited_time in updates[index * batch_size:(index + 1) * batch_size]:
+                page_body_cache[page_id] = last_edited_time
+    job.wait()
+    
+    logger.info(f"Page bodies written for {len(updates)} records in table {air_table.name}")
+    return len(updates)
+
 
-def find_relation_database(relations, relation_list, notion_db_id):
+def find_relation_database(relations, relation_list, notion_db_id, notion_db_records):
     print(f"Finding related databases for database {notion_db_id}")
     for notion_property in relation_list:
         print(f"Finding related database for property {notion_property}")
-        index = 0
         related_page = None
         
-        while index < len(notion_db_records) or index < 0: # Iterate through the records until we find a page containing relation data.
-            if notion_property in notion_db_records[index]['properties']:
-                print(f"Property {notion_property} exists in record {notion_db_records[index]['id']}: {notion_db_records[index]['properties'][notion_property]}")
-                rel_prop_value = notion_helper.return_property_value(notion_db_records[index]['properties'][notion_property]) # Returns a list of IDs
-            else: # Property does not exist.
+        for page in notion_db_records: # Iterate through the records until we find a page containing relation data.
+            if notion_property not in page['properties']: # Property does not exist.
                 continue
+            print(f"Property {notion_property} exists in record {page['id']}: {page['properties'][notion_property]}")
+            rel_prop_value = notion_helper.return_property_value(page['properties'][notion_property]) # Returns a list of IDs
             
             if rel_prop_value: # Property has data.
                 print(f"Relation data found for property: {rel_prop_value}")
@@ -361,99 +525,189 @@ def find_relation_database(relations, relation_list, notion_db_id):
             
             # No relation data found, continue to the next record.
             print(f"Property {notion_property} value is: {rel_prop_value}")
-            index += 1
             
         if related_page: # Map what database ID the property relates to.
-            related_db_id = related_page['parent']['database_id']
+            related_db_id = normalize_notion_id(related_page['parent']['database_id'])
             
             logger.info(f"Mapping property {notion_property} to database {related_db_id}")
             
             # Add the relation mapping to the relations dictionary. Notion property: Database ID of related table.
-            relations[notion_db_id]['relation_mapping'] = {notion_property: related_db_id}
+            relations[notion_db_id]['relation_mapping'][notion_property] = related_db_id
             
         else: # No relation data found, set the related database ID to None.
             logger.info(f"Could not find related database for property {notion_property}. Mapping to None.")
-            relations[notion_db_id]['relation_mapping'] = {notion_property: None}
+            relations[notion_db_id]['relation_mapping'][notion_property] = None
             
     print(f"Returning relations:\n{relations}")
     return relations           
 
-def make_relation_links(notion_db_id, relations, relation_map, airtable_record_list, property_map):
+def normalize_notion_id(notion_id):
+    return notion_id.replace('-', '').lower() if notion_id else notion_id
+
+def build_id_index(hash_store):
+    """
+    Maps normalized Notion page IDs to the Airtable record IDs they were saved as, from a table's RecordHashStore.
+    """
+    return {normalize_notion_id(page_id): entry['record_id'] for page_id, entry in hash_store.entries.items() if entry.get('record_id')}
+
+def ensure_link_field(air_table, link_field_name, linked_table_id):
     """
-    Establishes relation links between Notion and Airtable records based on the provided mappings.
+    Returns the name of a multipleRecordLinks field pointing at linked_table_id, creating it if the table does not have it yet.
+    """
+    for field in air_table.schema().fields:
+        if field.name == link_field_name:
+            return link_field_name
+    print(f"Adding link field {link_field_name} to Airtable table {air_table.name}")
+    logger.info(f"Adding link field {link_field_name} to Airtable table {air_table.name}")
+    air_table.create_field(link_field_name, 'multipleRecordLinks', options={'linkedTableId': linked_table_id})
+    return link_field_name
+
+def make_relation_links(link_sources, relation_map, id_indexes, write_scheduler, snapshots = None):
+    """
+    Second migration phase, run once every table is loaded. Links records through real multipleRecordLinks fields.
+    Every link is resolved with a dictionary lookup in the ID indexes, and the updates of all tables are written in 10-record
+    batches through the write scheduler, in parallel across bases. Relation properties on the same table are merged into one
+    update per record.
     Args:
-        notion_db_id (str): The ID of the Notion database.
-        relations (dict): A dictionary containing relation mappings between Notion properties and related database IDs.
-        relation_map (dict): A dictionary mapping related database IDs to their corresponding Airtable table names and base IDs.
-        airtable_record_list (list): A list of Airtable record objects to be updated with relation links.
-        property_map (dict): A dictionary mapping Notion properties to their corresponding Airtable field names.
+        link_sources (dict): Notion database ID: {notion property: {page ID: [related page IDs]}}, from create_airtable_records.
+        relation_map (dict): Notion database ID: table info (airtable_table_name, airtable_base_id, table_id, property_map, relation_mapping).
+        id_indexes (dict): Notion database ID: {normalized page ID: Airtable record ID}, see build_id_index.
+        write_scheduler (AirtableWriteScheduler): Shared scheduler for the link updates.
+        snapshots (AirtableSnapshotCache): Optional. Pages missing from an ID index are looked up in a "Notion record" snapshot of
+            their table, fetched once per run on the first miss.
     Returns:
-        list: The updated list of Airtable record objects with established relation links.
+        int: The number of links written.
     """
+    jobs = []
+    link_count = 0
+    completed_indexes = set()
+    
+    def complete_index(db_id):
+        # Adds the records the hash store does not know, e.g. created outside the migrator, from a projected snapshot of the table.
+        if snapshots is None or db_id in completed_indexes:
+            return
+        completed_indexes.add(db_id)
+        table_info = relation_map[db_id]
+        page_index = snapshots.page_index(table_info['airtable_base_id'], table_info['airtable_table_name'])
+        for page_id, record_id in page_index.items():
+            id_indexes[db_id].setdefault(page_id, record_id)
     
-    logger.info(f"Checking for relation properties in database {notion_db_id}")
-    for notion_property, related_db_id in relations[notion_db_id]['relation_mapping'].items():
+    for notion_db_id, sources in link_sources.items():
+        if notion_db_id not in relation_map: # The table was not saved this run.
+            continue
+        table_info = relation_map[notion_db_id]
+        air_table = api.table(table_info['airtable_base_id'], table_info['airtable_table_name'])
+        updates_by_record = {} # Airtable record ID: {link field: [linked record IDs]}
         
-        # Both tables are built, we can link the records.
-        if related_db_id and related_db_id in relation_map:
-            print(f"Both tables built for relation property {notion_property}.")
-            
-            class_property_name = property_map[notion_property].lower().replace(" ", "_")
-            class_property_name = re.sub(r'\W+', '', class_property_name) # Remove any non-alphanumeric characters.              
-            related_table_name = relation_map[related_db_id]['airtable_table_name']
-            related_base_id = relation_map[related_db_id]['airtable_base_id']
-            related_table = api.table(related_base_id, related_table_name)
-            add_field = True
-            
-            # Fetch all records from the related table. Dictionary.
-            print(f"Fetching all records from the related table {related_table_name}")
-            related_records = related_table.all() 
+        for notion_property, related_pages in sources.items():
+            related_db_id = table_info['relation_mapping'].get(notion_property)
+            if related_db_id not in relation_map or related_db_id not in id_indexes:
+                logger.info(f"Relation property {notion_property} of {table_info['airtable_table_name']} points to a database that was not migrated, skipping.")
+                continue
             
-            # Iterate through the records to find the related record.
-            print(f"Itterating through records to link relation property {notion_property}")
-            for index, current_record in enumerate(airtable_record_list): # current_record is an object.
-                # Fetch the related record from the current record's property.
-                for related_record in related_records['records']: # related_record is a dictionary.
-                    
-                    # If the related record (String of Notion record) is in the current record's property (String of List of Notion ids)
-                    if related_record['fields']['Notion record'] in getattr(current_record, class_property_name):
-                        print(f"Related record found for relation property {notion_property}")
-                        
-                        # Set the relation property to the related record's Airtable ID.
-                        print(f"Setting property REL__{class_property_name} to {related_record['id']}")
-                        logging.info(f"Setting property REL__{class_property_name} to {related_record['id']}")
-                        setattr(current_record, f'REL__{class_property_name}', related_db_id)
-                        
-                        # Save the record back to the list.
-                        print(f"Adding record {current_record} to batch save list.")
-                        airtable_record_list[index] = current_record
-    return airtable_record_list
+            link_field = ensure_link_field(
+                air_table, f"{LINK_FIELD_PREFIX}{table_info['property_map'][notion_property]}", relation_map[related_db_id]['table_id']
+            )
+            own_index = id_indexes[notion_db_id]
+            related_index = id_indexes[related_db_id]
+            for page_id, related_ids in related_pages.items():
+                record_id = own_index.get(normalize_notion_id(page_id))
+                if record_id is None:
+                    complete_index(notion_db_id)
+                    record_id = own_index.get(normalize_notion_id(page_id))
+                    if record_id is None:
+                        continue
+                related_keys = list(map(normalize_notion_id, related_ids))
+                if any(key not in related_index for key in related_keys):
+                    complete_index(related_db_id)
+                linked_records = [related_index[key] for key in related_keys if key in related_index]
+                updates_by_record.setdefault(record_id, {})[link_field] = linked_records
+                link_count += len(linked_records)
+        
+        if updates_by_record:
+            print(f"Writing links for {len(updates_by_record)} records in Airtable table {table_info['airtable_table_name']}")
+            updates = [{'id': record_id, 'fields': fields} for record_id, fields in updates_by_record.items()]
+            jobs.append(write_scheduler.batch_update(air_table, updates))
+    
+    for job in jobs:
+        job.wait()
+    logger.info(f"Relation link pass wrote {link_count} links.")
+    return link_count
 
 
+def collect_link_sources(notion_db_records, relation_properties):
+    """
+    Collects the related page IDs of the relation properties of every page, without converting the pages.
+    Used when the records stage is skipped and by the link command.
+    Returns:
+        dict: {notion property: {page ID: [related page IDs]}}
+    """
+    link_sources = {notion_property: {} for notion_property in relation_properties}
+    for page in notion_db_records:
+        for notion_property in relation_properties:
+            if notion_property in page['properties']:
+                link_sources[notion_property][page['id']] = notion_helper.return_property_value(page['properties'][notion_property], page['id']) or []
+    return link_sources
+
+def load_relation_map(relation_map_file_path = RELATION_MAP_PATH):
+    if not os.path.exists(relation_map_file_path):
+        return {}
+    with open(relation_map_file_path, 'r') as relation_map_file:
+        return json.load(relation_map_file)
+
+def save_relation_map(relation_map, relation_map_file_path = RELATION_MAP_PATH):
+    """
+    Merges relation_map into the one on disk, so a run over some of the databases keeps the tables of earlier runs.
+    """
+    merged = load_relation_map(relation_map_file_path)
+    merged.update(relation_map)
+    print(f"Writing relation map to {relation_map_file_path}")
+    os.makedirs(os.path.dirname(relation_map_file_path), exist_ok = True)
+    with open(relation_map_file_path, 'w') as relation_map_file:
+        json.dump(merged, relation_map_file, indent=4)
+    logger.info(f"Relation map written to {relation_map_file_path}")
+    return merged
+
 
 '''
 This will be a 4 step program to get Airtable on track. There's a few things where I'm aiming for simplicity over efficiency.
  1) Check the Airtable table for the required properties, generating any that are missing.
  2) Create a class for the Airtable table with the required properties.
  3) Iterate through the Notion database records, creating and saving a new Airtable record for each.
- 4) Iterate back through all records to make any necessary links after all tables are built.
+ 4) Once every table is built, link the records through multipleRecordLinks fields in a single pass (make_relation_links).
+Steps 1 and 2 always run. Step 3 is the "records" stage, followed by the "attachments" and "bodies" stages, step 4 is the "link" stage.
  '''
-if __name__ == "__main__":
+def migrate(config, spill_to_disk = False, stages = MIGRATION_STAGES):
+    """
+    Migrates the databases of config. init_clients must have been called.
+    Args:
+        config (list): The database entries to migrate, see select_databases to pick some of the configuration.
+        spill_to_disk (bool): Keep fetched pages and converted rows on disk instead of in memory, for databases larger than memory.
+        stages (iterable): The optional stages to run, any of MIGRATION_STAGES. Skipped stages reuse the record IDs of earlier runs.
+    Returns:
+        dict: The relation map of the migrated databases.
+    """
+    stages = set(stages)
+    unknown_stages = stages - set(MIGRATION_STAGES)
+    if unknown_stages:
+        raise ValueError(f"Unknown migration stages {sorted(unknown_stages)}, expected any of {MIGRATION_STAGES}.")
+
+    # Notion database ID: Airtable table info and relation mapping of every migrated table, used by the link pass.
+    relation_map = {}
+    link_sources = {} # Notion database ID: related page IDs per relation property.
+    id_indexes = {} # Notion database ID: Notion page ID to Airtable record ID.
     
-    # Initialize the Notion API Helper
-    notion_helper = NotionApiHelper()
+    # Shares the per-base Airtable request budget between all table writes.
+    write_scheduler = AirtableWriteScheduler()
     
-    # Initialize the Airtable API
-    with open('conf/Airtable_Token.txt', 'r') as file:
-        api_key = file.read().strip()
-    api = Api(api_key)
+    # Shared across databases so files attached to several tables are downloaded and uploaded once.
+    attachment_transfer = AttachmentTransfer(write_scheduler = write_scheduler)
     
-    # Load the configuration file
-    with open('conf/NotionAirtableMigrationConfig.json', 'r') as config_file:
-        config = json.load(config_file)
-
-    # Used to store the relation properties and what they relate to.
-    relation_map = []
+    # Page ID: last_edited_time of the page body last migrated.
+    page_body_cache = load_page_body_cache()
+    
+    # Projected "Notion record" snapshots of the tables, fetched only when the link pass meets a page the hash stores do not know.
+    snapshots = AirtableSnapshotCache(api)
     
     # Iterate through the configuration file
     for database in config:
@@ -462,9 +716,8 @@ if __name__ == "__main__":
         airtable_record_list = [] # List of Airtable records to batch save.
         airtable_table_name = database['airtable_table_name']
         airtable_base_id = database['airtable_base_id']
-        notion_db_id = database['notion_db_id']
+        notion_db_id = normalize_notion_id(database['notion_db_id'])
         property_map = database['property_map'] # Notion to Airtable property mapping.
-        self_relation = False # If the database is self-referential, this will be set to True.
         
         relations = {notion_db_id: {}} # This will be used to store the relation properties and what they relate to.
         relations[notion_db_id] = { 
@@ -474,31 +727,32 @@ if __name__ == "__main__":
         }
 
         # Create the table if it does not exist, also will load the table object to check for properties.
-        current_table = check_table_exists(airtable_base_id, airtable_table_name)
+        with profiler.stage('schema_repair'):
+            current_table = check_table_exists(airtable_base_id, airtable_table_name)
         if current_table is None:
             print(f"Table {airtable_table_name} not found in Airtable, skipping to next database.")
             logger.error(f"Table {airtable_table_name} not found in Airtable, skipping to next database.")
             continue
         
         # Build the type map here, return the notion DB query as a byproduct for later use.
-        type_map, notion_db_records = build_type_map(property_map, notion_db_id)
+        # In spill-to-disk mode the pages are kept in a spool file under output/spool/ and every later stage streams through it.
+        page_spool = RecordSpool(os.path.join(SPOOL_DIR, f'{notion_db_id}_pages.jsonl')) if spill_to_disk else None
+        with profiler.stage('type_map'):
+            type_map, notion_db_records = build_type_map(property_map, notion_db_id, page_spool)
+        if type_map is None:
+            continue
         
         # Repair the table properties, gather a list of relation properties for later.
-        current_table, relation_list = repair_table_properties(current_table, property_map, type_map)
+        with profiler.stage('schema_repair'):
+            current_table, relation_list = repair_table_properties(current_table, property_map, type_map)
         
         # Map the relation properties to their related database ID
-        relations = find_relation_database(relations, relation_list, notion_db_id)
-        
-        # Build the class
-        class_code = construct_class(property_map, airtable_base_id, airtable_table_name, type_map)
-        
-        # Write the class to a file
-        with open(f'src/NTAM_{airtable_table_name}.py', 'w') as file:
-            file.write(class_code)
-        logger.info(f"Class {airtable_table_name} created as NTAM_{airtable_table_name}.py")
+        with profiler.stage('relation_discovery'):
+            relations = find_relation_database(relations, relation_list, notion_db_id, notion_db_records)
         
-        # Import the new class
-        Airtable_Class = import_new_class(airtable_table_name)
+        # Build the class, write it to a file and import it.
+        with profiler.stage('class_build'):
+            Airtable_Class = generate_airtable_class(property_map, airtable_base_id, airtable_table_name, type_map)
         
         if Airtable_Class is None:
             logger.error(
@@ -507,27 +761,117 @@ if __name__ == "__main__":
             continue # Skip to the next database if the class is not imported.
         logger.info(f"Class {airtable_table_name} imported from NTAM_{airtable_table_name}.py")
         
-        # Create the Airtable records
-        airtable_record_list = create_airtable_records(
-            airtable_record_list, notion_db_records, property_map, type_map, Airtable_Class, notion_db_id
-        )
-        
-        # If there are relation properties, check if both tables have been built.
-        airtable_record_list = make_relation_links(
-            notion_db_id, relations, relation_map, airtable_record_list, property_map
-        )
+        hash_store = RecordHashStore(airtable_table_name)
+        if 'records' in stages:
+            # Create the Airtable records, skipping any whose content is unchanged since the last run.
+            link_sources[notion_db_id] = {}
+            if spill_to_disk:
+                # Convert into a second spool, then stream the converted rows back for saving.
+                row_spool = RecordSpool(os.path.join(SPOOL_DIR, f'{notion_db_id}_rows.jsonl'))
+                with profiler.stage('record_conversion'):
+                    row_spool.extend(convert_notion_records(notion_db_records, property_map, type_map, notion_db_id, hash_store, link_sources[notion_db_id]))
+                logger.info(f"{hash_store.skipped} unchanged records skipped, {len(row_spool)} records to save for table {airtable_table_name}.")
+                print(f"Batch saving records to Airtable table {airtable_table_name}")
+                with profiler.stage('batch_save'):
+                    saved_page_ids = save_spooled_records(row_spool, Airtable_Class, hash_store, write_scheduler)
+                row_spool.remove()
+            else:
+                with profiler.stage('record_conversion'):
+                    airtable_record_list = create_airtable_records(
+                        airtable_record_list, notion_db_records, property_map, type_map, Airtable_Class, notion_db_id, hash_store, link_sources[notion_db_id]
+                    )
+                logger.info(f"{hash_store.skipped} unchanged records skipped, {len(airtable_record_list)} records to save for table {airtable_table_name}.")
+                
+                # Batch save the records to the table.
+                print(f"Batch saving records to Airtable table {airtable_table_name}")
+                with profiler.stage('batch_save'):
+                    write_scheduler.batch_save(Airtable_Class, airtable_record_list).wait()
+                saved_page_ids = hash_store.commit_staged()
+            logger.info(f"Records batch saved to Airtable table {airtable_table_name}")
             
-        # Batch save the records to the table.
-        print(f"Batch saving records to Airtable table {airtable_table_name}")
-        Airtable_Class.batch_save(airtable_record_list)
-        logger.info(f"Records batch saved to Airtable table {airtable_table_name}")
+            # Store the fingerprints of the saved records for the next run.
+            hash_store.save()
+            snapshots.record_saved(airtable_base_id, airtable_table_name, {page_id: hash_store.record_id(page_id) for page_id in saved_page_ids})
+        else:
+            # Records were saved by an earlier run, the later stages work on the pages the hash store has a record for.
+            saved_page_ids = [page['id'] for page in notion_db_records if hash_store.record_id(page['id'])]
+            if 'link' in stages:
+                with profiler.stage('record_conversion'):
+                    link_sources[notion_db_id] = collect_link_sources(notion_db_records, relation_list)
+        
+        # Register the table for the link pass.
+        id_indexes[notion_db_id] = build_id_index(hash_store)
+        relation_map[notion_db_id] = dict(relations[notion_db_id], table_id=current_table.id, property_map=property_map)
+        
+        # Download the files of files properties and attach them to the saved records.
+        files_properties = [name for name, prop_type in type_map.items() if prop_type == 'files' and name in property_map]
+        if 'attachments' in stages and files_properties and saved_page_ids:
+            saved_page_id_set = set(saved_page_ids)
+            for notion_property_name in files_properties:
+                record_files = {}
+                for page in notion_db_records:
+                    if page['id'] in saved_page_id_set and notion_property_name in page['properties']:
+                        record_files[hash_store.record_id(page['id'])] = AttachmentTransfer.collect_files(page['properties'][notion_property_name])
+                attachment_transfer.transfer(current_table, property_map[notion_property_name], record_files)
+        
+        # Render the page bodies into a long text field, skipping pages not edited since the last run.
+        if 'bodies' in stages and database.get('page_body_field'):
+            migrate_page_bodies(current_table, database['page_body_field'], notion_db_records, hash_store, page_body_cache, write_scheduler)
+            save_page_body_cache(page_body_cache)
+        
+        if page_spool is not None:
+            page_spool.remove()
         
         
+    # All tables are loaded, link the records.
+    if 'link' in stages:
+        with profiler.stage('relation_linking'):
+            make_relation_links(link_sources, relation_map, id_indexes, write_scheduler, snapshots)
+    
+    snapshots.report()
+    write_scheduler.report()
+    write_scheduler.shutdown()
+        
     # Write the relation_map to a JSON file
-    relation_map_file_path = 'output/relation_map.json'
-    print(f"Writing relation map to {relation_map_file_path}")
-    with open(relation_map_file_path, 'w') as relation_map_file:
-        json.dump(relation_map, relation_map_file, indent=4)
-    logger.info(f"Relation map written to {relation_map_file_path}")
+    save_relation_map(relation_map)
+    return relation_map
 
-  
\ No newline at end of file
+def link(config):
+    """
+    Runs the link stage on its own for the databases of config, from the relation map and record hashes of an earlier migration.
+    The pages are fetched again for their relation properties, nothing else is written.
+    Returns:
+        int: The number of links written.
+    """
+    relation_map = load_relation_map()
+    link_sources = {}
+    for database in config:
+        notion_db_id = normalize_notion_id(database['notion_db_id'])
+        if notion_db_id not in relation_map:
+            print(f"Database {database['airtable_table_name']} has not been migrated yet, skipping it.")
+            logger.error(f"Database {notion_db_id} is not in {RELATION_MAP_PATH}, run the migration before linking it.")
+            continue
+        relation_properties = list(relation_map[notion_db_id]['relation_mapping'])
+        if relation_properties:
+            with profiler.stage('record_conversion'):
+                link_sources[notion_db_id] = collect_link_sources(notion_helper.query_iter(notion_db_id), relation_properties)
+    
+    # Every migrated table can be the target of a link, not only the selected ones.
+    id_indexes = {
+        db_id: build_id_index(RecordHashStore(table_info['airtable_table_name'])) for db_id, table_info in relation_map.items()
+    }
+    write_scheduler = AirtableWriteScheduler()
+    snapshots = AirtableSnapshotCache(api)
+    with profiler.stage('relation_linking'):
+        link_count = make_relation_links(link_sources, relation_map, id_indexes, write_scheduler, snapshots)
+    snapshots.report()
+    write_scheduler.report()
+    write_scheduler.shutdown()
+    return link_count
+
+
+if __name__ == "__main__":
+    configure_logging()
+    init_clients()
+    # Keep fetched pages and converted rows on disk instead of in memory, for databases larger than memory.
+    migrate(load_config(), spill_to_disk = '--spill-to-disk' in sys.argv)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# Record Converter
+# Per-column Notion to Airtable value converters, compiled once per table from its type map and applied to every page of the table.
+# Used by NotionToAirtableMigrator.convert_notion_records.
+
+'''
+Dependencies:
+- NotionApiHelper, for the property types that need it (relations past 25 items, people names, formulas, rollups).
+
+Each column gets one converter chosen for its Notion type and the Airtable field it is written to (see build_airtable_class_body),
+together with its class attribute name, so converting a page is one function call per column with no type dispatch.
+
+Values written per type:
+    - title, rich_text: The plain text of all segments, concatenated.
+    - number: int or float, numeric strings are parsed, anything else is None.
+    - checkbox: bool.
+    - select, status: The option name.
+    - multi_select: List of option names.
+    - date: UTC datetime of the start, written to a dateTime field (see build_airtable_class_body). Date only values are midnight UTC.
+    - relation: The related page IDs joined with ", " for the text copy. The ID list itself is what the link pass uses.
+    - people, created_by, last_edited_by: Names from the NotionApiHelper user directory, joined with ", ".
+    - formula, rollup, unique_id: Text, lists joined with ", ". Booleans as "true" / "false", dates as ISO strings.
+    - created_time, last_edited_time, email, phone_number, url: The string as given.
+    - files: Not written, attachments are transferred after saving (AttachmentTransfer). Leaving the field out of the saved record
+      keeps the attachments already in Airtable, a None would clear them. The file names are what gets fingerprinted.
+Empty values (None, "", []) are written as None.
+'''
+
+import datetime, re
+
+
+def class_property_name(airtable_property_name):
+    """
+    The attribute name of an Airtable property on the generated class, see build_airtable_class_body.
+    """
+    return re.sub(r'\W+', '', airtable_property_name.lower().replace(" ", "_"))
+
+
+def parse_notion_date(value):
+    """
+    Parses an ISO 8601 date or datetime (Notion or Airtable) into a UTC datetime, keeping the time.
+    Date only values are midnight UTC, datetimes without an offset are taken as UTC. Returns None for empty values.
+    """
+    if not value:
+        return None
+    if len(value) == 10: # 2024-11-01
+        return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]), tzinfo = datetime.timezone.utc)
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo = datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
+
+
+def _text(value):
+    if value is None or value == '' or value == []:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        items = [_text(item) for item in value]
+        return ', '.join(item for item in items if item is not None) or None
+    return str(value)
+
+
+def _number(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RecordConverter:
+    def __init__(self, property_map, type_map, notion_helper):
+        """
+        Compiles the converters of a table.
+
+        Args:
+            property_map (dict): Notion property name: Airtable property name.
+            type_map (dict): Notion property name: Notion property type.
+            notion_helper (NotionApiHelper): Used by the converters of relations, people, formulas and rollups.
+        """
+        self.notion_helper = notion_helper
+        self.columns = [] # (Notion property name, class attribute name, Notion type, converter)
+        for notion_property_name, airtable_property_name in property_map.items():
+            prop_type = type_map[notion_property_name]
+            self.columns.append((notion_property_name, class_property_name(airtable_property_name), prop_type, self._compile(prop_type)))
+        self.relation_columns = [column for column in self.columns if column[2] == 'relation']
+
+    def _compile(self, prop_type):
+        # Each converter takes the raw property and the page ID and returns (attribute value, fingerprinted value).
+        helper = self.notion_helper
+
+        if prop_type in ('title', 'rich_text'):
+            def convert(prop, page_id):
+                value = ''.join(part['plain_text'] for part in prop[prop_type]) or None
+                return value, value
+        elif prop_type == 'number':
+            def convert(prop, page_id):
+                value = _number(prop['number'])
+                return value, value
+        elif prop_type == 'checkbox':
+            def convert(prop, page_id):
+                value = bool(prop['checkbox'])
+                return value, value
+        elif prop_type in ('select', 'status'):
+            def convert(prop, page_id):
+                option = prop[prop_type]
+                value = option['name'] if option else None
+                return value, value
+        elif prop_type == 'multi_select':
+            def convert(prop, page_id):
+                value = [option['name'] for option in prop['multi_select']] or None
+                return value, value
+        elif prop_type == 'date':
+            def convert(prop, page_id):
+                value = parse_notion_date(prop['date']['start']) if prop['date'] else None
+                return value, value
+        elif prop_type in ('created_time', 'last_edited_time', 'email', 'phone_number', 'url'):
+            def convert(prop, page_id):
+                value = prop[prop_type] or None
+                return value, value
+        elif prop_type == 'files':
+            def convert(prop, page_id):
+                return None, [file.get('name') for file in prop['files']]
+        elif prop_type == 'people':
+            def convert(prop, page_id):
+                value = _text([helper.get_user_name(person) for person in prop['people']])
+                return value, value
+        elif prop_type in ('created_by', 'last_edited_by'):
+            def convert(prop, page_id):
+                value = helper.get_user_name(prop[prop_type]) if prop[prop_type] else None
+                return value, value
+        else: # relation, formula, rollup, unique_id and anything new go through the generic decoder.
+            def convert(prop, page_id):
+                value = _text(helper.return_property_value(prop, page_id))
+                return value, value
+        return convert
+
+    def convert_page(self, page, link_sources = None):
+        """
+        Converts one page.
+
+        Args:
+            page (dict): The Notion page object.
+            link_sources (dict): When given, receives {notion property: {page ID: [related page IDs]}} for the relation columns.
+
+        Returns:
+            tuple: (attribute values, fingerprinted values), both {class attribute: value}. Files columns are only fingerprinted.
+        """
+        attribute_values = {}
+        record_fields = {}
+        properties = page['properties']
+        page_id = page['id']
+        for notion_property_name, attribute_name, prop_type, convert in self.columns:
+            prop = properties.get(notion_property_name)
+            if prop_type == 'files':
+                record_fields[attribute_name] = convert(prop, page_id)[1] if prop is not None else None
+                continue
+            if prop is None:
+                attribute_values[attribute_name] = None
+                record_fields[attribute_name] = None
+                continue
+            if prop_type == 'relation':
+                related_ids = self.notion_helper.return_property_value(prop, page_id) or []
+                if link_sources is not None:
+                    link_sources.setdefault(notion_property_name, {})[page_id] = related_ids
+                value = ', '.join(related_ids) or None
+                attribute_values[attribute_name] = value
+                record_fields[attribute_name] = value
+                continue
+            attribute_values[attribute_name], record_fields[attribute_name] = convert(prop, page_id)
+        return attribute_values, record_fields
+
+    def convert_batch(self, pages, link_sources = None):
+        """
+        Converts a batch of pages, used by convert_notion_records.
+
+        Returns:
+            list of tuple: (page, attribute values, fingerprinted values) per page.
+        """
+        return [(page, *self.convert_page(page, link_sources)) for page in pages]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Record Hash Store
+# Local sidecar store of content fingerprints for migrated records, used by NotionToAirtableMigrator.py to skip rows that have not
+# changed since the last run and to update, rather than duplicate, the rows that have.
+
+'''
+Dependencies:
+- None
+
+One JSON file is kept per Airtable table under output/record_hashes/, mapping each Notion page ID to the fingerprint of the
+converted field values last written to Airtable and the Airtable record ID they were written to:
+{
+    "notion_page_id": {"hash": "sha256 hex digest", "record_id": "recXXXXXXXXXXXXXX"}
+}
+
+Fingerprints are taken from the mapped and converted values, so a change in the property map or the conversion also counts as a change.
+Deleting the file forces a full rewrite of the table on the next run.
+'''
+
+import hashlib, json, logging, os, re
+
+logger = logging.getLogger(__name__)
+
+
+class RecordHashStore:
+    STORE_DIR = 'output/record_hashes'
+
+    def __init__(self, airtable_table_name, store_dir = None):
+        store_dir = store_dir if store_dir else self.STORE_DIR
+        file_name = re.sub(r'\W+', '', airtable_table_name.replace(" ", "_"))
+        self.path = os.path.join(store_dir, f'{file_name}.json')
+        self.entries = {}
+        self.staged = [] # (page_id, hash, record object) waiting for the batch save to assign record IDs.
+        self.skipped = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as store_file:
+                self.entries = json.load(store_file)
+            print(f"Loaded {len(self.entries)} record hashes from {self.path}")
+        except FileNotFoundError:
+            self.entries = {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Record hash store {self.path} is unreadable, starting empty: {e}")
+            self.entries = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as store_file:
+            json.dump(self.entries, store_file)
+        os.replace(temp_path, self.path) # Atomic, a crash mid-write keeps the previous store.
+        logger.info(f"Saved {len(self.entries)} record hashes to {self.path}")
+
+    @staticmethod
+    def fingerprint(fields):
+        """
+        Hashes a dictionary of converted field values. Key order does not matter, dates and other objects are hashed by their string form.
+
+        Args:
+            fields (dict): Field name: converted value.
+
+        Returns:
+            str: The sha256 hex digest.
+        """
+        encoded = json.dumps(fields, sort_keys = True, default = str, separators = (',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def is_unchanged(self, page_id, record_hash):
+        entry = self.entries.get(page_id)
+        return bool(entry and entry.get('record_id') and entry['hash'] == record_hash)
+
+    def record_id(self, page_id):
+        entry = self.entries.get(page_id)
+        return entry.get('record_id') if entry else None
+
+    def update(self, page_id, record_hash, record_id):
+        self.entries[page_id] = {'hash': record_hash, 'record_id': record_id}
+
+    def stage(self, page_id, record_hash, record):
+        self.staged.append((page_id, record_hash, record))
+
+    def commit_staged(self):
+        """
+        Stores the fingerprints of staged records once they have been saved. Records without an Airtable ID were not saved and are left out,
+        so they are retried on the next run.
+
+        Returns:
+            list of str: The page IDs whose fingerprints were stored.
+        """
+        committed = []
+        for page_id, record_hash, record in self.staged:
+            record_id = getattr(record, 'id', None)
+            if record_id:
+                self.update(page_id, record_hash, record_id)
+                committed.append(page_id)
+        self.staged = []
+        return committed
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Record Spool
+# Append-only JSON Lines file used by NotionToAirtableMigrator.py to keep fetched pages and converted rows on disk instead of in memory.
+
+'''
+Dependencies:
+- None
+
+A RecordSpool is written once, one compact JSON object per line, then read back any number of times by iterating over it.
+Iterating streams the file line by line, so stages reading a spool hold one record at a time (or one chunk, see chunks()).
+Dates and datetimes survive the round trip, they are written as {"$date": iso} / {"$datetime": iso} and decoded back.
+
+Usage:
+    spool = RecordSpool('output/spool/pages.jsonl')
+    for page in notion_helper.query_iter(db_id):
+        spool.append(page)
+    spool.close()
+    for page in spool:
+        ...
+    spool.remove()
+'''
+
+import datetime, json, os
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _decode(obj):
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return datetime.date.fromisoformat(obj["$date"])
+    return obj
+
+
+class RecordSpool:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+        self.file = open(path, 'w', encoding = 'utf-8')
+        self.count = 0
+
+    def append(self, record):
+        self.file.write(json.dumps(record, default = _encode, separators = (',', ':')))
+        self.file.write('\n')
+        self.count += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.close() # Everything written so far is flushed before reading.
+        return self.read(self.path)
+
+    @staticmethod
+    def read(path):
+        """
+        Streams the records of a spool file written earlier, possibly by another process, without opening it for writing.
+        """
+        with open(path, 'r', encoding = 'utf-8') as spool_file:
+            for line in spool_file:
+                yield json.loads(line, object_hook = _decode)
+
+    def chunks(self, chunk_size):
+        """
+        Streams the spool back in lists of at most chunk_size records.
+        """
+        chunk = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
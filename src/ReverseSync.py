@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# Airtable to Notion Reverse Sync
+# Moves edits made in Airtable back into Notion while both sides are in use. Reads Airtable records modified since the last run,
+# maps their fields back through the inverted property_map and applies only the changed properties to the Notion pages.
+
+'''
+Dependencies:
+- pyairtable
+- NotionToAirtableMigrator.py and the modules it uses. The records must have been migrated, each one is matched to its Notion page
+  through its "Notion record" field.
+
+Usage:
+    python src/ReverseSync.py [config_path]
+
+Incremental reads:
+Each table keeps a watermark in output/reverse_sync_state.json, the time its last reverse sync started. Only records with
+LAST_MODIFIED_TIME() after the watermark are read, projected down to the mapped fields. The watermark only moves when every record
+was applied, after a failed page read or update the next run reads the same records again.
+
+Writes:
+Page states come from one paginated database query. Each current page is converted forward with RecordConverter, the values a forward
+sync writes to Airtable, and only the Airtable fields differing from them are turned into Notion property bodies (generate_property_body)
+and applied with update_page_if_changed. Comparing in Airtable terms matters because the round trip is lossy: rich text comes back as
+plain text, dates as UTC datetimes. A field left as the forward sync wrote it is never sent, so formatting and date-only values survive.
+Relation properties are written back from their REL__ link fields, translating Airtable record IDs to page IDs through the record hash
+stores. A link field holding records that are not in the hash stores is left alone. Computed Notion types (formula, rollup, timestamps,
+people, files, unique_id) are never written.
+Pages are updated from REVERSE_WORKERS threads, each with its own NotionApiHelper.worker_helper sharing the request throttle.
+
+Loop suppression:
+- Records the forward sync just wrote match the forward conversion of their page, nothing is sent and Notion is not touched.
+- After a page is updated, its forward fingerprint in the RecordHashStore is replaced by the fingerprint of the updated page, so the
+  forward sync sees the page as unchanged and does not write the same values back to Airtable.
+'''
+
+import datetime, json, logging, os, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pyairtable import Api
+from NotionApiHelper import NotionApiHelper
+from RecordHashStore import RecordHashStore
+from AirtableSnapshot import page_id_from_field
+from RecordConverter import RecordConverter, class_property_name, parse_notion_date
+import NotionToAirtableMigrator as migrator
+
+logger = logging.getLogger(__name__)
+
+
+class ReverseSync:
+    STATE_PATH = 'output/reverse_sync_state.json'
+    REVERSE_WORKERS = 3
+    NOTION_RECORD_FIELD = 'Notion record'
+    WRITABLE_TYPES = ('checkbox', 'email', 'number', 'phone_number', 'url', 'select', 'status', 'date', 'multi_select', 'rich_text', 'title', 'relation')
+
+    def __init__(self, config_path = 'conf/NotionAirtableMigrationConfig.json', notion_helper = None, api = None, max_workers = None):
+        with open(config_path, 'r') as config_file:
+            self.config = json.load(config_file)
+        self.notion_helper = notion_helper if notion_helper else NotionApiHelper()
+        if api is None:
+            with open('conf/Airtable_Token.txt', 'r') as file:
+                api = Api(file.read().strip())
+        self.api = api
+        migrator.notion_helper = self.notion_helper # Used by convert_notion_records.
+        migrator.api = self.api
+        self.max_workers = max_workers if max_workers else self.REVERSE_WORKERS
+        try:
+            with open(self.STATE_PATH, 'r') as state_file:
+                self.state = json.load(state_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.state = {}
+        self.hash_stores = {}
+        self.reverse_indexes = {} # Airtable table name: {record ID: Notion page ID}
+
+    def _save_state(self):
+        # Written to a temporary file and swapped in, an interrupted write never leaves a truncated state behind.
+        os.makedirs(os.path.dirname(self.STATE_PATH), exist_ok = True)
+        temp_path = f'{self.STATE_PATH}.tmp'
+        with open(temp_path, 'w') as state_file:
+            json.dump(self.state, state_file, indent = 4)
+        os.replace(temp_path, self.STATE_PATH)
+
+    def _hash_store(self, airtable_table_name):
+        if airtable_table_name not in self.hash_stores:
+            self.hash_stores[airtable_table_name] = RecordHashStore(airtable_table_name)
+        return self.hash_stores[airtable_table_name]
+
+    def _reverse_index(self, related_table_name):
+        # Airtable record ID to Notion page ID, from the hash store of the related table. Built before the worker threads start.
+        if related_table_name not in self.reverse_indexes:
+            self.reverse_indexes[related_table_name] = {entry['record_id']: page_id for page_id, entry in self._hash_store(related_table_name).entries.items()}
+        return self.reverse_indexes[related_table_name]
+
+    def _related_page_ids(self, record_ids, related_table_name):
+        reverse_index = self._reverse_index(related_table_name)
+        return [reverse_index[record_id] for record_id in record_ids or [] if record_id in reverse_index]
+
+    @staticmethod
+    def same_value(prop_type, airtable_value, forward_value):
+        """
+        True if an Airtable cell holds the value the forward sync writes for the current Notion property (RecordConverter output).
+        """
+        if airtable_value in ('', []):
+            airtable_value = None
+        if prop_type == 'checkbox':
+            return bool(airtable_value) == bool(forward_value)
+        if prop_type == 'multi_select':
+            return set(airtable_value or []) == set(forward_value or [])
+        if airtable_value is None or forward_value is None:
+            return airtable_value is None and forward_value is None
+        if prop_type == 'number':
+            try:
+                return float(airtable_value) == float(forward_value)
+            except (TypeError, ValueError):
+                return False
+        if prop_type == 'date':
+            # Written as a dateTime field, an Airtable date field gives date only values.
+            if len(airtable_value) == 10:
+                return parse_notion_date(airtable_value).date() == forward_value.date()
+            return parse_notion_date(airtable_value) == forward_value
+        return str(airtable_value) == str(forward_value)
+
+    def build_property_body(self, notion_property_name, prop_type, value):
+        """
+        Turns an Airtable cell value into a Notion property body for update_page.
+        """
+        if value in (None, '', []) and prop_type in ('select', 'status', 'date', 'email', 'url', 'phone_number', 'number'):
+            return {notion_property_name: {prop_type: None}}
+        if prop_type in ('rich_text', 'title'):
+            return self.notion_helper.generate_property_body(notion_property_name, prop_type, [str(value)] if value not in (None, '') else [])
+        if prop_type == 'checkbox':
+            return self.notion_helper.generate_property_body(notion_property_name, prop_type, bool(value))
+        if prop_type == 'multi_select':
+            return self.notion_helper.generate_property_body(notion_property_name, prop_type, list(value or []))
+        return self.notion_helper.generate_property_body(notion_property_name, prop_type, value)
+
+    def sync_table(self, database):
+        """
+        Applies the Airtable edits of one config entry to Notion.
+
+        Returns:
+            dict: {"read", "updated", "skipped", "failed"} counts.
+        """
+        airtable_table_name = database['airtable_table_name']
+        notion_db_id = migrator.normalize_notion_id(database['notion_db_id'])
+        property_map = database['property_map']
+        air_table = self.api.table(database['airtable_base_id'], airtable_table_name)
+        hash_store = self._hash_store(airtable_table_name)
+        started = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec = 'seconds')
+
+        sample = self.notion_helper.query(notion_db_id, page_num = 1)
+        if not sample:
+            logger.error(f"Could not read Notion database {notion_db_id}, skipping reverse sync of {airtable_table_name}.")
+            return {"read": 0, "updated": 0, "skipped": 0, "failed": 0}
+        type_map = {name: sample[0]['properties'][name]['type'] for name in property_map if name in sample[0]['properties']}
+
+        # Airtable field: (Notion property, Notion type, class attribute of the forward value), relations read from their link field.
+        relation_targets = self._relation_targets(notion_db_id)
+        field_map = {}
+        converter_property_map = {}
+        for notion_property_name, airtable_property_name in property_map.items():
+            prop_type = type_map.get(notion_property_name)
+            if prop_type not in self.WRITABLE_TYPES or airtable_property_name == self.NOTION_RECORD_FIELD:
+                continue
+            if prop_type == 'relation' and notion_property_name not in relation_targets:
+                continue
+            converter_property_map[notion_property_name] = airtable_property_name
+            attribute_name = class_property_name(airtable_property_name)
+            if prop_type == 'relation':
+                airtable_property_name = f"{migrator.LINK_FIELD_PREFIX}{airtable_property_name}"
+            field_map[airtable_property_name] = (notion_property_name, prop_type, attribute_name)
+
+        watermark = self.state.get(airtable_table_name, {}).get('watermark')
+        formula = f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{watermark}'))" if watermark else None
+        print(f"Reading Airtable records of {airtable_table_name} modified after {watermark}")
+        records = air_table.all(fields = list(field_map) + [self.NOTION_RECORD_FIELD], formula = formula)
+
+        updates = {} # page ID: (record ID, Airtable fields)
+        for record in records:
+            page_id = page_id_from_field(record['fields'].get(self.NOTION_RECORD_FIELD))
+            if page_id is not None:
+                updates[page_id] = (record['id'], record['fields'])
+
+        if updates:
+            # One paginated query gives the current state of every page for the diff.
+            self.notion_helper.cache_pages(self.notion_helper.query(notion_db_id) or [])
+            for related_table_name in relation_targets.values():
+                self._reverse_index(related_table_name)
+
+        # The page cache, retry counter and statistics of a NotionApiHelper are not thread safe, every thread gets its own.
+        local = threading.local()
+        workers = []
+        def worker():
+            if not hasattr(local, 'helper'):
+                local.helper = self.notion_helper.worker_helper()
+                local.converter = RecordConverter(converter_property_map, type_map, local.helper)
+                workers.append(local.helper)
+            return local.helper, local.converter
+
+        def apply(item):
+            page_id, (record_id, fields) = item
+            helper, converter = worker()
+            current_page = helper.page_cache.get(migrator.normalize_notion_id(page_id))
+            if current_page is None:
+                helper._throttle()
+                current_page = helper.get_page(page_id)
+                if not current_page:
+                    logger.error(f"Could not read Notion page {page_id}, skipping record {record_id}.")
+                    return page_id, record_id, None, False
+            properties = self.changed_properties(current_page, fields, field_map, relation_targets, converter)
+            if not properties:
+                return page_id, record_id, current_page, False
+            helper._throttle()
+            response = helper.update_page_if_changed(page_id, properties, current_page)
+            # The known page object comes back when nothing differed.
+            return page_id, record_id, response, response is not current_page
+
+        updated = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            results = list(executor.map(apply, updates.items()))
+        for helper in workers:
+            self.notion_helper.merge_update_stats(helper)
+        for page_id, record_id, response, sent in results:
+            if not response: # The page could not be read or the update failed.
+                failed += 1
+                continue
+            if not sent:
+                continue
+            updated += 1
+            # Record the new state as already synced forward, so the forward sync does not echo it back to Airtable.
+            # Without a stored entry the page is not skipped and its fingerprint is computed like in a forward run.
+            hash_store.entries.pop(response['id'], None)
+            for row in migrator.convert_notion_records([response], property_map, type_map, notion_db_id, hash_store):
+                hash_store.update(row['page_id'], row['hash'], record_id)
+        hash_store.save()
+
+        if failed:
+            # The failed records are read again on the next run, the ones applied now then match their page and are skipped.
+            logger.error(f"{failed} records of {airtable_table_name} could not be applied, keeping the watermark {watermark}.")
+        else:
+            self.state[airtable_table_name] = {'watermark': started}
+            self._save_state()
+        result = {"read": len(records), "updated": updated, "skipped": len(updates) - updated - failed, "failed": failed}
+        print(f"Reverse sync of {airtable_table_name}: {result}")
+        logger.info(f"Reverse sync of {airtable_table_name}: {result}")
+        return result
+
+    def changed_properties(self, current_page, fields, field_map, relation_targets, converter):
+        """
+        Returns the Notion property bodies of the Airtable fields differing from the forward conversion of the current page.
+
+        Args:
+            current_page (dict): The Notion page object.
+            fields (dict): The fields of the Airtable record.
+            field_map (dict): Airtable field: (Notion property, Notion type, class attribute), see sync_table.
+            relation_targets (dict): Notion relation property: Airtable table name of the related database.
+            converter (RecordConverter): Converter of the writable properties of the table.
+        """
+        link_sources = {}
+        forward_values = converter.convert_page(current_page, link_sources)[0]
+        page_id = current_page['id']
+        properties = {}
+        for airtable_property_name, (notion_property_name, prop_type, attribute_name) in field_map.items():
+            value = fields.get(airtable_property_name)
+            if prop_type == 'relation':
+                record_ids = value or []
+                value = self._related_page_ids(record_ids, relation_targets[notion_property_name])
+                if len(value) < len(record_ids):
+                    logger.info(f"Links of {airtable_property_name} on page {page_id} point to records without a Notion page, not writing them.")
+                    continue
+                related_ids = link_sources.get(notion_property_name, {}).get(page_id) or []
+                if set(map(migrator.normalize_notion_id, value)) == set(map(migrator.normalize_notion_id, related_ids)):
+                    continue
+            elif self.same_value(prop_type, value, forward_values.get(attribute_name)):
+                continue
+            elif prop_type == 'date' and value and len(value) > 10 and parse_notion_date(value).time() == datetime.time(0):
+                current_date = (current_page['properties'].get(notion_property_name) or {}).get('date') or {}
+                if len(current_date.get('start') or '') == 10:
+                    value = value[:10] # Midnight UTC is how a date only Notion value reaches Airtable, keep it date only.
+            properties.update(self.build_property_body(notion_property_name, prop_type, value))
+        return properties
+
+    def _relation_targets(self, notion_db_id):
+        # Notion relation property: Airtable table name of the related database, from the relation map of the last migration.
+        try:
+            with open('output/relation_map.json', 'r') as relation_map_file:
+                relation_map = json.load(relation_map_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        targets = {}
+        for notion_property, related_db_id in relation_map.get(notion_db_id, {}).get('relation_mapping', {}).items():
+            if related_db_id in relation_map:
+                targets[notion_property] = relation_map[related_db_id]['airtable_table_name']
+        return targets
+
+    def run(self):
+        results = {}
+        for database in self.config:
+            results[database['airtable_table_name']] = self.sync_table(database)
+        self.notion_helper.report_update_stats()
+        return results
+
+
+if __name__ == "__main__":
+    migrator.configure_logging()
+    ReverseSync(sys.argv[1] if len(sys.argv) > 1 else 'conf/NotionAirtableMigrationConfig.json').run()
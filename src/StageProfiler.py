@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Stage Profiler
+# Opt-in CPU and memory profiling of the migration stages. Wraps each stage in cProfile and tracemalloc snapshots and writes
+# per-stage profile dumps plus a summary of the hottest functions and top allocation sites, so a slow or bloated run leaves
+# something to look at.
+
+'''
+Dependencies:
+- None (cProfile, pstats and tracemalloc are in the standard library).
+
+Usage:
+    profiler = StageProfiler(enabled = True)         # StageProfiler() is disabled, stage() then costs one method call.
+    with profiler.stage('type_map'):
+        ...
+    profiler.write_summary()                         # output/profiles/<run>/
+
+    python src/MigrationCLI.py migrate --profile [cpu|memory]           # Both by default.
+
+Output, one directory per run under PROFILE_DIR:
+    - <stage>.prof: cProfile stats of every run of the stage, open with python -m pstats or snakeviz.
+    - <stage>.tracemalloc: The tracemalloc snapshot taken at the end of the last run of the stage, load with tracemalloc.Snapshot.load.
+    - summary.json / summary.txt: Per stage, the number of runs, wall time, peak traced memory, memory left allocated, the TOP_N
+      hottest functions (own time) and the TOP_N allocation sites (memory allocated during the stage and still held at its end).
+
+A stage run inside another one (e.g. the Notion query inside the type map stage) is profiled on its own, the CPU profile of the outer
+stage leaves it out while its wall time, memory and allocations include it. Only the thread that created the profiler is profiled,
+stages entered from worker threads are not recorded, and work a stage hands to worker threads shows up as waiting time.
+'''
+
+import contextlib, cProfile, datetime, io, json, logging, os, pstats, threading, time, tracemalloc
+
+logger = logging.getLogger(__name__)
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+class StageProfiler:
+    PROFILE_DIR = 'output/profiles'
+    TOP_N = 20 # Functions and allocation sites listed per stage.
+    TRACE_FRAMES = 1 # Frames kept per allocation by tracemalloc, allocation sites are grouped by line.
+
+    def __init__(self, enabled = False, cpu = True, memory = True, out_dir = None, top_n = None):
+        """
+        Args:
+            enabled (bool): Profile the stages. When False, stage() returns a shared no-op context.
+            cpu (bool): Capture cProfile stats per stage.
+            memory (bool): Take tracemalloc snapshots around each stage.
+            out_dir (str): Where this run's files are written. Optional, defaults to PROFILE_DIR/<start time>.
+            top_n (int): Functions and allocation sites listed per stage in the summary. Optional, defaults to TOP_N.
+        """
+        self.enabled = enabled
+        self.cpu = cpu
+        self.memory = memory
+        self.out_dir = out_dir if out_dir else os.path.join(self.PROFILE_DIR, datetime.datetime.now().strftime('%Y%m%d_%H%M%S'))
+        self.top_n = top_n if top_n else self.TOP_N
+        self.stages = {} # Stage name: {"runs", "seconds", "peak_bytes", "net_bytes", "allocations", "profile", "snapshot"}
+        self._stack = [] # Stages currently running, innermost last.
+        self._thread = threading.get_ident()
+        self._started_tracing = False
+
+    def stage(self, name):
+        """
+        Returns a context manager profiling the code it wraps as one run of the named stage.
+        """
+        if not self.enabled or threading.get_ident() != self._thread:
+            return _NO_STAGE
+        return self._stage(name)
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        stats = self.stages.setdefault(name, {
+            'runs': 0, 'seconds': 0.0, 'peak_bytes': 0, 'net_bytes': 0, 'allocations': {}, 'profile': None, 'snapshot': None
+        })
+        parent = self._stack[-1] if self._stack else None
+        frame = {'name': name, 'peak': 0}
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.TRACE_FRAMES)
+                self._started_tracing = True
+            if parent is not None:
+                parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            frame['before'] = tracemalloc.take_snapshot()
+            frame['traced'] = tracemalloc.get_traced_memory()[0]
+        if self.cpu:
+            if parent is not None and parent.get('profile') is not None:
+                parent['profile'].disable()
+            if stats['profile'] is None:
+                stats['profile'] = cProfile.Profile()
+            frame['profile'] = stats['profile']
+        self._stack.append(frame)
+        started = time.perf_counter()
+        if self.cpu:
+            frame['profile'].enable()
+        try:
+            yield
+        finally:
+            if self.cpu:
+                frame['profile'].disable()
+            stats['seconds'] += time.perf_counter() - started
+            stats['runs'] += 1
+            self._stack.pop()
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                frame['peak'] = max(frame['peak'], peak)
+                stats['peak_bytes'] = max(stats['peak_bytes'], frame['peak'])
+                stats['net_bytes'] += current - frame['traced']
+                if parent is not None:
+                    parent['peak'] = max(parent['peak'], frame['peak'])
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')
+                ))
+                for difference in snapshot.compare_to(frame['before'], 'lineno')[:self.top_n * 5]:
+                    if difference.size_diff <= 0:
+                        continue
+                    site = str(difference.traceback[0])
+                    size, count = stats['allocations'].get(site, (0, 0))
+                    stats['allocations'][site] = (size + difference.size_diff, count + difference.count_diff)
+                stats['snapshot'] = snapshot
+            if self.cpu and parent is not None and parent.get('profile') is not None:
+                parent['profile'].enable()
+
+    def hottest_functions(self, name):
+        """
+        Returns the TOP_N functions of a stage by own time, as {"function", "calls", "own_seconds", "cumulative_seconds"}.
+        """
+        profile = self.stages[name]['profile']
+        if profile is None:
+            return []
+        function_stats = pstats.Stats(profile, stream = io.StringIO()).stats
+        hottest = sorted(function_stats.items(), key = lambda item: item[1][2], reverse = True)[:self.top_n]
+        return [
+            {'function': f'{filename}:{line}({function})', 'calls': calls, 'own_seconds': own, 'cumulative_seconds': cumulative}
+            for (filename, line, function), (primitive_calls, calls, own, cumulative, callers) in hottest
+        ]
+
+    def top_allocations(self, name):
+        """
+        Returns the TOP_N allocation sites of a stage by memory allocated and still held at the end of its runs.
+        """
+        allocations = sorted(self.stages[name]['allocations'].items(), key = lambda item: item[1][0], reverse = True)[:self.top_n]
+        return [{'site': site, 'bytes': size, 'blocks': count} for site, (size, count) in allocations]
+
+    def summary(self):
+        return {
+            name: {
+                'runs': stats['runs'],
+                'seconds': stats['seconds'],
+                'peak_mb': stats['peak_bytes'] / 1024 / 1024 if self.memory else None,
+                'net_mb': stats['net_bytes'] / 1024 / 1024 if self.memory else None,
+                'hottest_functions': self.hottest_functions(name),
+                'top_allocations': self.top_allocations(name)
+            }
+            for name, stats in self.stages.items()
+        }
+
+    def write_summary(self):
+        """
+        Writes the per-stage dumps and the summary to out_dir and stops tracemalloc if the profiler started it.
+
+        Returns:
+            dict: The summary, or {} when disabled.
+        """
+        if not self.enabled:
+            return {}
+        os.makedirs(self.out_dir, exist_ok = True)
+        for name, stats in self.stages.items():
+            if stats['profile'] is not None:
+                stats['profile'].dump_stats(os.path.join(self.out_dir, f'{name}.prof'))
+            if stats['snapshot'] is not None:
+                stats['snapshot'].dump(os.path.join(self.out_dir, f'{name}.tracemalloc'))
+        summary = self.summary()
+        with open(os.path.join(self.out_dir, 'summary.json'), 'w') as summary_file:
+            json.dump(summary, summary_file, indent = 4)
+
+        lines = []
+        for name, stage in sorted(summary.items(), key = lambda item: item[1]['seconds'], reverse = True):
+            memory = f", peak {stage['peak_mb']:.1f} MB, {stage['net_mb']:+.1f} MB held" if self.memory else ''
+            lines.append(f"{name}: {stage['runs']} runs, {stage['seconds']:.3f} s{memory}")
+            if stage['hottest_functions']:
+                lines.append("  Hottest functions (own time):")
+                lines += [f"    {function['own_seconds']:9.3f} s {function['calls']:>9} calls  {function['function']}" for function in stage['hottest_functions']]
+            if stage['top_allocations']:
+                lines.append("  Top allocation sites:")
+                lines += [f"    {allocation['bytes'] / 1024:11.1f} KiB {allocation['blocks']:>9} blocks  {allocation['site']}" for allocation in stage['top_allocations']]
+        with open(os.path.join(self.out_dir, 'summary.txt'), 'w') as summary_file:
+            summary_file.write('\n'.join(lines) + '\n')
+
+        if self._started_tracing and not self._stack:
+            tracemalloc.stop()
+            self._started_tracing = False
+        print(f"Stage profiles written to {self.out_dir}")
+        logger.info(f"Stage profiles written to {self.out_dir}")
+        return summary
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# Notion to Airtable Sync Daemon
+# Long-running version of NotionToAirtableMigrator.py. Schema checks, class generation and ID indexes are done once at startup and
+# kept in memory, then every configured database is polled for recently edited pages and the changes are pushed to Airtable within seconds.
+
+'''
+Dependencies:
+- pyairtable
+- NotionToAirtableMigrator.py and the modules it uses. Run a full migration first, the daemon only pushes pages edited after it starts
+  (or after the watermark saved by its previous run).
+
+Usage:
+    python src/SyncDaemon.py [config_path]
+
+Polling:
+Each database is polled with a last_edited_time filter starting at its watermark, the newest last_edited_time already pushed.
+Notion rounds last_edited_time to the minute, so pages edited in the watermark minute come back on the next poll. They are recognised
+by their content fingerprint (RecordHashStore) and not written again.
+Saving the records leaves their attachment fields alone, the files of pushed pages are then moved by AttachmentTransfer.
+The poll interval of a database drops to MIN_INTERVAL as soon as it has changes and doubles on every idle poll, up to MAX_INTERVAL.
+
+Metrics:
+output/sync_daemon_metrics.json is rewritten after every poll, per database:
+    - lag_seconds: Push time minus last_edited_time of the newest page pushed by the last poll with changes.
+    - max_lag_seconds, pages_pushed, polls, interval_seconds, last_poll, last_push, staleness_seconds (time since the last successful poll).
+Watermarks are saved to output/sync_daemon_state.json so a restarted daemon picks up where it stopped.
+'''
+
+import datetime, json, logging, os, sys, time
+
+from pyairtable import Api
+from NotionApiHelper import NotionApiHelper
+from RecordHashStore import RecordHashStore
+from AirtableWriteScheduler import AirtableWriteScheduler
+from AirtableSnapshot import AirtableSnapshotCache
+from AttachmentTransfer import AttachmentTransfer
+import NotionToAirtableMigrator as migrator
+
+logger = logging.getLogger(__name__)
+
+
+class SyncDaemon:
+    MIN_INTERVAL = 5 # seconds
+    MAX_INTERVAL = 300 # seconds
+    INTERVAL_FACTOR = 2
+    STATE_PATH = 'output/sync_daemon_state.json'
+    METRICS_PATH = 'output/sync_daemon_metrics.json'
+
+    def __init__(self, config_path = 'conf/NotionAirtableMigrationConfig.json', notion_helper = None, api = None):
+        with open(config_path, 'r') as config_file:
+            self.config = json.load(config_file)
+        self.notion_helper = notion_helper if notion_helper else NotionApiHelper()
+        if api is None:
+            with open('conf/Airtable_Token.txt', 'r') as file:
+                api = Api(file.read().strip())
+        self.api = api
+
+        # The migrator stages read these module globals.
+        migrator.notion_helper = self.notion_helper
+        migrator.api = self.api
+
+        self.write_scheduler = AirtableWriteScheduler()
+        self.attachment_transfer = AttachmentTransfer(write_scheduler = self.write_scheduler)
+        self.snapshots = AirtableSnapshotCache(self.api) # Shared for the lifetime of the daemon, kept current by write-through.
+        self.databases = {} # Notion database ID: warm state, see warm_up.
+        self.relation_map = {}
+        self.id_indexes = {}
+        self.state = self._load_json(self.STATE_PATH)
+
+    @staticmethod
+    def _load_json(path):
+        try:
+            with open(path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _write_json(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(data, file, indent = 4)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _parse_time(timestamp):
+        return datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def warm_up(self):
+        """
+        Runs the schema check, class generation and relation discovery once per database and loads the ID indexes.
+        """
+        start_watermark = self._now().replace(second = 0, microsecond = 0).isoformat()
+        for database in self.config:
+            notion_db_id = migrator.normalize_notion_id(database['notion_db_id'])
+            airtable_table_name = database['airtable_table_name']
+            property_map = database['property_map']
+
+            air_table = migrator.check_table_exists(database['airtable_base_id'], airtable_table_name)
+            if air_table is None:
+                logger.error(f"Table {airtable_table_name} not found in Airtable, not syncing it.")
+                continue
+            sample = self.notion_helper.query(notion_db_id, page_num = self.notion_helper.PAGE_SIZE)
+            if not sample:
+                logger.error(f"Could not read Notion database {notion_db_id}, not syncing it.")
+                continue
+            type_map = {name: sample[0]['properties'][name]['type'] for name in property_map}
+            air_table, relation_list = migrator.repair_table_properties(air_table, property_map, type_map)
+            Airtable_Class = migrator.generate_airtable_class(property_map, database['airtable_base_id'], airtable_table_name, type_map)
+            if Airtable_Class is None:
+                logger.error(f"Class {airtable_table_name} could not be imported, not syncing it.")
+                continue
+
+            relations = {notion_db_id: {'airtable_table_name': airtable_table_name, 'airtable_base_id': database['airtable_base_id'], 'relation_mapping': {}}}
+            relations = migrator.find_relation_database(relations, relation_list, notion_db_id, sample)
+            self.relation_map[notion_db_id] = dict(relations[notion_db_id], table_id = air_table.id, property_map = property_map)
+
+            hash_store = RecordHashStore(airtable_table_name)
+            self.id_indexes[notion_db_id] = migrator.build_id_index(hash_store)
+            self.databases[notion_db_id] = {
+                'database': database,
+                'type_map': type_map,
+                'table': air_table,
+                'Airtable_Class': Airtable_Class,
+                'hash_store': hash_store,
+                'watermark': self.state.get(notion_db_id, {}).get('watermark', start_watermark),
+                'interval': self.MIN_INTERVAL,
+                'next_poll': 0,
+                'metrics': {'lag_seconds': None, 'max_lag_seconds': 0, 'pages_pushed': 0, 'polls': 0,
+                            'interval_seconds': self.MIN_INTERVAL, 'last_poll': None, 'last_push': None, 'staleness_seconds': 0}
+            }
+            print(f"Database {notion_db_id} ready to sync into {airtable_table_name}, watermark {self.databases[notion_db_id]['watermark']}.")
+
+    def poll(self, notion_db_id):
+        """
+        Pushes the pages of a database edited since its watermark to Airtable.
+
+        Returns:
+            int: The number of records written.
+        """
+        db_state = self.databases[notion_db_id]
+        database = db_state['database']
+        hash_store = db_state['hash_store']
+        pages = self.notion_helper.query(
+            notion_db_id, content_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": db_state['watermark']}}
+        )
+        if pages == {}: # The query failed, try again on the next poll.
+            return 0
+
+        link_sources = {}
+        records = [
+            migrator.build_airtable_record(row, db_state['Airtable_Class'], hash_store)
+            for row in migrator.convert_notion_records(pages, database['property_map'], db_state['type_map'], notion_db_id, hash_store, link_sources)
+        ]
+        metrics = db_state['metrics']
+        metrics['polls'] += 1
+        metrics['last_poll'] = self._now().isoformat()
+
+        if records:
+            self.write_scheduler.batch_save(db_state['Airtable_Class'], records).wait()
+            saved_page_ids = hash_store.commit_staged()
+            hash_store.save()
+            self.id_indexes[notion_db_id] = migrator.build_id_index(hash_store)
+            self.snapshots.record_saved(database['airtable_base_id'], database['airtable_table_name'],
+                                        {page_id: hash_store.record_id(page_id) for page_id in saved_page_ids})
+
+            # Only the links of the pushed pages are written.
+            saved = set(saved_page_ids)
+            changed_links = {prop: {page_id: ids for page_id, ids in sources.items() if page_id in saved} for prop, sources in link_sources.items()}
+            migrator.make_relation_links({notion_db_id: changed_links}, self.relation_map, self.id_indexes, self.write_scheduler, self.snapshots)
+            self.transfer_attachments(notion_db_id, pages, saved)
+
+            pushed_at = self._now()
+            newest_edit = max(self._parse_time(page['last_edited_time']) for page in pages)
+            metrics['lag_seconds'] = (pushed_at - newest_edit).total_seconds()
+            metrics['max_lag_seconds'] = max(metrics['max_lag_seconds'], metrics['lag_seconds'])
+            metrics['pages_pushed'] += len(saved_page_ids)
+            metrics['last_push'] = pushed_at.isoformat()
+            logger.info(f"Pushed {len(saved_page_ids)} pages of database {notion_db_id}, lag {metrics['lag_seconds']:.1f}s.")
+
+        if pages:
+            db_state['watermark'] = max(db_state['watermark'], max(page['last_edited_time'] for page in pages), key = self._parse_time)
+        return len(records)
+
+    def transfer_attachments(self, notion_db_id, pages, saved_page_ids):
+        """
+        Transfers the files of the files properties of the pushed pages. Saving the records leaves their attachment fields alone,
+        and a page is only pushed when its fingerprint, which includes its file names, changed.
+        """
+        db_state = self.databases[notion_db_id]
+        property_map = db_state['database']['property_map']
+        hash_store = db_state['hash_store']
+        for notion_property_name, prop_type in db_state['type_map'].items():
+            if prop_type != 'files' or notion_property_name not in property_map:
+                continue
+            record_files = {
+                hash_store.record_id(page['id']): AttachmentTransfer.collect_files(page['properties'][notion_property_name])
+                for page in pages if page['id'] in saved_page_ids and notion_property_name in page['properties']
+            }
+            if record_files:
+                self.attachment_transfer.transfer(db_state['table'], property_map[notion_property_name], record_files)
+
+    def write_metrics(self):
+        now = self._now()
+        metrics = {}
+        for notion_db_id, db_state in self.databases.items():
+            db_metrics = db_state['metrics']
+            db_metrics['interval_seconds'] = db_state['interval']
+            if db_metrics['last_poll']:
+                db_metrics['staleness_seconds'] = (now - self._parse_time(db_metrics['last_poll'])).total_seconds()
+            metrics[notion_db_id] = dict(db_metrics, airtable_table_name = db_state['database']['airtable_table_name'])
+        self._write_json(self.METRICS_PATH, metrics)
+        self._write_json(self.STATE_PATH, {notion_db_id: {'watermark': db_state['watermark']} for notion_db_id, db_state in self.databases.items()})
+
+    def run(self):
+        self.warm_up()
+        if not self.databases:
+            logger.error("No databases to sync.")
+            return
+        print(f"Syncing {len(self.databases)} databases. Press Ctrl+C to stop.")
+        try:
+            while True:
+                notion_db_id = min(self.databases, key = lambda db_id: self.databases[db_id]['next_poll'])
+                db_state = self.databases[notion_db_id]
+                wait = db_state['next_poll'] - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    changed = self.poll(notion_db_id)
+                except Exception as e:
+                    logger.error(f"Error syncing database {notion_db_id}: {e}")
+                    changed = 0
+                # Adaptive interval: poll busy databases often, back off on idle ones.
+                db_state['interval'] = self.MIN_INTERVAL if changed else min(self.MAX_INTERVAL, db_state['interval'] * self.INTERVAL_FACTOR)
+                db_state['next_poll'] = time.monotonic() + db_state['interval']
+                self.write_metrics()
+        except KeyboardInterrupt:
+            print("Stopping sync daemon...")
+        finally:
+            self.write_metrics()
+            self.write_scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    migrator.configure_logging()
+    SyncDaemon(sys.argv[1] if len(sys.argv) > 1 else 'conf/NotionAirtableMigrationConfig.json').run()
@@ -0,0 +1,102 @@
+# The modules live in src/ and import each other by name, like the scripts do when run from the repository root.
+import json, os, socketserver, sys, threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    '''
+    Minimal local SMTP server for the AutomatedEmails tests, no TLS and no authentication. Received messages are kept with the
+    dot-stuffing undone. fail_data answers the next DATA commands with 451, drop_after closes a connection after that many messages.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.messages = [] # {"mail_from", "rcpt_tos", "data"}
+        self.connections = 0
+        self.fail_data = 0
+        self.drop_after = None
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def config(self, tmp_path, **overrides):
+        config = dict({
+            'smtp_server': '127.0.0.1', 'smtp_port': self.port, 'smtp_starttls': False, 'from_name': 'Migration', 'from_email': 'from@example.com',
+            'to_email': ['to@example.com'], 'cc_email': [], 'bcc_email': ['bcc@example.com']
+        }, **overrides)
+        path = tmp_path / 'email_config.json'
+        path.write_text(json.dumps(config))
+        return str(path)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 stand-in ESMTP')
+        envelope = {'mail_from': None, 'rcpt_tos': []}
+        delivered = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-stand-in')
+                self.reply('250 8BITMIME')
+            elif verb in ('HELO', 'NOOP', 'RSET'):
+                envelope = {'mail_from': None, 'rcpt_tos': []} if verb == 'RSET' else envelope
+                self.reply('250 OK')
+            elif verb == 'MAIL':
+                envelope = {'mail_from': command.split(':', 1)[1].strip(' <>'), 'rcpt_tos': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['rcpt_tos'].append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                with server.lock:
+                    failing = server.fail_data > 0
+                    server.fail_data -= failing
+                if failing:
+                    self.reply('451 try again later')
+                    continue
+                self.reply('354 go ahead')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b'.\r\n', b''):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                with server.lock:
+                    server.messages.append(dict(envelope, data = b''.join(lines)))
+                self.reply('250 queued')
+                delivered += 1
+                if server.drop_after and delivered >= server.drop_after:
+                    return
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
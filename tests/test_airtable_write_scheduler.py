@@ -0,0 +1,69 @@
+import json
+
+import pytest
+import requests
+from pyairtable import Api
+from requests.exceptions import RetryError
+
+from AirtableWriteScheduler import AirtableWriteScheduler
+
+
+def _response(request, status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode()
+    response.headers['Content-Type'] = 'application/json'
+    response.request = request
+    response.url = request.url
+    return response
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(AirtableWriteScheduler, 'RETRY_DELAY', 0)
+    scheduler = AirtableWriteScheduler(requests_per_second = 1000)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_mocked_429_backs_off_and_retries(scheduler, monkeypatch):
+    sent = []
+    def send(adapter, request, **kwargs):
+        sent.append(request.method)
+        if len(sent) <= 2:
+            return _response(request, 429, {'errors': [{'error': 'RATE_LIMIT_REACHED'}]})
+        records = json.loads(request.body)['records']
+        return _response(request, 200, {'records': [dict(record, createdTime = '2026-01-01T00:00:00.000Z') for record in records]})
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', send)
+
+    table = Api('token').table('appBase', 'Tasks') # Default retry strategy, the scheduler writes without it.
+    result = scheduler.batch_update(table, [{'id': 'rec1', 'fields': {'Name': 'a'}}]).wait()
+
+    assert [record['id'] for record in result] == ['rec1']
+    assert sent == ['PATCH', 'PATCH', 'PATCH']
+    base = scheduler.bases['appBase']
+    assert base['throttled'] == 2
+    assert base['in_flight_limit'] == AirtableWriteScheduler.MAX_IN_FLIGHT // 4
+    assert scheduler.report()['appBase']['records'] == 1
+
+
+def test_scheduled_table_has_no_session_retries(scheduler):
+    table = scheduler._table(Api('token').table('appBase', 'Tasks'))
+    assert table.name == 'Tasks' and table.base.id == 'appBase'
+    assert table.api.session.get_adapter('https://api.airtable.com').max_retries.total == 0
+
+
+def test_exhausted_urllib3_429_retries_count_as_rate_limited():
+    error = RetryError("Max retries exceeded with url: /v0/appBase/Tasks (Caused by ResponseError('too many 429 error responses'))")
+    assert AirtableWriteScheduler._is_rate_limited(error)
+    assert not AirtableWriteScheduler._is_rate_limited(RetryError("Caused by ResponseError('too many 503 error responses')"))
+
+
+def test_other_errors_are_raised_without_retry(scheduler):
+    calls = []
+    def write(batch):
+        calls.append(batch)
+        raise ValueError('bad record')
+    with pytest.raises(ValueError):
+        scheduler.submit('appBase', write, [1, 2]).wait()
+    assert len(calls) == 1 and scheduler.bases['appBase']['throttled'] == 0
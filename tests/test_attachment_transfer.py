@@ -0,0 +1,73 @@
+import AttachmentTransfer as attachment_module
+from AttachmentTransfer import AttachmentTransfer
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+
+def test_download_all_counts_every_file_across_workers(tmp_path, monkeypatch):
+    # Two distinct contents behind many URLs: each content is stored once, every other download is counted as cached.
+    monkeypatch.setattr(attachment_module.requests, 'get', lambda url, **kwargs: _Response(url.rsplit('/', 1)[-1].encode()[:1]))
+    transfer = AttachmentTransfer(cache_dir = str(tmp_path), max_workers = 8)
+    urls = [f'https://example.com/{"a" if index % 2 else "b"}{index}' for index in range(200)]
+    downloads = transfer.download_all(urls)
+    assert len(downloads) == 200
+    assert transfer.stats['downloaded'] + transfer.stats['cached'] == 200
+    assert len({info['hash'] for info in downloads.values()}) == 2
+
+
+class _Job:
+    def wait(self):
+        return []
+
+
+class _Scheduler:
+    def __init__(self):
+        self.updates = []
+
+    def batch_update(self, table, updates):
+        self.updates.append((table, updates))
+        return _Job()
+
+
+class _Table:
+    def __init__(self):
+        self.uploads = []
+
+    def batch_update(self, updates):
+        raise AssertionError("batch updates must go through the write scheduler")
+
+    def upload_attachment(self, record_id, field_name, file_name, content):
+        self.uploads.append((record_id, file_name))
+        return {'fields': {'fld': [{'id': 'att' + record_id, 'url': 'https://airtable.example/' + file_name}]}}
+
+
+def test_batch_updates_go_through_the_write_scheduler(tmp_path):
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(b'a')
+    scheduler = _Scheduler()
+    transfer = AttachmentTransfer(cache_dir = str(tmp_path), write_scheduler = scheduler)
+    transfer.downloads = {'https://files.example/a.pdf': {'hash': 'aa', 'path': str(path), 'size': 1}}
+    table = _Table()
+
+    transfer.transfer(table, 'Files', {'rec1': [('a.pdf', 'https://files.example/a.pdf')], 'rec2': [('a.pdf', 'https://files.example/a.pdf')]})
+
+    assert table.uploads == [('rec1', 'a.pdf')]
+    assert scheduler.updates == [
+        (table, [{'id': 'rec1', 'fields': {'Files': []}}, {'id': 'rec2', 'fields': {'Files': []}}]),
+        (table, [{'id': 'rec2', 'fields': {'Files': [{'url': 'https://airtable.example/a.pdf', 'filename': 'a.pdf'}]}}])
+    ]
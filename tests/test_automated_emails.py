@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+
+from AutomatedEmails import AutomatedEmails
+
+
+def test_dispatch_results_are_capped_and_drained(monkeypatch):
+    monkeypatch.setattr(AutomatedEmails, 'MAX_DISPATCH_RESULTS', 5)
+    monkeypatch.setattr(AutomatedEmails, '_send_with_retry', lambda self, message: {'subject': message['subject'], 'sent': True})
+    mailer = AutomatedEmails()
+    mailer.start_dispatcher(workers = 2)
+    for index in range(12):
+        assert mailer.send_email_async('email_config.json', subject = f'email {index}')
+    assert mailer.flush(timeout = 5)
+
+    results = mailer.drain_results()
+    assert len(results) == 5 and len(mailer.dispatch_results) == 0
+    mailer.stop_dispatcher()
+
+
+def test_stop_does_not_block_on_a_full_queue(monkeypatch):
+    release = threading.Event()
+    def send(self, message):
+        release.wait() # The worker is stuck on its first email, the queue fills up behind it.
+        return {'subject': message['subject'], 'sent': True}
+    monkeypatch.setattr(AutomatedEmails, '_send_with_retry', send)
+    monkeypatch.setattr(AutomatedEmails, 'STOP_TIMEOUT', 0.05)
+    mailer = AutomatedEmails()
+    mailer.start_dispatcher(workers = 1, max_queue = 3)
+    for index in range(4):
+        assert mailer.send_email_async('email_config.json', subject = f'email {index}', enqueue_timeout = 1)
+
+    stopper = threading.Thread(target = mailer.stop_dispatcher, kwargs = {'flush': False, 'timeout': 5})
+    stopper.start()
+    time.sleep(0.2)
+    release.set()
+    stopper.join(5)
+    assert not stopper.is_alive() and mailer._workers == []
+    assert [result['subject'] for result in mailer.drain_results()] == ['email 0']
+
+
+def test_send_many_reuses_one_connection(smtp_server, tmp_path):
+    config_path = smtp_server.config(tmp_path)
+    with AutomatedEmails() as mailer:
+        first = mailer.send_many(config_path, [{'subject': 'one'}, {'subject': 'two'}])
+        second = mailer.send_many(config_path, [{'subject': 'three', 'to_email': ['other@example.com'], 'bcc_email': []}])
+    assert [result['sent'] for result in first + second] == [True, True, True]
+    assert smtp_server.connections == 1
+    assert smtp_server.messages[2]['rcpt_tos'] == ['other@example.com']
+
+
+def test_send_many_reports_each_message(smtp_server, tmp_path):
+    results = AutomatedEmails().send_many(smtp_server.config(tmp_path), [
+        {'subject': 'fine'}, {'subject': 'broken', 'file_attachment_paths': [str(tmp_path / 'missing.csv')]}, {'subject': 'also fine'}
+    ])
+    assert [(result['index'], result['subject'], result['sent']) for result in results] == [(0, 'fine', True), (1, 'broken', False), (2, 'also fine', True)]
+    assert results[1]['error'] and len(smtp_server.messages) == 2
+
+
+def test_send_many_reconnects_after_the_server_drops(smtp_server, tmp_path):
+    smtp_server.drop_after = 1
+    results = AutomatedEmails().send_many(smtp_server.config(tmp_path), [{'subject': f'email {index}'} for index in range(3)])
+    assert all(result['sent'] for result in results)
+    assert len(smtp_server.messages) == 3 and smtp_server.connections == 3
+
+
+def test_dispatcher_survives_a_broken_config(smtp_server, tmp_path):
+    broken_path = tmp_path / 'broken.json'
+    broken_path.write_text('{"smtp_server": ')
+    good_path = smtp_server.config(tmp_path)
+    config = json.loads(open(good_path).read())
+    del config['from_name']
+    missing_sender_path = tmp_path / 'missing_sender.json'
+    missing_sender_path.write_text(json.dumps(config))
+
+    mailer = AutomatedEmails()
+    mailer.start_dispatcher(workers = 1)
+    assert mailer.send_email_async(str(broken_path), subject = 'bad json')
+    assert mailer.send_email_async(str(missing_sender_path), subject = 'no sender')
+    assert mailer.send_email_async(good_path, subject = 'good')
+    assert mailer.flush(timeout = 5)
+    mailer.stop_dispatcher(timeout = 5)
+
+    results = {result['subject']: result for result in mailer.drain_results()}
+    assert not results['bad json']['sent'] and results['bad json']['error']
+    assert not results['no sender']['sent'] and results['no sender']['error']
+    assert results['good']['sent'] and len(smtp_server.messages) == 1
+
+
+def test_dispatcher_retries_with_backoff(smtp_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(AutomatedEmails, 'RETRY_DELAY', 0)
+    smtp_server.fail_data = 2
+    mailer = AutomatedEmails()
+    mailer.start_dispatcher(workers = 1)
+    assert mailer.send_email_async(smtp_server.config(tmp_path), subject = 'retried')
+    assert mailer.flush(timeout = 5)
+    mailer.stop_dispatcher(timeout = 5)
+
+    [result] = mailer.drain_results()
+    assert result['sent'] and result['attempts'] == 3
+    assert len(smtp_server.messages) == 1 and smtp_server.connections == 3
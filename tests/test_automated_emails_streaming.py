@@ -0,0 +1,102 @@
+import base64, email, gzip, io, os, zipfile
+from email import policy
+
+from AutomatedEmails import AutomatedEmails, _Base64Writer, _SMTPDataWriter
+
+BODY = "Report attached.\n.a line starting with a period\n..and two\nlast line"
+
+
+def _source_file(tmp_path, name = 'report.bin', size = 57 * 1024 * 2 + 13):
+    # Not a multiple of the copy chunk or of the 57 byte base64 line, with every byte value and line ending.
+    path = tmp_path / name
+    path.write_bytes((bytes(range(256)) + b'\r\n.\n.\r') * (size // 261) + b'.tail\r\n'[:size % 261])
+    return str(path), path.read_bytes()
+
+
+def _received(smtp_server):
+    assert len(smtp_server.messages) == 1
+    message = smtp_server.messages[0]
+    return message, email.message_from_bytes(message['data'], policy = policy.default)
+
+
+def _attachments(parsed):
+    return {part.get_filename(): part.get_payload(decode = True) for part in parsed.iter_attachments()}
+
+
+def test_streamed_attachment_arrives_byte_for_byte(smtp_server, tmp_path):
+    path, content = _source_file(tmp_path)
+    assert AutomatedEmails().send_email_streaming(smtp_server.config(tmp_path), "Weekly report", BODY, [path])
+
+    envelope, parsed = _received(smtp_server)
+    assert envelope['mail_from'] == 'from@example.com' and envelope['rcpt_tos'] == ['to@example.com', 'bcc@example.com']
+    assert parsed['Subject'] == 'Weekly report' and 'Bcc' not in parsed
+    assert next(parsed.iter_parts()).get_content() == BODY
+    assert _attachments(parsed) == {'report.bin': content}
+
+
+def test_compressed_attachments(smtp_server, tmp_path):
+    gzip_path, gzip_content = _source_file(tmp_path, 'a.csv', 100_003)
+    zip_path, zip_content = _source_file(tmp_path, 'b.csv', 58)
+    mailer = AutomatedEmails()
+    assert mailer.send_email_streaming(smtp_server.config(tmp_path), "gzip", BODY, [gzip_path], compression = 'gzip')
+    assert mailer.send_email_streaming(smtp_server.config(tmp_path), "zip", BODY, [zip_path], compression = 'zip')
+
+    gzip_message, zip_message = [email.message_from_bytes(message['data'], policy = policy.default) for message in smtp_server.messages]
+    assert gzip.decompress(_attachments(gzip_message)['a.csv.gz']) == gzip_content
+    with zipfile.ZipFile(io.BytesIO(_attachments(zip_message)['b.csv.zip'])) as archive:
+        assert archive.read('b.csv') == zip_content
+
+
+def test_oversize_policy(smtp_server, tmp_path):
+    small_path, small_content = _source_file(tmp_path, 'small.bin', 100)
+    large_path, large_content = _source_file(tmp_path, 'large.bin', 5000)
+    config_path = smtp_server.config(tmp_path)
+    mailer = AutomatedEmails()
+    assert mailer.send_email_streaming(config_path, "skip", BODY, [small_path, large_path], max_attachment_size = 1000, oversize_policy = 'skip')
+    assert mailer.send_email_streaming(config_path, "compress", BODY, [small_path, large_path], max_attachment_size = 1000)
+
+    skipped, compressed = [email.message_from_bytes(message['data'], policy = policy.default) for message in smtp_server.messages]
+    assert _attachments(skipped) == {'small.bin': small_content}
+    assert next(skipped.iter_parts()).get_content().endswith("Attachments left out for size: large.bin")
+    attachments = _attachments(compressed)
+    assert sorted(attachments) == ['large.bin.gz', 'small.bin'] and attachments['small.bin'] == small_content
+    assert gzip.decompress(attachments['large.bin.gz']) == large_content
+
+
+def test_missing_attachment_sends_nothing(smtp_server, tmp_path):
+    assert not AutomatedEmails().send_email_streaming(smtp_server.config(tmp_path), "x", BODY, [str(tmp_path / 'missing.bin')])
+    assert smtp_server.messages == [] and smtp_server.connections == 0
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = b''
+
+    def sendall(self, data):
+        self.sent += data
+
+
+class _Connection:
+    def __init__(self):
+        self.sock = _Socket()
+
+
+def test_data_writer_dot_stuffs_and_normalizes_line_endings_across_writes():
+    connection = _Connection()
+    writer = _SMTPDataWriter(connection)
+    for chunk in ['.first\n', 'second\r\n.third', '\n', '.fourth', ' still fourth\n..fifth\r\n']:
+        writer.write(chunk)
+    assert connection.sock.sent == b'..first\r\nsecond\r\n..third\r\n..fourth still fourth\r\n...fifth\r\n'
+    assert writer.at_line_start
+
+
+def test_base64_writer_splits_lines_across_odd_writes():
+    connection = _Connection()
+    encoder = _Base64Writer(_SMTPDataWriter(connection))
+    data = os.urandom(1000)
+    for start in range(0, len(data), 37):
+        encoder.write(data[start:start + 37])
+    encoder.close()
+    lines = connection.sock.sent.split(b'\r\n')[:-1]
+    assert all(len(line) == 76 for line in lines[:-1]) and len(lines[-1]) <= 76
+    assert encoder.written == 1000 and base64.b64decode(b''.join(lines)) == data
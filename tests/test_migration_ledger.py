@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+from pyairtable import Api
+
+import NotionToAirtableMigrator as migrator
+from AirtableWriteScheduler import AirtableWriteScheduler
+from MigrationLedger import LedgerWorker, MigrationLedger
+
+CONFIG = [
+    {'notion_db_id': 'aaaa', 'airtable_base_id': 'appBase', 'airtable_table_name': 'Tasks', 'property_map': {}},
+    {'notion_db_id': 'bbbb', 'airtable_base_id': 'appBase', 'airtable_table_name': 'Projects', 'property_map': {}}
+]
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return MigrationLedger(str(tmp_path / 'ledger.sqlite'))
+
+
+def _claim_all(ledger, run_id, worker):
+    jobs = []
+    while (job := ledger.claim(run_id, worker)) is not None:
+        jobs.append(job)
+    return jobs
+
+
+def test_jobs_are_claimed_once_and_in_dependency_order(ledger):
+    run_id = ledger.create_run(CONFIG)
+    fetch_jobs = _claim_all(ledger, run_id, 'w1')
+    assert [(job['stage'], job['notion_db_id']) for job in fetch_jobs] == [('fetch', 'aaaa'), ('fetch', 'bbbb')]
+    assert ledger.claim(run_id, 'w2') is None # The link job waits for the fetch jobs.
+
+    assert ledger.complete(fetch_jobs[0]['job_id'], 'w1', {'shards': []}, [('finalize', 'aaaa', None, {})])
+    finalize = ledger.claim(run_id, 'w2')
+    assert (finalize['stage'], finalize['notion_db_id']) == ('finalize', 'aaaa')
+    assert ledger.leased_jobs() == 2
+
+
+def test_concurrent_claims_never_share_a_job(ledger):
+    run_id = ledger.create_run([dict(CONFIG[0], notion_db_id = f'{index:04x}') for index in range(20)])
+    claimed = []
+    def claim(worker):
+        claimed.extend(job['job_id'] for job in _claim_all(ledger, run_id, worker))
+    threads = [threading.Thread(target = claim, args = (f'w{index}',)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == 20 and len(set(claimed)) == 20
+
+
+def test_expired_lease_is_reclaimed_and_old_worker_is_refused(tmp_path):
+    ledger = MigrationLedger(str(tmp_path / 'ledger.sqlite'), lease_seconds = 0.05)
+    run_id = ledger.create_run(CONFIG[:1])
+    job = ledger.claim(run_id, 'crashed')
+    assert ledger.checkpoint(job['job_id'], 'crashed', {'saved': {'page': ['hash', 'rec1']}})
+    time.sleep(0.1)
+
+    reclaimed = ledger.claim(run_id, 'w2')
+    assert reclaimed['job_id'] == job['job_id'] and reclaimed['attempts'] == 2
+    assert reclaimed['result'] == {'saved': {'page': ['hash', 'rec1']}} # The checkpoint survives the takeover.
+    assert not ledger.heartbeat(job['job_id'], 'crashed')
+    assert not ledger.complete(job['job_id'], 'crashed', {})
+    assert ledger.complete(reclaimed['job_id'], 'w2', {})
+
+
+def test_failing_job_is_retried_then_blocks_the_run(ledger):
+    run_id = ledger.create_run(CONFIG[:1])
+    for attempt in range(MigrationLedger.MAX_ATTEMPTS):
+        job = ledger.claim(run_id, 'w1')
+        assert job['stage'] == 'fetch' and job['attempts'] == attempt + 1
+        ledger.fail(job['job_id'], 'w1', RuntimeError('boom'))
+    assert ledger.claim(run_id, 'w1') is None
+    assert ledger.is_blocked(run_id) and not ledger.is_finished(run_id)
+    assert ledger.status(run_id) == {'fetch': {'failed': 1}, 'link': {'pending': 1}}
+
+
+def test_expired_leases_count_against_the_attempt_limit(tmp_path):
+    ledger = MigrationLedger(str(tmp_path / 'ledger.sqlite'), lease_seconds = 0.05)
+    run_id = ledger.create_run(CONFIG[:1])
+    for attempt in range(MigrationLedger.MAX_ATTEMPTS):
+        job = ledger.claim(run_id, f'crashed{attempt}')
+        assert job['stage'] == 'fetch' and job['attempts'] == attempt + 1
+        time.sleep(0.1) # The worker dies without failing the job.
+    assert ledger.claim(run_id, 'w1') is None
+    assert ledger.is_blocked(run_id) and ledger.status(run_id) == {'fetch': {'failed': 1}, 'link': {'pending': 1}}
+
+
+def test_workers_share_the_rate_limit_of_the_base(ledger):
+    run_id = ledger.create_run(CONFIG)
+    worker = LedgerWorker.__new__(LedgerWorker)
+    worker.ledger, worker.worker_id = ledger, 'w1'
+    worker.write_scheduler = AirtableWriteScheduler()
+    try:
+        _claim_all(ledger, run_id, 'w1')
+        worker._share_rate_limit()
+        assert worker.write_scheduler.requests_per_second == AirtableWriteScheduler.REQUESTS_PER_SECOND / 2
+    finally:
+        worker.write_scheduler.shutdown()
+
+
+def test_page_body_cache_merges_under_the_ledger_lock_are_not_lost(ledger, tmp_path):
+    cache_path = str(tmp_path / 'page_body_cache.json')
+    def merge(page_id):
+        with ledger.lock():
+            page_body_cache = migrator.load_page_body_cache(cache_path)
+            time.sleep(0.01) # Without the lock another merge here would drop this one's entry.
+            migrator.save_page_body_cache(dict(page_body_cache, **{page_id: 'edited'}), cache_path)
+    threads = [threading.Thread(target = merge, args = (f'page{index}',)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(migrator.load_page_body_cache(cache_path)) == 8
+
+
+def test_finalize_keeps_the_record_hashes_next_to_the_ledger(tmp_path, monkeypatch):
+    ledger = MigrationLedger(str(tmp_path / 'shared' / 'ledger.sqlite'))
+    monkeypatch.chdir(tmp_path) # The local output directory of this worker is tmp_path/output.
+    monkeypatch.setattr(migrator, 'notion_helper', None)
+    monkeypatch.setattr(migrator, 'api', None)
+    run_id = ledger.create_run(CONFIG[:1])
+    worker = LedgerWorker(ledger, run_id, 'w1', notion_helper = object(), api = Api('key'))
+
+    fetch = ledger.claim(run_id, 'w1')
+    ledger.complete(fetch['job_id'], 'w1', {'shards': [], 'type_map': {}}, [('convert', 'aaaa', 0, {}), ('finalize', 'aaaa', None, {})])
+    convert = ledger.claim(run_id, 'w1')
+    ledger.complete(convert['job_id'], 'w1', {'saved': {'page1': ['hash1', 'rec1']}, 'link_sources': {}})
+    finalize = ledger.claim(run_id, 'w1')
+    assert finalize['stage'] == 'finalize'
+    worker._finalize(finalize)
+
+    with open(tmp_path / 'shared' / 'record_hashes' / 'Tasks.json') as file:
+        assert 'rec1' in json.dumps(json.load(file))
+    assert not os.path.exists(tmp_path / 'output' / 'record_hashes')
@@ -0,0 +1,53 @@
+from MigrationPlanner import MigrationPlanner
+
+
+class _NotionHelper:
+    PAGE_SIZE = 100
+
+    def __init__(self, databases):
+        self.databases = databases
+        self.block_tree_requests = []
+
+    def query(self, notion_db_id, page_num = None, filter_properties = None):
+        return self.databases[notion_db_id]
+
+    def get_page(self, page_id):
+        return {'parent': {'database_id': 'projects'}}
+
+    def get_block_trees(self, page_ids):
+        self.block_tree_requests.append(page_ids)
+        # One top level block with children on every page: two requests per page.
+        return {page_id: [{'type': 'toggle', 'has_children': True, 'children': [{'type': 'paragraph'}]}] for page_id in page_ids}
+
+
+def _task(index, linked, files):
+    return {'id': f'task{index}', 'properties': {
+        'Name': {'type': 'title'},
+        'Project': {'type': 'relation', 'relation': [{'id': 'project1'}] if linked else []},
+        'Files': {'type': 'files', 'files': [{'name': f'{index}-{n}.pdf'} for n in range(files)]}
+    }}
+
+
+def test_plan_estimates_attachments_bodies_and_link_pass_from_the_sample():
+    tasks = [_task(index, linked = index % 2 == 0, files = 2 if index < 10 else 0) for index in range(40)]
+    projects = [{'id': 'project1', 'properties': {'Name': {'type': 'title'}}}]
+    helper = _NotionHelper({'tasks': tasks, 'projects': projects})
+    config = [
+        {'notion_db_id': 'tasks', 'airtable_base_id': 'app', 'airtable_table_name': 'Tasks', 'page_body_field': 'Body',
+         'property_map': {'Name': 'Name', 'Project': 'Project', 'Files': 'Files'}},
+        {'notion_db_id': 'projects', 'airtable_base_id': 'app', 'airtable_table_name': 'Projects', 'property_map': {'Name': 'Name'}}
+    ]
+
+    plan = MigrationPlanner(notion_helper = helper).plan(config)
+    tasks_stages = plan['databases'][0]['stages']
+
+    assert tasks_stages['attachments']['downloads'] == 20
+    assert tasks_stages['attachments']['airtable_requests'] == 1 + 20 # 10 records with files in one batch, one upload per file.
+    assert helper.block_tree_requests == [['task0', 'task1', 'task2']]
+    assert tasks_stages['bodies']['notion_requests'] == 80
+    assert tasks_stages['bodies']['airtable_requests'] == 1 + 4
+    assert tasks_stages['link_pass']['batches'] == 2 # 20 linked records, no related table download.
+    assert tasks_stages['link_pass']['airtable_requests'] == 2 + 2
+
+    projects_stages = plan['databases'][1]['stages']
+    assert projects_stages['bodies']['notion_requests'] == 0 and projects_stages['link_pass']['airtable_requests'] == 0
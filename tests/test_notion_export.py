@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq
+
+from NotionApiHelper import NotionApiHelper
+from NotionExport import NotionExport
+
+UTC = datetime.timezone.utc
+
+
+class _Helper(NotionApiHelper):
+    def __init__(self, pages):
+        self.pages = pages
+
+    def query_iter(self, databaseID, filter_properties = None, content_filter = None):
+        yield from self.pages
+
+
+def _page(page_id, due, at, tags, score):
+    return {'id': page_id, 'created_time': '2024-01-01T09:00:00.000Z', 'last_edited_time': '2024-01-02T09:00:00.000Z', 'properties': {
+        'Name': {'id': 'title', 'type': 'title', 'title': [{'plain_text': f'Page {page_id}'}]},
+        'Due': {'id': 'due', 'type': 'date', 'date': {'start': due, 'end': None} if due else None},
+        'At': {'id': 'at', 'type': 'date', 'date': {'start': at, 'end': None} if at else None},
+        'Tags': {'id': 'tags', 'type': 'multi_select', 'multi_select': [{'name': tag} for tag in tags]},
+        'Related': {'id': 'rel', 'type': 'relation', 'relation': [{'id': 'r1'}, {'id': 'r2'}][:len(tags)], 'has_more': False},
+        'Score': {'id': 'score', 'type': 'number', 'number': score},
+        'id': {'id': 'pid', 'type': 'rich_text', 'rich_text': [{'plain_text': f'custom {page_id}'}]},
+        'created_time': {'id': 'ct', 'type': 'created_time', 'created_time': '2023-12-31T23:00:00.000Z'}
+    }}
+
+
+PAGES = [
+    _page('p1', '2024-05-01', '2024-05-01T10:30:00.000+02:00', ['a', 'b'], 3),
+    _page('p2', None, None, [], None)
+]
+
+
+def _read(path, file_format):
+    if file_format == 'parquet':
+        return pq.read_table(path)
+    with pa.ipc.open_file(path) as reader:
+        return reader.read_all()
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_export_writes_typed_columns(tmp_path, file_format):
+    path = str(tmp_path / f'tasks.{file_format}')
+    exporter = NotionExport(notion_helper = _Helper(PAGES), row_group_size = 1) # One row group or record batch per page.
+    assert exporter.export('db', path, file_format) == 2
+
+    table = _read(path, file_format)
+    assert table.column_names == ['id', 'created_time', 'last_edited_time', 'Name', 'Due', 'At', 'Tags', 'Related', 'Score',
+                                  'id_property', 'created_time_property']
+    assert table.schema.field('Due').type == pa.timestamp('us', tz = 'UTC') and table.schema.field('Score').type == pa.float64()
+    assert table.schema.field('Tags').type == pa.list_(pa.string())
+    if file_format == 'parquet':
+        assert pq.ParquetFile(path).num_row_groups == 2
+
+    first, second = table.to_pylist()
+    assert first['id'] == 'p1' and first['id_property'] == 'custom p1'
+    assert first['created_time'] == datetime.datetime(2024, 1, 1, 9, tzinfo = UTC)
+    assert first['created_time_property'] == datetime.datetime(2023, 12, 31, 23, tzinfo = UTC)
+    assert first['Due'] == datetime.datetime(2024, 5, 1, tzinfo = UTC) # Date only, midnight UTC.
+    assert first['At'] == datetime.datetime(2024, 5, 1, 8, 30, tzinfo = UTC)
+    assert first['Tags'] == ['a', 'b'] and first['Related'] == ['r1', 'r2'] and first['Score'] == 3.0
+    assert second['Due'] is None and second['At'] is None
+    assert second['Tags'] == [] and second['Related'] == [] and second['Score'] is None
+
+
+def test_empty_database_writes_nothing(tmp_path):
+    path = tmp_path / 'empty.parquet'
+    assert NotionExport(notion_helper = _Helper([])).export('db', str(path)) == 0
+    assert not path.exists()
+
+
+def test_unknown_format_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        NotionExport(notion_helper = _Helper(PAGES)).export('db', str(tmp_path / 'tasks.csv'), 'csv')
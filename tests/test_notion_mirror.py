@@ -0,0 +1,88 @@
+import pytest
+
+from NotionMirror import NotionMirror, UnsupportedFilter
+
+
+class _NotionHelper:
+    def __init__(self, pages, relations = None):
+        self.pages = pages
+        self.relations = relations or {}
+        self.queries = []
+
+    def query(self, database_id, filter_properties = None, content_filter = None):
+        self.queries.append(content_filter)
+        return self.pages
+
+    def get_relation_ids(self, page_id, prop_id):
+        return self.relations[page_id]
+
+    def return_property_value(self, prop):
+        return ''.join(item['plain_text'] for item in prop[prop['type']])
+
+
+def _page(page_id, name, due = None, score = None, tags = (), related = (), has_more = False):
+    return {
+        'id': page_id, 'created_time': '2024-01-01T00:00:00.000Z', 'last_edited_time': '2024-06-01T12:00:00.000Z',
+        'properties': {
+            'Name': {'id': 'title', 'type': 'title', 'title': [{'plain_text': name}]},
+            'Due': {'id': 'due', 'type': 'date', 'date': {'start': due, 'end': None} if due else None},
+            'Score': {'id': 'score', 'type': 'number', 'number': score},
+            'Tags': {'id': 'tags', 'type': 'multi_select', 'multi_select': [{'name': tag} for tag in tags]},
+            'Related': {'id': 'rel', 'type': 'relation', 'relation': [{'id': page} for page in related], 'has_more': has_more}
+        }
+    }
+
+
+PAGES = [
+    _page('a', 'Alpha_1', due = '2024-05-01T23:30:00.000-05:00', score = 3, tags = ('red',)), # 2024-05-02 04:30 UTC
+    _page('b', 'Beta', due = '2024-05-02', score = 10, tags = ('red', 'blue')),
+    _page('c', 'Gamma 100%', due = '2024-05-02T01:00:00.000+02:00', related = [f'r{n}' for n in range(25)], has_more = True), # 05-01 23:00 UTC
+    _page('d', 'Delta')
+]
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    helper = _NotionHelper(PAGES, relations = {'c': [f'r{n}' for n in range(30)]})
+    mirror = NotionMirror(notion_helper = helper, db_path = str(tmp_path / 'mirror.sqlite'))
+    mirror.sync('db')
+    yield mirror
+    mirror.close()
+
+
+def _ids(mirror, content_filter):
+    return sorted(page['id'] for page in mirror.query('db', content_filter = content_filter, sync = False))
+
+
+def test_text_number_and_list_filters(mirror):
+    assert _ids(mirror, {'property': 'Name', 'title': {'contains': '_'}}) == ['a'] # LIKE wildcards are escaped.
+    assert _ids(mirror, {'property': 'Name', 'title': {'ends_with': '100%'}}) == ['c']
+    assert _ids(mirror, {'property': 'Score', 'number': {'greater_than_or_equal_to': 3}}) == ['a', 'b']
+    assert _ids(mirror, {'property': 'Score', 'number': {'is_empty': True}}) == ['c', 'd']
+    assert _ids(mirror, {'property': 'Tags', 'multi_select': {'does_not_contain': 'blue'}}) == ['a', 'c', 'd']
+    assert _ids(mirror, {'or': [
+        {'property': 'Tags', 'multi_select': {'contains': 'blue'}},
+        {'and': [{'property': 'Score', 'number': {'less_than': 5}}, {'property': 'Name', 'title': {'starts_with': 'Al'}}]}
+    ]}) == ['a', 'b']
+
+
+def test_dates_with_mixed_offsets_compare_in_utc(mirror):
+    assert _ids(mirror, {'property': 'Due', 'date': {'after': '2024-05-02T00:00:00Z'}}) == ['a']
+    assert _ids(mirror, {'property': 'Due', 'date': {'on_or_after': '2024-05-02T00:00:00.000+00:00'}}) == ['a', 'b']
+    assert _ids(mirror, {'property': 'Due', 'date': {'before': '2024-05-02T00:00:00.000+00:00'}}) == ['c']
+    assert _ids(mirror, {'property': 'Due', 'date': {'equals': '2024-05-02'}}) == ['a', 'b']
+    assert _ids(mirror, {'property': 'Due', 'date': {'on_or_before': '2024-05-01'}}) == ['c']
+    assert _ids(mirror, {'property': 'Due', 'date': {'is_empty': True}}) == ['d']
+    assert _ids(mirror, {'timestamp': 'last_edited_time', 'last_edited_time': {'on_or_after': '2024-06-01T13:00:00+02:00'}}) == ['a', 'b', 'c', 'd']
+
+
+def test_relations_beyond_the_page_object_are_mirrored(mirror):
+    assert _ids(mirror, {'property': 'Related', 'relation': {'contains': 'r29'}}) == ['c']
+
+
+def test_unsupported_filters_go_to_notion(mirror):
+    content_filter = {'property': 'Score', 'number': {'contains': 3}}
+    with pytest.raises(UnsupportedFilter):
+        mirror._compile_filter(content_filter, [])
+    assert len(mirror.query('db', content_filter = content_filter, sync = False)) == 4
+    assert mirror.notion_helper.queries[-1] == content_filter
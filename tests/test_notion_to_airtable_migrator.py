@@ -0,0 +1,76 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+import NotionToAirtableMigrator as migrator
+from AirtableWriteScheduler import WriteJob
+
+
+class _HashStore:
+    def record_id(self, page_id):
+        return 'rec' + page_id
+
+
+class _Helper:
+    def get_block_trees(self, page_ids):
+        return {page_id: [page_id] for page_id in page_ids}
+
+    def render_blocks_text(self, blocks):
+        return 'body of ' + blocks[0]
+
+
+class _Table:
+    name = 'Pages'
+
+    def schema(self):
+        return SimpleNamespace(fields = [SimpleNamespace(name = 'Body')])
+
+    def batch_update(self, updates):
+        raise AssertionError("page body updates must go through the write scheduler")
+
+
+class _Scheduler:
+    BATCH_SIZE = 10
+
+    def __init__(self, failing_batches = ()):
+        self.failing_batches = failing_batches
+        self.batches = []
+
+    def batch_update(self, table, updates):
+        futures = []
+        for index in range(0, len(updates), self.BATCH_SIZE):
+            self.batches.append(updates[index:index + self.BATCH_SIZE])
+            future = Future()
+            if len(futures) in self.failing_batches:
+                future.set_exception(RuntimeError('422 invalid'))
+            else:
+                future.set_result(updates[index:index + self.BATCH_SIZE])
+            futures.append(future)
+        return WriteJob(futures)
+
+
+def _pages(count):
+    return [{'id': f'p{index}', 'last_edited_time': f't{index}'} for index in range(count)]
+
+
+def test_page_bodies_are_written_through_the_scheduler(monkeypatch):
+    monkeypatch.setattr(migrator, 'notion_helper', _Helper())
+    scheduler = _Scheduler()
+    page_body_cache = {'p0': 't0'}
+
+    assert migrator.migrate_page_bodies(_Table(), 'Body', _pages(13), _HashStore(), page_body_cache, scheduler) == 12
+
+    assert [len(batch) for batch in scheduler.batches] == [10, 2]
+    assert scheduler.batches[0][0] == {'id': 'recp1', 'fields': {'Body': 'body of p1'}}
+    assert page_body_cache == {f'p{index}': f't{index}' for index in range(13)}
+
+
+def test_only_written_page_bodies_are_cached(monkeypatch):
+    monkeypatch.setattr(migrator, 'notion_helper', _Helper())
+    page_body_cache = {}
+
+    with pytest.raises(RuntimeError):
+        migrator.migrate_page_bodies(_Table(), 'Body', _pages(25), _HashStore(), page_body_cache, _Scheduler(failing_batches = [1]))
+
+    assert sorted(page_body_cache) == sorted([f'p{index}' for index in range(10)] + [f'p{index}' for index in range(20, 25)])
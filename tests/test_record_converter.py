@@ -0,0 +1,47 @@
+import datetime
+
+from RecordConverter import RecordConverter, parse_notion_date
+
+UTC = datetime.timezone.utc
+
+
+def _page(page_id, **properties):
+    return {'id': page_id, 'properties': properties}
+
+def _date(start):
+    return {'type': 'date', 'date': {'start': start, 'end': None, 'time_zone': None}}
+
+
+def test_parse_notion_date_keeps_time_in_utc():
+    assert parse_notion_date('2024-11-01') == datetime.datetime(2024, 11, 1, tzinfo = UTC)
+    assert parse_notion_date('2024-11-01T10:30:00.000-05:00') == datetime.datetime(2024, 11, 1, 15, 30, tzinfo = UTC)
+    assert parse_notion_date('2024-11-01T10:30:00.000Z') == datetime.datetime(2024, 11, 1, 10, 30, tzinfo = UTC)
+    assert parse_notion_date(None) is None
+
+
+def test_convert_batch_converts_every_column():
+    converter = RecordConverter(
+        {'Name': 'Name', 'Due': 'Due Date', 'Amount': 'Amount', 'Tags': 'Tags'},
+        {'Name': 'title', 'Due': 'date', 'Amount': 'number', 'Tags': 'multi_select'},
+        None
+    )
+    pages = [
+        _page('a', Name = {'type': 'title', 'title': [{'plain_text': 'Fab'}, {'plain_text': 'ric'}]}, Due = _date('2024-11-01T08:00:00.000Z'),
+              Amount = {'type': 'number', 'number': '12.5'}, Tags = {'type': 'multi_select', 'multi_select': [{'name': 'x'}, {'name': 'y'}]}),
+        _page('b', Name = {'type': 'title', 'title': []}, Due = {'type': 'date', 'date': None},
+              Amount = {'type': 'number', 'number': None}, Tags = {'type': 'multi_select', 'multi_select': []})
+    ]
+    (first, first_values, _), (second, second_values, _) = converter.convert_batch(pages)
+    assert first['id'] == 'a'
+    assert first_values == {'name': 'Fabric', 'due_date': datetime.datetime(2024, 11, 1, 8, tzinfo = UTC), 'amount': 12.5, 'tags': ['x', 'y']}
+    assert second_values == {'name': None, 'due_date': None, 'amount': None, 'tags': None}
+
+
+def test_files_columns_are_fingerprinted_but_not_written():
+    converter = RecordConverter({'Name': 'Name', 'Files': 'Files'}, {'Name': 'title', 'Files': 'files'}, None)
+    page = _page('a', Name = {'type': 'title', 'title': [{'plain_text': 'Fabric'}]},
+                 Files = {'type': 'files', 'files': [{'name': 'spec.pdf', 'type': 'external', 'external': {'url': 'https://example.com/spec.pdf'}}]})
+    attribute_values, record_fields = converter.convert_page(page)
+    # A None on the model would be sent by batch_save and clear the attachments already uploaded.
+    assert attribute_values == {'name': 'Fabric'}
+    assert record_fields == {'name': 'Fabric', 'files': ['spec.pdf']}
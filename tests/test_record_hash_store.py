@@ -0,0 +1,40 @@
+import datetime
+
+from RecordHashStore import RecordHashStore
+
+
+class _Record:
+    def __init__(self, record_id):
+        self.id = record_id
+
+
+def test_fingerprint_ignores_key_order_and_hashes_dates_by_their_string():
+    due = datetime.datetime(2024, 5, 1, 8, 30, tzinfo = datetime.timezone.utc)
+    assert RecordHashStore.fingerprint({'name': 'a', 'due': due}) == RecordHashStore.fingerprint({'due': due, 'name': 'a'})
+    assert RecordHashStore.fingerprint({'name': 'a'}) != RecordHashStore.fingerprint({'name': 'b'})
+    assert RecordHashStore.fingerprint({'files': ['a.pdf']}) != RecordHashStore.fingerprint({'files': ['b.pdf']})
+
+
+def test_only_saved_records_are_committed_and_stored(tmp_path):
+    store = RecordHashStore('My Table!', store_dir = str(tmp_path))
+    assert store.path == str(tmp_path / 'My_Table.json')
+    store.stage('page1', 'hash1', _Record('rec1'))
+    store.stage('page2', 'hash2', _Record('')) # Not saved, retried on the next run.
+    assert store.commit_staged() == ['page1'] and store.staged == []
+    store.save()
+
+    reloaded = RecordHashStore('My Table!', store_dir = str(tmp_path))
+    assert reloaded.entries == {'page1': {'hash': 'hash1', 'record_id': 'rec1'}}
+    assert reloaded.is_unchanged('page1', 'hash1')
+    assert not reloaded.is_unchanged('page1', 'hash2') and not reloaded.is_unchanged('page2', 'hash2')
+    assert reloaded.record_id('page1') == 'rec1' and reloaded.record_id('page2') is None
+
+
+def test_unreadable_store_starts_empty(tmp_path):
+    (tmp_path / 'Tasks.json').write_text('{"page1": ')
+    store = RecordHashStore('Tasks', store_dir = str(tmp_path))
+    assert store.entries == {}
+    store.update('page1', 'hash1', 'rec1')
+    store.save()
+    assert RecordHashStore('Tasks', store_dir = str(tmp_path)).record_id('page1') == 'rec1'
+    assert not (tmp_path / 'Tasks.json.tmp').exists()
@@ -0,0 +1,170 @@
+import copy
+import datetime
+import json
+import os
+import threading
+
+import pytest
+
+from NotionApiHelper import NotionApiHelper
+from ReverseSync import ReverseSync
+
+P1 = '11111111111111111111111111111111'
+P2 = '22222222222222222222222222222222'
+RELATED = 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa'
+
+PROPERTY_MAP = {'Name': 'Name', 'Due': 'Due', 'At': 'At', 'Score': 'Score', 'Done': 'Done', 'Tags': 'Tags', 'Related': 'Related',
+                'Notion record': 'Notion record'}
+
+
+class _Helper(NotionApiHelper):
+    REQUEST_INTERVAL = 0
+
+    def __init__(self, pages):
+        self.counter = 0
+        self.page_cache = {}
+        self.update_stats = {"sent": 0, "skipped": 0, "failed": 0, "properties_skipped": 0}
+        self._rate_lock = threading.Lock()
+        self._next_request_time = 0
+        self.user_directory = None
+        self._user_lock = threading.Lock()
+        self.response_cache = None
+        self.profiler = None
+        self.pages = {page['id']: page for page in pages}
+        self.sent = []
+        self.failing = set() # Page IDs whose update_page fails, like an API error does.
+
+    def query(self, databaseID, filter_properties = None, content_filter = None, page_num = None, limit = None, sorts = None):
+        return list(self.pages.values())[:page_num]
+
+    def update_page(self, pageID, properties, trash = False):
+        self.sent.append((pageID, properties))
+        if pageID in self.failing:
+            return {}
+        page = copy.deepcopy(self.pages[pageID])
+        page['properties'].update({name: dict(page['properties'][name], **body) for name, body in properties.items()})
+        return page
+
+
+def _page(page_id, score):
+    return {'id': page_id, 'properties': {
+        'Name': {'id': 'title', 'type': 'title', 'title': [
+            {'plain_text': 'Hello ', 'annotations': {'bold': True}}, {'plain_text': 'world', 'annotations': {'bold': False}}
+        ]},
+        'Due': {'id': 'due', 'type': 'date', 'date': {'start': '2024-05-01', 'end': None}},
+        'At': {'id': 'at', 'type': 'date', 'date': {'start': '2024-05-01T10:30:00.000+02:00', 'end': None}},
+        'Score': {'id': 'score', 'type': 'number', 'number': score},
+        'Done': {'id': 'done', 'type': 'checkbox', 'checkbox': True},
+        'Tags': {'id': 'tags', 'type': 'multi_select', 'multi_select': [{'name': 'a'}, {'name': 'b'}]},
+        'Related': {'id': 'rel', 'type': 'relation', 'relation': [{'id': RELATED}], 'has_more': False},
+        'Notion record': {'id': 'rec', 'type': 'rich_text', 'rich_text': [{'plain_text': page_id}]}
+    }}
+
+
+def _fields(page_id, **changes):
+    # What the forward sync wrote for _page(page_id, 3).
+    fields = {'Name': 'Hello world', 'Due': '2024-05-01T00:00:00.000Z', 'At': '2024-05-01T08:30:00.000Z', 'Score': 3, 'Done': True,
+              'Tags': ['b', 'a'], 'REL__Related': ['recRelated'], 'Notion record': page_id}
+    fields.update(changes)
+    return fields
+
+
+class _Table:
+    def __init__(self, records):
+        self.records = records
+
+    def all(self, fields = None, formula = None):
+        return self.records
+
+
+class _Api:
+    def __init__(self, records):
+        self.records = records
+
+    def table(self, base_id, table_name):
+        return _Table(self.records)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('output/record_hashes')
+    with open('output/relation_map.json', 'w') as relation_map_file:
+        json.dump({'db': {'relation_mapping': {'Related': 'other'}}, 'other': {'airtable_table_name': 'Other'}}, relation_map_file)
+    with open('output/record_hashes/Other.json', 'w') as store_file:
+        json.dump({RELATED: {'hash': 'x', 'record_id': 'recRelated'}}, store_file)
+    with open('config.json', 'w') as config_file:
+        json.dump([{'notion_db_id': 'db', 'airtable_base_id': 'app', 'airtable_table_name': 'Tasks', 'property_map': PROPERTY_MAP}], config_file)
+    return tmp_path
+
+
+def _sync(records, pages, failing = ()):
+    helper = _Helper(pages)
+    helper.failing.update(failing)
+    reverse_sync = ReverseSync('config.json', notion_helper = helper, api = _Api(records))
+    return helper, reverse_sync.run()['Tasks']
+
+
+def test_records_left_as_the_forward_sync_wrote_them_are_not_sent(workspace):
+    records = [{'id': f'rec{n}', 'fields': _fields(page_id)} for n, page_id in enumerate((P1, P2))]
+    helper, result = _sync(records, [_page(P1, 3), _page(P2, 3)])
+    assert helper.sent == []
+    assert result == {'read': 2, 'updated': 0, 'skipped': 2, 'failed': 0}
+
+
+def test_only_edited_fields_are_sent_and_date_only_values_stay_date_only(workspace):
+    records = [
+        {'id': 'rec1', 'fields': _fields(P1, Score = 4, Due = '2024-05-03T00:00:00.000Z')},
+        {'id': 'rec2', 'fields': _fields(P2, Name = 'Hello there', **{'REL__Related': ['recRelated', 'recUnknown']})}
+    ]
+    helper, result = _sync(records, [_page(P1, 3), _page(P2, 3)])
+    sent = dict(helper.sent)
+    assert sent[P1] == {'Score': {'number': 4}, 'Due': {'date': {'start': '2024-05-03'}}}
+    assert list(sent[P2]) == ['Name'] # Links to records without a Notion page are not written.
+    assert result['updated'] == 2 and helper.update_stats['sent'] == 2
+
+    entry = json.load(open('output/record_hashes/Tasks.json'))[P1]
+    assert entry['record_id'] == 'rec1'
+
+
+def test_watermark_stays_until_every_record_is_applied(workspace):
+    records = [{'id': 'rec1', 'fields': _fields(P1, Score = 4)}, {'id': 'rec2', 'fields': _fields(P2, Score = 5)}]
+    helper, result = _sync(records, [_page(P1, 3), _page(P2, 3)], failing = [P2])
+    assert result == {'read': 2, 'updated': 1, 'skipped': 0, 'failed': 1}
+    assert not os.path.exists(ReverseSync.STATE_PATH) # No earlier watermark, the next run reads every record again.
+
+    helper, result = _sync(records, [_page(P1, 4), _page(P2, 3)])
+    assert list(dict(helper.sent)) == [P2] and result['failed'] == 0
+    state = json.load(open(ReverseSync.STATE_PATH))
+    assert state['Tasks']['watermark'] and not os.path.exists(ReverseSync.STATE_PATH + '.tmp')
+
+
+def test_same_value_compares_in_airtable_terms():
+    utc = datetime.timezone.utc
+    assert ReverseSync.same_value('date', '2024-05-01T08:30:00.000Z', datetime.datetime(2024, 5, 1, 8, 30, tzinfo = utc))
+    assert ReverseSync.same_value('date', '2024-05-01', datetime.datetime(2024, 5, 1, tzinfo = utc))
+    assert not ReverseSync.same_value('date', '2024-05-02', datetime.datetime(2024, 5, 1, tzinfo = utc))
+    assert ReverseSync.same_value('number', 3, 3.0) and not ReverseSync.same_value('number', None, 0)
+    assert ReverseSync.same_value('multi_select', [], None) and ReverseSync.same_value('checkbox', None, False)
+    assert ReverseSync.same_value('rich_text', '', None) and not ReverseSync.same_value('rich_text', 'a', 'b')
+
+
+def test_worker_helpers_share_the_throttle_but_not_the_page_state():
+    helper = _Helper([])
+    helper.cache_pages([{'id': P1, 'properties': {}}])
+    worker = helper.worker_helper()
+    assert worker._throttle == helper._throttle and worker.page_cache is not helper.page_cache and P1 in worker.page_cache
+    worker.update_stats['sent'] += 2
+    worker.cache_pages([{'id': P2, 'properties': {}}])
+    helper.merge_update_stats(worker)
+    assert helper.update_stats['sent'] == 2 and P2 in helper.page_cache
+
+
+def test_failed_updates_are_not_counted_as_sent():
+    helper = _Helper([_page(P1, 1), _page(P2, 2)])
+    helper.failing.add(P2)
+    helper.cache_pages(copy.deepcopy(list(helper.pages.values())))
+    assert helper.update_page_if_changed(P1, {'Score': {'number': 5}})
+    assert helper.update_page_if_changed(P2, {'Score': {'number': 5}}) == {}
+    assert helper.update_stats['sent'] == 1 and helper.update_stats['failed'] == 1
+    assert helper.page_cache[P1]['properties']['Score']['number'] == 5
@@ -0,0 +1,36 @@
+from SyncDaemon import SyncDaemon
+
+
+class _HashStore:
+    def record_id(self, page_id):
+        return 'rec' + page_id
+
+
+class _Transfer:
+    def __init__(self):
+        self.calls = []
+
+    def transfer(self, table, field_name, record_files):
+        self.calls.append((table, field_name, record_files))
+
+
+def _files(name):
+    return {'type': 'files', 'files': [{'name': name, 'type': 'file', 'file': {'url': f'https://files.example/{name}?sig=1'}}]}
+
+
+def test_attachments_are_transferred_for_pushed_pages_only():
+    daemon = SyncDaemon.__new__(SyncDaemon)
+    daemon.attachment_transfer = _Transfer()
+    daemon.databases = {'db': {
+        'database': {'property_map': {'Files': 'Airtable Files', 'Name': 'Name'}},
+        'type_map': {'Files': 'files', 'Name': 'title'},
+        'hash_store': _HashStore(),
+        'table': 'table'
+    }}
+    pages = [{'id': 'p1', 'properties': {'Files': _files('a.pdf')}}, {'id': 'p2', 'properties': {'Files': _files('b.pdf')}}]
+
+    daemon.transfer_attachments('db', pages, {'p1'})
+
+    assert daemon.attachment_transfer.calls == [
+        ('table', 'Airtable Files', {'recp1': [('a.pdf', 'https://files.example/a.pdf?sig=1')]})
+    ]